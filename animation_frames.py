@@ -0,0 +1,145 @@
+"""
+Sprite animations played from frames rendered once up front.
+
+Designer animates a sprite by changing one of its properties, and redraws the
+sprite's image from scratch each time: a new angle is a new rotation of the
+image, a new filename a new load and scale. A FrameTable instead bakes every
+variant of an image the animation can show, each rotated to every step of a
+full turn, when the world is created. A FrameAnimator then shows one of them
+per tick by swapping which baked image the sprite points at, which Designer
+draws as it is.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pygame
+from designer import DesignerObject
+from designer.core.internal_image import InternalImage
+
+
+@dataclass
+class FrameTable:
+    """ Variants of one image, each rotated to every step of a full turn, variant by variant """
+    frames: list[InternalImage]
+    steps: int
+
+
+@dataclass
+class FrameAnimator:
+    """ The frame table a sprite shows, the variant for each tick still to play, and the angle to show it at """
+    sprite: DesignerObject
+    table: FrameTable
+    sequence: list[int] = field(default_factory=list)
+    position: int = 0
+    angle: float = 0
+    shown: Optional[InternalImage] = None
+
+
+def rotate_frame(image: InternalImage, angle: float, flip_x: bool = False, flip_y: bool = False) -> InternalImage:
+    """
+    Flips and rotates an image the way Designer does for a sprite with those properties,
+    so showing the result unrotated looks the same
+    Args:
+        image (InternalImage): image to rotate
+        angle (float): degrees counterclockwise
+        flip_x (bool): whether to mirror horizontally first
+        flip_y (bool): whether to mirror vertically first
+    Returns:
+        InternalImage: the rotated image
+    """
+    surface = image._surf
+    if flip_x or flip_y:
+        surface = pygame.transform.flip(surface, flip_x, flip_y)
+    if angle % 360 != 0:
+        surface = pygame.transform.rotate(surface, angle % 360)
+    frame = InternalImage(size=surface.get_size())
+    frame._surf = surface.convert_alpha()
+    return frame
+
+
+def bake_frame_table(variants: list[InternalImage], steps: int = 1, flip_x: bool = False,
+                     flip_y: bool = False) -> FrameTable:
+    """
+    Renders every variant at every rotation step. With one step the variants are used as they are
+    Args:
+        variants (list[InternalImage]): images the animation can show
+        steps (int): number of evenly spaced angles in a full turn
+        flip_x (bool): whether to mirror every frame horizontally
+        flip_y (bool): whether to mirror every frame vertically
+    Returns:
+        FrameTable: FrameTable instance
+    """
+    if steps == 1 and not (flip_x or flip_y):
+        return FrameTable(list(variants), 1)
+    frames = [rotate_frame(variant, step * 360 / steps, flip_x, flip_y)
+              for variant in variants for step in range(steps)]
+    return FrameTable(frames, steps)
+
+
+def frame_index(table: FrameTable, variant: int, angle: float) -> int:
+    """
+    Index of the frame showing a variant at the rotation step nearest an angle
+    Args:
+        table (FrameTable): FrameTable instance
+        variant (int): index of the variant
+        angle (float): degrees counterclockwise
+    Returns:
+        int: index into table.frames
+    """
+    step = round(angle % 360 * table.steps / 360) % table.steps
+    return variant * table.steps + step
+
+
+def iterate_sequence(variants: list[int], ticks: int, times: int = 1) -> list[int]:
+    """
+    The variant shown on each tick when cycling through variants, timed like Designer's
+    sequence_animation() over the same duration
+    Args:
+        variants (list[int]): indexes of the variants to cycle through
+        ticks (int): length of the animation in ticks
+        times (int): number of times to cycle through them
+    Returns:
+        list[int]: variant for each tick, the first one played on the tick the animation starts
+    """
+    return [variants[round(tick / ticks * len(variants) * times) % len(variants)] for tick in range(ticks + 1)]
+
+
+def play_sequence(animator: FrameAnimator, sequence: list[int]):
+    """
+    Starts showing a variant per tick from the beginning, replacing any sequence still playing
+    Args:
+        animator (FrameAnimator): FrameAnimator instance
+        sequence (list[int]): variant for each tick; variant 0 is shown once it has played
+    """
+    animator.sequence = sequence
+    animator.position = 0
+
+
+def advance_animator(animator: FrameAnimator):
+    """
+    Shows this tick's frame, pointing the sprite at a different image only when the frame changes
+    Args:
+        animator (FrameAnimator): FrameAnimator instance
+    """
+    variant = 0
+    if animator.position < len(animator.sequence):
+        variant = animator.sequence[animator.position]
+        animator.position += 1
+    frame = animator.table.frames[frame_index(animator.table, variant, animator.angle)]
+    if frame is not animator.shown:
+        animator.sprite.image = frame
+        animator.shown = frame
+
+
+def reset_animator(animator: FrameAnimator, table: FrameTable):
+    """
+    Stops any sequence and shows the first frame of a table
+    Args:
+        animator (FrameAnimator): FrameAnimator instance
+        table (FrameTable): FrameTable instance to show from now on
+    """
+    animator.table = table
+    animator.sequence = []
+    animator.position = 0
+    animator.angle = 0
+    advance_animator(animator)
@@ -0,0 +1,339 @@
+"""
+Process-wide cache of decoded and pre-scaled images.
+
+Every image the game shows is loaded from disk once, then scaled, flipped and
+tinted once per distinct (filename, scale, flip, tint) and kept in an LRU cache
+with a memory cap. Sprites built from the cache share its surfaces, so building a
+World or rebuilding the heart row never decodes or rescales an image again.
+"""
+import io
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from zipfile import ZipFile
+
+import numpy as np
+import pygame
+from designer import DesignerObject, image, get_director
+from designer.core.internal_image import InternalImage
+from designer.objects.emoji import Emoji, lookup_unicode, _EMOJI_DATABASE
+
+from collision import hitmask_from_alpha
+
+# keep decoded surfaces under this many bytes before evicting the least recently used
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+@dataclass
+class AssetCache:
+    """ Decoded surfaces keyed by how they were transformed, oldest use first """
+    max_bytes: int
+    entries: OrderedDict = field(default_factory=OrderedDict)
+    bytes_used: int = 0
+    hits: int = 0
+    misses: int = 0
+    disk_loads: int = 0
+    evictions: int = 0
+
+
+ASSET_CACHE = AssetCache(DEFAULT_MAX_BYTES)
+
+
+def surface_bytes(surface: pygame.Surface) -> int:
+    """
+    Memory used by a surface's pixels
+    Args:
+        surface (pygame.Surface): surface to measure
+    Returns:
+        int: size in bytes
+    """
+    return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+
+def cache_hit_rate(cache: AssetCache = ASSET_CACHE) -> float:
+    """
+    Fraction of lookups served from the cache
+    Args:
+        cache (AssetCache): AssetCache instance
+    Returns:
+        float: hit rate between 0 and 1, 1 when nothing has been looked up yet
+    """
+    total = cache.hits + cache.misses
+    return cache.hits / total if total else 1.0
+
+
+def clear_cache(cache: AssetCache = ASSET_CACHE):
+    """
+    Drops every cached surface
+    Args:
+        cache (AssetCache): AssetCache instance
+    """
+    cache.entries.clear()
+    cache.bytes_used = 0
+
+
+def store_surface(cache: AssetCache, key: tuple, loaded: InternalImage):
+    """
+    Adds a surface to the cache, evicting the least recently used until it fits
+    Args:
+        cache (AssetCache): AssetCache instance
+        key (tuple): how the surface was loaded
+        loaded (InternalImage): surface to keep
+    """
+    size = surface_bytes(loaded._surf)
+    while cache.entries and cache.bytes_used + size > cache.max_bytes:
+        _, evicted = cache.entries.popitem(last=False)
+        cache.bytes_used -= surface_bytes(evicted._surf)
+        cache.evictions += 1
+    cache.entries[key] = loaded
+    cache.bytes_used += size
+
+
+def image_key(filename: str, scale: float = 1.0, flip_x: bool = False, flip_y: bool = False,
+              tint: Optional[tuple[int, int, int]] = None, size: Optional[tuple[int, int]] = None) -> tuple:
+    """
+    Key an image is cached under, by how it was transformed
+    Args:
+        filename (str): path to the image file
+        scale (float): factor to scale by
+        flip_x (bool): whether to mirror horizontally
+        flip_y (bool): whether to mirror vertically
+        tint (Optional[tuple[int, int, int]]): color to multiply every pixel by
+        size (Optional[tuple[int, int]]): exact size to scale to, used instead of scale
+    Returns:
+        tuple: cache key
+    """
+    return (filename, scale, flip_x, flip_y, tint, size)
+
+
+def emoji_key(name: str, scale: float = 1.0) -> tuple:
+    """
+    Key an emoji is cached under
+    Args:
+        name (str): emoji name or character
+        scale (float): factor to scale by
+    Returns:
+        tuple: cache key
+    """
+    return ('emoji', name, scale)
+
+
+def decode_image_file(filename: str) -> pygame.Surface:
+    """
+    Reads an image file in the display's pixel format with per-pixel alpha, the same way Designer's
+    InternalImage(filename) does. Every transformed image starts from this, whichever thread loads
+    it, so a preloaded image has the same pixels as one loaded when it is first needed. Needs the
+    display to be set up, but touches no shared state, so it can run on any thread
+    Args:
+        filename (str): path to the image file
+    Returns:
+        pygame.Surface: decoded surface
+    """
+    return pygame.image.load(filename).convert_alpha()
+
+
+def transform_surface(surface: pygame.Surface, scale: float = 1.0, flip_x: bool = False, flip_y: bool = False,
+                      tint: Optional[tuple[int, int, int]] = None,
+                      size: Optional[tuple[int, int]] = None) -> pygame.Surface:
+    """
+    Flips, scales and tints a surface, leaving the original untouched. Touches no shared state,
+    so it can run on any thread
+    Args:
+        surface (pygame.Surface): surface to transform
+        scale (float): factor to scale by
+        flip_x (bool): whether to mirror horizontally
+        flip_y (bool): whether to mirror vertically
+        tint (Optional[tuple[int, int, int]]): color to multiply every pixel by
+        size (Optional[tuple[int, int]]): exact size to scale to, used instead of scale
+    Returns:
+        pygame.Surface: transformed surface, the original itself if there was nothing to do
+    """
+    if flip_x or flip_y:
+        surface = pygame.transform.flip(surface, flip_x, flip_y)
+    if size is None and scale != 1.0:
+        size = (int(surface.get_width() * scale), int(surface.get_height() * scale))
+    if size is not None:
+        surface = pygame.transform.smoothscale(surface, size)
+    if tint is not None:
+        surface = surface.copy()
+        surface.fill(tint, special_flags=pygame.BLEND_RGB_MULT)
+    return surface
+
+
+def render_emoji(name: str, scale: float = 1.0) -> pygame.Surface:
+    """
+    Renders an emoji from Designer's emoji archive the way emoji() followed by grow() draws it,
+    converted to the display's pixel format. Needs the display to be set up, but touches no shared
+    state, so it can run on any thread
+    Args:
+        name (str): emoji name or character
+        scale (float): factor to scale by
+    Returns:
+        pygame.Surface: rendered emoji
+    """
+    try:
+        target = lookup_unicode(name)
+    except KeyError:
+        target = hex(ord(name))[2:]
+    with ZipFile(_EMOJI_DATABASE) as archive, archive.open(target) as svg_file:
+        svg = svg_file.read().decode()
+    half = Emoji.DEFAULT_EMOJI_SIZE / 2
+    document = (f'<svg xmlns="http://www.w3.org/2000/svg">'
+                f'<g transform="scale({scale}, {scale}),rotate(0, {half}, {half}),">{svg}</g></svg>')
+    return pygame.image.load(io.BytesIO(document.encode()), name + ".svg").convert_alpha()
+
+
+def cached_surface(key: tuple, cache: AssetCache = ASSET_CACHE) -> Optional[InternalImage]:
+    """
+    Looks up a surface, counting the hit or miss
+    Args:
+        key (tuple): key from image_key() or emoji_key()
+        cache (AssetCache): AssetCache instance
+    Returns:
+        Optional[InternalImage]: cached image, None if it is not cached
+    """
+    loaded = cache.entries.get(key)
+    if loaded is None:
+        cache.misses += 1
+        return None
+    cache.entries.move_to_end(key)
+    cache.hits += 1
+    return loaded
+
+
+def store_loaded_surface(cache: AssetCache, key: tuple, surface: pygame.Surface, name: str) -> InternalImage:
+    """
+    Adds a surface loaded away from the cache to it, unless it is already there. The surface is
+    stored as it is, already converted to the display's pixel format by whichever thread loaded it,
+    so storing it copies no pixels. Must run on the main thread
+    Args:
+        cache (AssetCache): AssetCache instance
+        key (tuple): key from image_key() or emoji_key()
+        surface (pygame.Surface): surface from decode_image_file() or render_emoji(), transformed or not
+        name (str): filename or emoji name the surface came from
+    Returns:
+        InternalImage: cached image
+    """
+    loaded = cache.entries.get(key)
+    if loaded is not None:
+        return loaded
+    loaded = InternalImage.from_surface(surface)
+    loaded._name = name
+    store_surface(cache, key, loaded)
+    return loaded
+
+
+def load_image(filename: str, scale: float = 1.0, flip_x: bool = False, flip_y: bool = False,
+               tint: Optional[tuple[int, int, int]] = None, size: Optional[tuple[int, int]] = None,
+               cache: AssetCache = ASSET_CACHE) -> InternalImage:
+    """
+    Gets an image from the cache, decoding and transforming it only the first time.
+    The returned image is shared, so it must not be drawn on
+    Args:
+        filename (str): path to the image file
+        scale (float): factor to scale by, the same as Designer's grow()
+        flip_x (bool): whether to mirror horizontally
+        flip_y (bool): whether to mirror vertically
+        tint (Optional[tuple[int, int, int]]): color to multiply every pixel by
+        size (Optional[tuple[int, int]]): exact size to scale to, used instead of scale
+        cache (AssetCache): AssetCache instance
+    Returns:
+        InternalImage: transformed image
+    """
+    key = image_key(filename, scale, flip_x, flip_y, tint, size)
+    loaded = cached_surface(key, cache)
+    if loaded is not None:
+        return loaded
+    if key == image_key(filename):
+        cache.disk_loads += 1
+        loaded = InternalImage.from_surface(decode_image_file(filename))
+        loaded._name = filename
+    else:
+        surface = transform_surface(load_image(filename, cache=cache)._surf, scale, flip_x, flip_y, tint, size)
+        loaded = InternalImage.from_surface(surface)
+        loaded._name = filename
+    store_surface(cache, key, loaded)
+    return loaded
+
+
+def surface_sprite(loaded: InternalImage, **kwargs) -> DesignerObject:
+    """
+    Creates an image sprite that shows an already loaded image without copying it
+    Args:
+        loaded (InternalImage): image to show
+        **kwargs: other properties of the sprite, such as layer
+    Returns:
+        DesignerObject: image sprite
+    """
+    # image() only loads from filenames and pixel lists, anything else leaves it empty
+    # until the image property is set
+    sprite = image(loaded, **kwargs)
+    sprite.image = loaded
+    return sprite
+
+
+def cached_image(filename: str, scale: float = 1.0, flip_x: bool = False, flip_y: bool = False,
+                 tint: Optional[tuple[int, int, int]] = None) -> DesignerObject:
+    """
+    Creates an image sprite that is already scaled, in place of image() followed by grow()
+    Args:
+        filename (str): path to the image file
+        scale (float): factor to scale by
+        flip_x (bool): whether to mirror horizontally
+        flip_y (bool): whether to mirror vertically
+        tint (Optional[tuple[int, int, int]]): color to multiply every pixel by
+    Returns:
+        DesignerObject: image sprite
+    """
+    return surface_sprite(load_image(filename, scale, flip_x, flip_y, tint))
+
+
+def emoji_image(name: str, scale: float = 1.0, cache: AssetCache = ASSET_CACHE) -> InternalImage:
+    """
+    Renders an emoji once per scale. Designer's emoji() reads the emoji archive again for every sprite
+    Args:
+        name (str): emoji name or character
+        scale (float): factor to scale by
+        cache (AssetCache): AssetCache instance
+    Returns:
+        InternalImage: rendered emoji
+    """
+    key = emoji_key(name, scale)
+    loaded = cached_surface(key, cache)
+    if loaded is not None:
+        return loaded
+    return store_loaded_surface(cache, key, render_emoji(name, scale), name)
+
+
+def cached_emoji(name: str, scale: float = 1.0) -> DesignerObject:
+    """
+    Creates an emoji sprite from the cache, in place of emoji() followed by grow()
+    Args:
+        name (str): emoji name or character
+        scale (float): factor to scale by
+    Returns:
+        DesignerObject: emoji sprite
+    """
+    return surface_sprite(emoji_image(name, scale))
+
+
+def cached_background(filename: str):
+    """
+    Sets the current scene's background from the cache, in place of background_image()
+    Args:
+        filename (str): path to the image file
+    """
+    scene = get_director().current_scene
+    scene.background = load_image(filename, size=(int(scene.width), int(scene.height)))
+
+
+def sprite_hitmask(sprite: DesignerObject) -> np.ndarray:
+    """
+    Builds a collision bitmask from the surface a sprite is currently drawn with
+    Args:
+        sprite (DesignerObject): sprite to measure
+    Returns:
+        np.ndarray: boolean mask indexed [row, column]
+    """
+    # surfarray indexes [column, row]
+    return hitmask_from_alpha(pygame.surfarray.array_alpha(sprite._transform_image).T)
@@ -0,0 +1,113 @@
+"""
+Packing many cached images into one display-format surface.
+
+build_atlas() lays the images out on shelves in a single surface, and gives the
+atlas its own image for each of them, a view of its region, so every sprite made
+from atlas_image() draws from that one surface. The images it was built from are
+left as they were, so the asset cache they came from still holds exactly what it
+accounts for. Designer still blits each sprite on its own, but anything drawing
+many of them at once can pass atlas_blits() to Surface.blits() and draw them all
+in one call from the one source.
+"""
+import copy
+from dataclasses import dataclass
+
+import numpy as np
+import pygame
+from designer.core.internal_image import InternalImage
+
+# transparent pixels left between regions, so smoothing at an edge never picks up a neighbour
+ATLAS_PADDING = 1
+MAX_ATLAS_WIDTH = 1024
+
+
+@dataclass
+class TextureAtlas:
+    """ One surface holding many images, with the region each one occupies and an image viewing it, by cache key """
+    surface: pygame.Surface
+    regions: dict[tuple, pygame.Rect]
+    images: dict[tuple, InternalImage]
+
+
+def pack_shelves(sizes: list[tuple[int, int]], max_width: int = MAX_ATLAS_WIDTH,
+                 padding: int = ATLAS_PADDING) -> tuple[list[tuple[int, int]], tuple[int, int]]:
+    """
+    Places rectangles left to right on shelves, tallest first, starting a new shelf when one is full
+    Args:
+        sizes (list[tuple[int, int]]): width and height of each rectangle
+        max_width (int): widest a shelf may be
+        padding (int): gap kept around each rectangle
+    Returns:
+        tuple[list[tuple[int, int]], tuple[int, int]]: top left corner of each rectangle, in the order
+            given, and the size of the surface they fit in
+    """
+    positions = [(0, 0)] * len(sizes)
+    x = y = shelf_height = width = 0
+    for index in sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True):
+        rect_width, rect_height = sizes[index]
+        if x > 0 and x + rect_width + padding > max_width:
+            y += shelf_height
+            x = shelf_height = 0
+        positions[index] = (x + padding, y + padding)
+        x += rect_width + padding
+        width = max(width, x + padding)
+        shelf_height = max(shelf_height, rect_height + padding)
+    return positions, (max(width, 1), max(y + shelf_height + padding, 1))
+
+
+def build_atlas(images: dict[tuple, InternalImage], max_width: int = MAX_ATLAS_WIDTH) -> TextureAtlas:
+    """
+    Copies images into one display-format surface, with a new image viewing each region for
+    sprites to draw from. Must run on the main thread
+    Args:
+        images (dict[tuple, InternalImage]): images to pack, by their cache key
+        max_width (int): widest the atlas may be
+    Returns:
+        TextureAtlas: TextureAtlas instance
+    """
+    keys = list(images)
+    sizes = [images[key]._surf.get_size() for key in keys]
+    positions, size = pack_shelves(sizes, max_width)
+    surface = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+    surface.fill((0, 0, 0, 0))
+    regions = {}
+    views = {}
+    for key, (width, height), position in zip(keys, sizes, positions):
+        region = pygame.Rect(position, (width, height))
+        # adding onto transparent pixels copies them exactly, where a normal blit would blend them
+        surface.blit(images[key]._surf, region, special_flags=pygame.BLEND_RGBA_ADD)
+        # a shallow copy keeps the name and everything else Designer reads, without copying the pixels
+        view = copy.copy(images[key])
+        view._surf = surface.subsurface(region)
+        regions[key] = region
+        views[key] = view
+    return TextureAtlas(surface, regions, views)
+
+
+def atlas_image(atlas: TextureAtlas, key: tuple) -> InternalImage:
+    """
+    Image drawing one region of the atlas. It is shared, so it must not be drawn on
+    Args:
+        atlas (TextureAtlas): TextureAtlas instance
+        key (tuple): cache key of the image
+    Returns:
+        InternalImage: view of the region
+    """
+    return atlas.images[key]
+
+
+def atlas_blits(atlas: TextureAtlas, key: tuple, xs: np.ndarray, ys: np.ndarray) -> list:
+    """
+    Blit sequence drawing one atlas image at many positions, for Surface.blits()
+    Args:
+        atlas (TextureAtlas): TextureAtlas instance
+        key (tuple): cache key of the image
+        xs (np.ndarray): left edge of each copy
+        ys (np.ndarray): top edge of each copy
+    Returns:
+        list: (source, position, area) tuples
+    """
+    region = atlas.regions[key]
+    surface = atlas.surface
+    return [(surface, position, region) for position in zip(xs.astype(np.int64).tolist(),
+                                                             ys.astype(np.int64).tolist())]
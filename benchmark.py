@@ -0,0 +1,307 @@
+"""
+Headless benchmarks of the world scene under scripted worst-case scenarios.
+
+Each scenario starts the real world scene with SDL's dummy video driver, in a
+process of its own so that peak memory and Designer's global state belong to it
+alone. It then runs a fixed number of frames back to back. Each frame fires the
+same update and render events and draws the scene the way Designer's loop does,
+without waiting for the clock. Frame time percentiles, memory allocated per frame
+and peak RSS are reported for every scenario and can be saved as a JSON baseline.
+A later run compared against that baseline fails when a scenario's mean or p95
+frame time grew by more than the threshold.
+
+Usage:
+    python benchmark.py                        run every scenario and print the results
+    python benchmark.py --save-baseline FILE   also write the results as the new baseline
+    python benchmark.py --baseline FILE        exit with status 1 if any scenario regressed
+    python benchmark.py --scenario NAME        run one scenario in this process, printing JSON
+
+Run it from the directory holding the game's images, like the game itself.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tracemalloc
+from dataclasses import dataclass, asdict
+from random import Random
+from time import perf_counter_ns
+
+import numpy as np
+
+from simulation import (MAX_OBJECTS, MIN_X_POSITION, MAX_X_POSITION, SCREEN_HEIGHT, STARTING_HEARTS,
+                        TIMESTEP_SECONDS, GameState)
+from falling_store import PAGE, BOMB, count_falling, spawn_falling
+
+# frames run with tracemalloc on before the timed frames, which it would slow down
+ALLOCATION_FRAMES = 60
+# a scenario regresses when its mean or p95 frame time grows by more than this fraction
+DEFAULT_THRESHOLD = 0.2
+BENCHMARK_SEED = 2024
+# frames between the bombs dropped on the salamander in the heart loss scenario,
+# longer than the hurt flash so each hit is seen on its own
+BOMB_DROP_INTERVAL = 45
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """ A scripted run of the world scene """
+    name: str
+    settings_mode: str = 'medium'
+    max_objects: int = MAX_OBJECTS
+    frames: int = 600
+    # keep every page and bomb slot filled, spread over the screen
+    fill: bool = False
+    # hold one arrow key until the salamander reaches that side, then the other
+    strafe: bool = False
+    # drop bombs on the salamander until it falls, instead of never letting it run out of hearts
+    lose_hearts: bool = False
+    # draw the pages and bombs from the sprite atlas in one call instead of a sprite each
+    batched: bool = False
+
+
+SCENARIOS = [
+    Scenario('easy', settings_mode='easy'),
+    Scenario('medium', settings_mode='medium'),
+    Scenario('hard', settings_mode='hard'),
+    Scenario('objects_100', max_objects=100, frames=300, fill=True),
+    Scenario('objects_1000', max_objects=1000, frames=150, fill=True),
+    Scenario('objects_10000', max_objects=10000, frames=30, fill=True),
+    Scenario('objects_1000_batched', max_objects=1000, frames=150, fill=True, batched=True),
+    Scenario('objects_10000_batched', max_objects=10000, frames=30, fill=True, batched=True),
+    Scenario('strafe', strafe=True),
+    Scenario('heart_loss', frames=400, lose_hearts=True),
+]
+
+
+def fill_objects(state: GameState, rng: Random):
+    """
+    Spawns pages and bombs at random heights until every slot is in use
+    Args:
+        state (GameState): GameState instance
+        rng (Random): random stream for the positions, separate from the game's
+    """
+    for kind, speed in ((PAGE, state.page_speed), (BOMB, state.bomb_speed)):
+        for _ in range(state.max_objects - count_falling(state.objects, kind)):
+            spawn_falling(state.objects, kind, rng.randint(MIN_X_POSITION, MAX_X_POSITION),
+                          rng.randrange(SCREEN_HEIGHT), speed)
+
+
+def drop_bomb(state: GameState):
+    """
+    Spawns a bomb just above the salamander
+    Args:
+        state (GameState): GameState instance
+    """
+    top = state.salamander_y - state.salamander_hitbox.height / 2
+    spawn_falling(state.objects, BOMB, state.salamander_x, top - 4 * state.bomb_speed, state.bomb_speed)
+
+
+def percentile_ms(times_ns: np.ndarray, percentile: float) -> float:
+    """
+    A percentile of frame times
+    Args:
+        times_ns (np.ndarray): frame times in nanoseconds
+        percentile (float): between 0 and 100
+    Returns:
+        float: the percentile in milliseconds
+    """
+    return float(np.percentile(times_ns, percentile)) / 1e6
+
+
+def run_scenario(scenario: Scenario) -> dict:
+    """
+    Runs one scenario in this process. Starts Designer, so it can only be called once per process
+    Args:
+        scenario (Scenario): Scenario to run
+    Returns:
+        dict: frame time mean and percentiles in milliseconds, allocations per frame and peak RSS
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    from designer import when, start, stop, get_director
+    from designer.core.event import Event
+    import salamander_exists as game
+
+    game.DETERMINISTIC_SEED = BENCHMARK_SEED
+    game.MAX_FALLING_OBJECTS = scenario.max_objects
+    game.BATCHED_FALLING_SPRITES = scenario.batched
+    rng = Random(BENCHMARK_SEED)
+    results = {}
+
+    def prepare_frame(world):
+        state = world.state
+        if scenario.fill:
+            fill_objects(state, rng)
+        if scenario.strafe:
+            if state.salamander_x >= MAX_X_POSITION or not (world.inputs.left or world.inputs.right):
+                game.keys_not_pressed(world, 'right')
+                game.keys_pressed(world, 'left')
+            elif state.salamander_x <= MIN_X_POSITION:
+                game.keys_not_pressed(world, 'left')
+                game.keys_pressed(world, 'right')
+        if scenario.lose_hearts:
+            if not state.falling and state.frame % BOMB_DROP_INTERVAL == 0:
+                drop_bomb(state)
+        else:
+            # more hearts than bombs can hit in one frame, so the salamander never falls
+            state.hearts_remaining = STARTING_HEARTS + scenario.max_objects
+
+    def run_frame(scene, world):
+        # the events and draw of one pass through Designer's update and frame callbacks
+        scene._handle_event('director.pre_update')
+        scene._handle_event('director.update', Event(world=world, delta=TIMESTEP_SECONDS))
+        scene._handle_event('director.post_update')
+        scene._handle_event('director.pre_render')
+        scene._handle_event('director.render', Event(world=world))
+        scene._draw()
+        scene._handle_event('director.post_render')
+
+    def benchmark(world):
+        if results:
+            return
+        results['started'] = True
+        scene = get_director().current_scene
+        game.resume_from_settings(world, scenario.settings_mode)
+        # the allocation frames come first and also warm up the caches and sprite pools,
+        # so the medians of their allocations leave out the first frames' one-off costs
+        allocated = []
+        blocks = []
+        tracemalloc.start()
+        for _ in range(min(ALLOCATION_FRAMES, scenario.frames)):
+            prepare_frame(world)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            before_blocks = sys.getallocatedblocks()
+            run_frame(scene, world)
+            allocated.append(tracemalloc.get_traced_memory()[1] - before)
+            blocks.append(sys.getallocatedblocks() - before_blocks)
+            if world.state.game_over:
+                break
+        tracemalloc.stop()
+        times = np.zeros(scenario.frames, dtype=np.int64)
+        entities = np.zeros(scenario.frames, dtype=np.int64)
+        frames = 0
+        while frames < scenario.frames and not world.state.game_over:
+            prepare_frame(world)
+            started = perf_counter_ns()
+            run_frame(scene, world)
+            times[frames] = perf_counter_ns() - started
+            entities[frames] = count_falling(world.state.objects, PAGE) + count_falling(world.state.objects, BOMB)
+            frames += 1
+        times = times[:frames]
+        results.update({
+            'frames': frames,
+            'mean_ms': float(times.mean()) / 1e6,
+            'p95_ms': percentile_ms(times, 95),
+            'p99_ms': percentile_ms(times, 99),
+            'max_ms': float(times.max()) / 1e6,
+            'mean_entities': float(entities[:frames].mean()),
+            'alloc_kib_per_frame': float(np.median(allocated)) / 1024,
+            'net_blocks_per_frame': float(np.median(blocks)),
+            'game_over': bool(world.state.game_over),
+            'page_count': world.state.page_count,
+            'hearts_remaining': world.state.hearts_remaining,
+        })
+        stop()
+
+    when('updating: world', benchmark)
+    start(scene='world')
+    del results['started']
+    # ru_maxrss is in kilobytes on Linux
+    results['peak_rss_mib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def run_all(scenarios: list[Scenario]) -> dict:
+    """
+    Runs each scenario in a process of its own
+    Args:
+        scenarios (list[Scenario]): scenarios to run
+    Returns:
+        dict: results of every scenario by name, with the machine they ran on
+    """
+    results = {}
+    for scenario in scenarios:
+        finished = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', scenario.name],
+                                  capture_output=True, text=True)
+        if finished.returncode != 0:
+            raise RuntimeError(f"Scenario {scenario.name} failed:\n{finished.stderr}")
+        results[scenario.name] = json.loads(finished.stdout.strip().splitlines()[-1])
+    return {'python': platform.python_version(), 'machine': platform.machine(),
+            'scenarios': results}
+
+
+def regressions(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """
+    Compares results against a baseline
+    Args:
+        results (dict): results of run_all()
+        baseline (dict): earlier results of run_all()
+        threshold (float): fraction a frame time may grow by before it counts as a regression
+    Returns:
+        list[str]: a description of each regression, empty if there are none
+    """
+    found = []
+    for name, measured in results['scenarios'].items():
+        expected = baseline['scenarios'].get(name)
+        if expected is None:
+            continue
+        for metric in ('mean_ms', 'p95_ms'):
+            limit = expected[metric] * (1 + threshold)
+            if measured[metric] > limit:
+                found.append(f"{name} {metric} {measured[metric]:.3f} > {limit:.3f} "
+                             f"(baseline {expected[metric]:.3f})")
+    return found
+
+
+def print_results(results: dict):
+    """
+    Prints a table of results
+    Args:
+        results (dict): results of run_all()
+    """
+    print(f"{'scenario':<16}{'frames':>7}{'mean ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'KiB/frame':>11}{'blocks/frame':>14}{'RSS MiB':>9}")
+    for name, result in results['scenarios'].items():
+        print(f"{name:<16}{result['frames']:>7}{result['mean_ms']:>9.3f}{result['p95_ms']:>9.3f}"
+              f"{result['p99_ms']:>9.3f}{result['alloc_kib_per_frame']:>11.1f}"
+              f"{result['net_blocks_per_frame']:>14.1f}{result['peak_rss_mib']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the world scene headless")
+    parser.add_argument('--scenario', help="run only this scenario, in this process, and print its JSON")
+    parser.add_argument('--only', nargs='+', help="names of the scenarios to run")
+    parser.add_argument('--output', help="file to write the results to")
+    parser.add_argument('--baseline', help="results to compare against")
+    parser.add_argument('--save-baseline', help="file to write the results to as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction a frame time may grow by over the baseline")
+    args = parser.parse_args()
+    by_name = {scenario.name: scenario for scenario in SCENARIOS}
+    if args.scenario is not None:
+        print(json.dumps(run_scenario(by_name[args.scenario])))
+        return
+    scenarios = [by_name[name] for name in args.only] if args.only else SCENARIOS
+    results = run_all(scenarios)
+    results['parameters'] = {scenario.name: asdict(scenario) for scenario in scenarios}
+    print_results(results)
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            found = regressions(results, json.load(file), args.threshold)
+        for regression in found:
+            print("REGRESSION", regression)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
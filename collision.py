@@ -0,0 +1,128 @@
+"""
+Two-phase collision tests between falling objects and the salamander.
+
+The broadphase keeps only the slots whose hitbox reaches into the salamander's
+vertical band, then only those that also reach into its horizontal range. Just the
+few candidates left get the precise test, which compares cached per-sprite bitmasks
+so transparent corners of the sprites no longer count as touching. Without bitmasks
+the precise test is the plain bounding box overlap the candidates already passed.
+"""
+from typing import Optional
+
+import numpy as np
+
+from falling_store import FallingStore
+
+# alpha above which a pixel counts as solid in a bitmask
+MASK_ALPHA_THRESHOLD = 127
+
+
+def hitmask_from_alpha(alpha: np.ndarray, threshold: int = MASK_ALPHA_THRESHOLD) -> np.ndarray:
+    """
+    Builds a bitmask from a sprite's alpha channel
+    Args:
+        alpha (np.ndarray): alpha values indexed [row, column]
+        threshold (int): alpha above which a pixel is solid
+    Returns:
+        np.ndarray: boolean mask indexed [row, column]
+    """
+    return alpha > threshold
+
+
+def band_candidates(store: FallingStore, widths: np.ndarray, heights: np.ndarray,
+                    left: int, top: int, right: int, bottom: int) -> np.ndarray:
+    """
+    Finds the live slots whose hitbox overlaps a box, testing the vertical band over
+    every slot first and the horizontal range only over the slots inside it.
+    Boxes that only share an edge do not overlap
+    Args:
+        store (FallingStore): FallingStore instance
+        widths (np.ndarray): hitbox width for each kind
+        heights (np.ndarray): hitbox height for each kind
+        left (int): left edge of the box
+        top (int): top edge of the box
+        right (int): right edge of the box
+        bottom (int): bottom edge of the box
+    Returns:
+        np.ndarray: slots overlapping the box, in ascending order
+    """
+    # bottom edge of each object, then whether the object is inside the band, in the store's buffers
+    edges = np.take(heights, store.kind, out=store.value_buffer, mode='clip')
+    edges += store.y
+    in_band = np.greater(edges, top, out=store.mask_buffer)
+    in_band &= np.less(store.y, bottom, out=store.band_buffer)
+    in_band &= store.alive
+    return within_range(store, np.flatnonzero(in_band), widths, left, right)
+
+
+def within_range(store: FallingStore, slots: np.ndarray, widths: np.ndarray, left: int, right: int) -> np.ndarray:
+    """
+    Narrows slots down to those whose hitbox overlaps a horizontal range.
+    Hitboxes that only share an edge with it do not overlap
+    Args:
+        store (FallingStore): FallingStore instance
+        slots (np.ndarray): slots to test
+        widths (np.ndarray): hitbox width for each kind
+        left (int): left edge of the range
+        right (int): right edge of the range
+    Returns:
+        np.ndarray: slots overlapping the range, in the order given
+    """
+    half_widths = widths[store.kind[slots]] / 2
+    x = store.x[slots]
+    return slots[(x - half_widths < right) & (left < x + half_widths)]
+
+
+def masks_overlap(first: np.ndarray, first_left: int, first_top: int,
+                  second: np.ndarray, second_left: int, second_top: int) -> bool:
+    """
+    Checks whether two bitmasks have a solid pixel in the same place
+    Args:
+        first (np.ndarray): first bitmask indexed [row, column]
+        first_left (int): x position of the first mask's left edge
+        first_top (int): y position of the first mask's top edge
+        second (np.ndarray): second bitmask indexed [row, column]
+        second_left (int): x position of the second mask's left edge
+        second_top (int): y position of the second mask's top edge
+    Returns:
+        bool: whether any solid pixels overlap
+    """
+    left = max(first_left, second_left)
+    top = max(first_top, second_top)
+    right = min(first_left + first.shape[1], second_left + second.shape[1])
+    bottom = min(first_top + first.shape[0], second_top + second.shape[0])
+    if left >= right or top >= bottom:
+        return False
+    first_part = first[top - first_top:bottom - first_top, left - first_left:right - first_left]
+    second_part = second[top - second_top:bottom - second_top, left - second_left:right - second_left]
+    return bool(np.any(first_part & second_part))
+
+
+def precise_hits(store: FallingStore, candidates: np.ndarray, widths: np.ndarray,
+                 masks: list[Optional[np.ndarray]], target_mask: Optional[np.ndarray],
+                 target_left: int, target_top: int) -> np.ndarray:
+    """
+    Narrows broadphase candidates down to those whose bitmask touches the target's.
+    Candidates of a kind without a bitmask, or any candidate when the target has
+    none, are kept since their boxes already overlap
+    Args:
+        store (FallingStore): FallingStore instance
+        candidates (np.ndarray): slots that passed the broadphase
+        widths (np.ndarray): hitbox width for each kind
+        masks (list[Optional[np.ndarray]]): bitmask for each kind, if it has one
+        target_mask (Optional[np.ndarray]): bitmask of the target, if it has one
+        target_left (int): x position of the target's left edge
+        target_top (int): y position of the target's top edge
+    Returns:
+        np.ndarray: slots that collide
+    """
+    if target_mask is None or len(candidates) == 0:
+        return candidates
+    keep = []
+    for slot in candidates.tolist():
+        kind = store.kind[slot]
+        mask = masks[kind]
+        if mask is None or masks_overlap(mask, int(store.x[slot] - widths[kind] / 2), int(store.y[slot]),
+                                         target_mask, target_left, target_top):
+            keep.append(slot)
+    return np.array(keep, dtype=np.intp)
@@ -0,0 +1,344 @@
+"""
+Monte Carlo analysis of the difficulty settings over large batches of simulated games.
+
+Every game of a batch is one row of NumPy arrays, so each rule of step() runs as a
+handful of array operations over the whole batch instead of once per game. The
+rules are the same as simulation.py's, in the same order, with the hitboxes and
+most objects of the sweep point, which default to those of a headless run. A
+game ends when the salamander loses its grip,
+since nothing can be scored after that. Games left after the horizon count as
+survivors.
+
+A sweep runs a batch for each combination of page speed, bomb speed, spawn rate,
+MAX_OBJECTS and scripted policy, spread over a process pool. For each one it
+reports the survival curve, the fraction of games still going after each second,
+and the distribution of final scores.
+
+Usage:
+    python difficulty_sweep.py                              sweep around the current presets
+    python difficulty_sweep.py --page-speeds 4 6 --games 5000 --output sweep.json
+"""
+import argparse
+import itertools
+import json
+import os
+from dataclasses import dataclass, asdict
+from multiprocessing import Pool
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+
+from simulation import (SALAMANDER_SPEED, MAX_OBJECTS, SCREEN_HEIGHT, MAX_X_POSITION, MIN_X_POSITION,
+                        SALAMANDER_START_X, SALAMANDER_START_Y, STARTING_HEARTS, FRAMES_PER_SECOND,
+                        DIFFICULTY_SETTINGS, PAGE_HITBOX, BOMB_HITBOX, SALAMANDER_HITBOX, Hitbox, kind_sizes)
+from falling_store import PAGE, BOMB
+
+# five minutes of play
+DEFAULT_HORIZON = 300 * FRAMES_PER_SECOND
+DEFAULT_GAMES = 2000
+SWEEP_SEED = 2024
+
+# scripted players
+IDLE = 'idle'
+RANDOM = 'random'
+CHASE = 'chase'
+DODGE = 'dodge'
+POLICIES = [IDLE, RANDOM, CHASE, DODGE]
+# chance each frame that the random player picks new keys to hold
+RANDOM_SWITCH_CHANCE = 1 / 15
+# how far above the salamander's top a bomb makes the dodging player step aside
+DODGE_LOOKAHEAD = 150
+
+SCORE_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+
+@dataclass(frozen=True)
+class SweepPoint:
+    """ One combination of settings and policy, simulated as one batch """
+    page_speed: int
+    bomb_speed: int
+    spawn_rate: int
+    max_objects: int
+    policy: str
+    page_hitbox: Hitbox = PAGE_HITBOX
+    bomb_hitbox: Hitbox = BOMB_HITBOX
+    salamander_hitbox: Hitbox = SALAMANDER_HITBOX
+
+
+@dataclass
+class Batch:
+    """ Every game of a batch, one row each. Objects are indexed [game, kind, slot] """
+    x: np.ndarray
+    y: np.ndarray
+    alive: np.ndarray
+    salamander_x: np.ndarray
+    salamander_speed: np.ndarray
+    hearts: np.ndarray
+    page_count: np.ndarray
+    playing: np.ndarray
+    survived_frames: np.ndarray
+    held: np.ndarray
+
+
+def create_batch(games: int, max_objects: int) -> Batch:
+    """
+    Creates the starting state of a batch of games
+    Args:
+        games (int): number of games
+        max_objects (int): most pages, and separately bombs, that can fall at once in each game
+    Returns:
+        Batch: Batch instance
+    """
+    shape = (games, 2, max_objects)
+    return Batch(np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=np.bool_),
+                 np.full(games, float(SALAMANDER_START_X)), np.zeros(games),
+                 np.full(games, STARTING_HEARTS), np.zeros(games, dtype=np.int64),
+                 np.ones(games, dtype=np.bool_), np.zeros(games, dtype=np.int64),
+                 np.zeros(games, dtype=np.int8))
+
+
+def lowest_x(batch: Batch, kind: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the lowest live object of one kind in each game
+    Args:
+        batch (Batch): Batch instance
+        kind (int): PAGE or BOMB
+    Returns:
+        tuple[np.ndarray, np.ndarray]: its x in each game, and whether the game has one
+    """
+    heights = np.where(batch.alive[:, kind], batch.y[:, kind], -np.inf)
+    slot = np.argmax(heights, axis=1)
+    rows = np.arange(len(slot))
+    return batch.x[rows, kind, slot], np.isfinite(heights[rows, slot])
+
+
+def choose_keys(batch: Batch, point: SweepPoint, rng: np.random.Generator) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Picks the arrow keys each game holds this frame
+    Args:
+        batch (Batch): Batch instance
+        point (SweepPoint): settings and policy of the batch
+        rng (np.random.Generator): random stream of the batch
+    Returns:
+        tuple[np.ndarray, np.ndarray]: whether left, and whether right, is held in each game
+    """
+    games = len(batch.playing)
+    policy = point.policy
+    if policy == IDLE:
+        return np.zeros(games, dtype=np.bool_), np.zeros(games, dtype=np.bool_)
+    if policy == RANDOM:
+        switch = rng.random(games) < RANDOM_SWITCH_CHANCE
+        batch.held[switch] = rng.integers(0, 3, size=int(switch.sum()))
+        return batch.held == 1, batch.held == 2
+    target, has_target = lowest_x(batch, PAGE)
+    target = np.where(has_target, target, batch.salamander_x)
+    if policy == DODGE:
+        # clear every bomb that could still land on the salamander, on whichever side is nearer
+        # and has room, before chasing pages
+        salamander, bomb = point.salamander_hitbox, point.bomb_hitbox
+        reach = (salamander.width + bomb.width) / 2 + 2 * SALAMANDER_SPEED
+        top = SALAMANDER_START_Y - salamander.height / 2
+        bomb_x = batch.x[:, BOMB]
+        overhead = (batch.alive[:, BOMB] & (batch.y[:, BOMB] < top + salamander.height)
+                    & (batch.y[:, BOMB] + bomb.height > top - DODGE_LOOKAHEAD)
+                    & (np.abs(bomb_x - batch.salamander_x[:, None]) < reach))
+        threatened = overhead.any(axis=1)
+        clear_left = np.where(overhead, bomb_x, np.inf).min(axis=1) - reach
+        clear_right = np.where(overhead, bomb_x, -np.inf).max(axis=1) + reach
+        go_left = (clear_left >= MIN_X_POSITION) & ((clear_right > MAX_X_POSITION)
+                                                    | (batch.salamander_x - clear_left < clear_right - batch.salamander_x))
+        target = np.where(threatened, np.where(go_left, clear_left, clear_right), target)
+    offset = target - batch.salamander_x
+    return offset < -SALAMANDER_SPEED / 2, offset > SALAMANDER_SPEED / 2
+
+
+def spawn(batch: Batch, kind: int, spawn_rate: int, max_objects: int, rng: np.random.Generator):
+    """
+    Spawns an object of one kind at the top, in each game that rolls a 1 and has room
+    Args:
+        batch (Batch): Batch instance
+        kind (int): PAGE or BOMB
+        spawn_rate (int): one in this many frames spawns, on average
+        max_objects (int): most objects of the kind at once
+        rng (np.random.Generator): random stream of the batch
+    """
+    games = len(batch.playing)
+    alive = batch.alive[:, kind]
+    roll = rng.integers(1, spawn_rate + 1, size=games) == 1
+    x = rng.integers(MIN_X_POSITION, MAX_X_POSITION + 1, size=games)
+    rows = np.flatnonzero(roll & (alive.sum(axis=1) < max_objects) & batch.playing)
+    slots = np.argmin(alive[rows], axis=1)
+    batch.x[rows, kind, slots] = x[rows]
+    batch.y[rows, kind, slots] = 0
+    batch.alive[rows, kind, slots] = True
+
+
+def step_batch(batch: Batch, point: SweepPoint, frame: int, rng: np.random.Generator):
+    """
+    Advances every game still being played by one frame, following the stages of simulation.step()
+    Args:
+        batch (Batch): Batch instance
+        point (SweepPoint): settings and policy of the batch
+        frame (int): frame number, starting from 0
+        rng (np.random.Generator): random stream of the batch
+    """
+    left, right = choose_keys(batch, point, rng)
+    # steer: move by last frame's speed, then pick the speed from the held keys
+    batch.salamander_x += batch.salamander_speed
+    batch.salamander_speed = np.where(right & (batch.salamander_x < MAX_X_POSITION), SALAMANDER_SPEED,
+                                      np.where(left & (batch.salamander_x > MIN_X_POSITION),
+                                               -SALAMANDER_SPEED, 0))
+    spawn(batch, PAGE, point.spawn_rate, point.max_objects, rng)
+    spawn(batch, BOMB, point.spawn_rate, point.max_objects, rng)
+    batch.y[:, PAGE] += point.page_speed
+    batch.y[:, BOMB] += point.bomb_speed
+    batch.alive &= batch.y < SCREEN_HEIGHT
+    # collide, with the boxes placed as salamander_box() places them; boxes that only share an edge do not touch
+    salamander = point.salamander_hitbox
+    left_edge = (batch.salamander_x - salamander.width / 2).astype(np.int64)[:, None, None]
+    top_edge = int(SALAMANDER_START_Y - salamander.height / 2)
+    widths, heights = kind_sizes(point.page_hitbox, point.bomb_hitbox)
+    widths, heights = widths[None, :, None], heights[None, :, None]
+    hits = (batch.alive & (batch.y < top_edge + salamander.height) & (top_edge < batch.y + heights)
+            & (batch.x - widths / 2 < left_edge + salamander.width) & (left_edge < batch.x + widths / 2))
+    # games that already ended keep their final score and hearts
+    hits &= batch.playing[:, None, None]
+    batch.alive &= ~hits
+    pages = hits[:, PAGE].sum(axis=1)
+    bombs = hits[:, BOMB].sum(axis=1)
+    # pages are scored before bombs, and each bomb takes 2 pages off, never going below 0
+    batch.page_count = np.maximum(batch.page_count + pages - 2 * bombs, 0)
+    batch.hearts -= bombs
+    fell = batch.playing & (batch.hearts <= 0)
+    batch.survived_frames[fell] = frame + 1
+    batch.playing &= ~fell
+
+
+def simulate_point(point: SweepPoint, games: int, horizon: int, seed: int) -> dict:
+    """
+    Simulates a batch of games for one sweep point
+    Args:
+        point (SweepPoint): settings and policy to simulate
+        games (int): number of games
+        horizon (int): most frames to play, after which the games still going count as survivors
+        seed (int): seed of the batch's random stream
+    Returns:
+        dict: the sweep point, its survival curve and its score distribution
+    """
+    rng = np.random.default_rng(seed)
+    batch = create_batch(games, point.max_objects)
+    curve = [1.0]
+    for frame in range(horizon):
+        step_batch(batch, point, frame, rng)
+        if (frame + 1) % FRAMES_PER_SECOND == 0:
+            curve.append(float(batch.playing.mean()))
+        if not batch.playing.any():
+            break
+    batch.survived_frames[batch.playing] = horizon
+    seconds = batch.survived_frames / FRAMES_PER_SECOND
+    scores = batch.page_count
+    return {
+        **asdict(point),
+        'preset': preset_name(point),
+        'games': games,
+        'survival_curve': curve,
+        'survived_horizon': float(batch.playing.mean()),
+        'mean_survival_seconds': float(seconds.mean()),
+        'median_survival_seconds': float(np.median(seconds)),
+        'mean_score': float(scores.mean()),
+        'score_quantiles': dict(zip(map(str, SCORE_QUANTILES), np.quantile(scores, SCORE_QUANTILES).tolist())),
+        'score_histogram': np.bincount(scores).tolist(),
+    }
+
+
+def preset_name(point: SweepPoint) -> str:
+    """
+    Names the difficulty preset a sweep point's settings match, if any. Only a point played
+    the way the game plays a preset, with MAX_OBJECTS and the default hitboxes, is named
+    Args:
+        point (SweepPoint): SweepPoint instance
+    Returns:
+        str: the preset's name, or "" if the settings are not a preset
+    """
+    played_as_game = (point.max_objects, point.page_hitbox, point.bomb_hitbox, point.salamander_hitbox) == \
+        (MAX_OBJECTS, PAGE_HITBOX, BOMB_HITBOX, SALAMANDER_HITBOX)
+    for name, settings in DIFFICULTY_SETTINGS.items():
+        if settings == (point.page_speed, point.bomb_speed, point.spawn_rate) and played_as_game:
+            return name
+    return ""
+
+
+def run_point(task: tuple[SweepPoint, int, int, int]) -> dict:
+    """
+    Pool entry point unpacking the arguments of simulate_point()
+    Args:
+        task (tuple[SweepPoint, int, int, int]): sweep point, games, horizon and seed
+    Returns:
+        dict: result of simulate_point()
+    """
+    return simulate_point(*task)
+
+
+def sweep(points: list[SweepPoint], games: int = DEFAULT_GAMES, horizon: int = DEFAULT_HORIZON,
+          seed: int = SWEEP_SEED, workers: Optional[int] = None) -> list[dict]:
+    """
+    Simulates every sweep point across a process pool
+    Args:
+        points (list[SweepPoint]): sweep points to simulate
+        games (int): games per sweep point
+        horizon (int): most frames per game
+        seed (int): seed the batches' random streams are derived from
+        workers (Optional[int]): number of worker processes, None for one per CPU
+    Returns:
+        list[dict]: results of simulate_point(), in the order of points
+    """
+    seeds = [int(sequence.generate_state(1)[0]) for sequence in np.random.SeedSequence(seed).spawn(len(points))]
+    tasks = [(point, games, horizon, point_seed) for point, point_seed in zip(points, seeds)]
+    with Pool(workers or os.cpu_count()) as pool:
+        return pool.map(run_point, tasks, chunksize=1)
+
+
+def print_results(results: list[dict]):
+    """
+    Prints a table of survival and score for every sweep point
+    Args:
+        results (list[dict]): results of sweep()
+    """
+    print(f"{'page':>5}{'bomb':>5}{'rate':>5}{'max':>5}  {'policy':<8}{'preset':<8}"
+          f"{'survive s':>10}{'median s':>9}{'at end':>8}{'score':>7}{'p10':>6}{'p50':>6}{'p90':>6}")
+    for result in results:
+        quantiles = result['score_quantiles']
+        print(f"{result['page_speed']:>5}{result['bomb_speed']:>5}{result['spawn_rate']:>5}{result['max_objects']:>5}  "
+              f"{result['policy']:<8}{result['preset']:<8}{result['mean_survival_seconds']:>10.1f}"
+              f"{result['median_survival_seconds']:>9.1f}{result['survived_horizon']:>8.0%}{result['mean_score']:>7.1f}"
+              f"{quantiles['0.1']:>6.0f}{quantiles['0.5']:>6.0f}{quantiles['0.9']:>6.0f}")
+
+
+def main():
+    presets = list(DIFFICULTY_SETTINGS.values())
+    parser = argparse.ArgumentParser(description="Sweep difficulty settings over simulated games")
+    parser.add_argument('--page-speeds', type=int, nargs='+', default=sorted({p for p, _, _ in presets}))
+    parser.add_argument('--bomb-speeds', type=int, nargs='+', default=sorted({b for _, b, _ in presets}))
+    parser.add_argument('--spawn-rates', type=int, nargs='+', default=sorted({r for _, _, r in presets}))
+    parser.add_argument('--max-objects', type=int, nargs='+', default=[MAX_OBJECTS])
+    parser.add_argument('--policies', nargs='+', default=POLICIES, choices=POLICIES)
+    parser.add_argument('--games', type=int, default=DEFAULT_GAMES, help="games per sweep point")
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help="most frames per game")
+    parser.add_argument('--seed', type=int, default=SWEEP_SEED)
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument('--output', help="file to write every result to as JSON")
+    args = parser.parse_args()
+    points = [SweepPoint(*combination) for combination in itertools.product(
+        args.page_speeds, args.bomb_speeds, args.spawn_rates, args.max_objects, args.policies)]
+    started = perf_counter()
+    results = sweep(points, args.games, args.horizon, args.seed, args.workers)
+    print_results(results)
+    print(f"{len(points)} sweep points of {args.games} games in {perf_counter() - started:.1f}s")
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Tracking and outlining the regions of the screen repainted each frame.
+
+Designer repaints only the rectangles under sprites that moved or changed, and
+pushes just those rectangles to the display. This module reads the same
+rectangles before and after each frame is drawn and keeps totals of how much of
+the screen was updated, counting overlaps once. In debug mode it outlines every
+region drawn on, so whatever is still costing fill rate is easy to spot.
+"""
+from dataclasses import dataclass, field
+
+import pygame
+from designer import get_director, register
+
+DEBUG_OUTLINE_COLOR = (255, 0, 255)
+
+
+@dataclass
+class DirtyRegionTracker:
+    """ Regions updated on the last frame, and totals over every frame tracked """
+    debug: bool = False
+    pending: list[pygame.Rect] = field(default_factory=list)
+    last_regions: list[pygame.Rect] = field(default_factory=list)
+    last_area: int = 0
+    frames: int = 0
+    regions: int = 0
+    area: int = 0
+    screen_area: int = 0
+
+
+DIRTY_TRACKER = DirtyRegionTracker()
+
+
+def clip_rects(rects: list[pygame.Rect], bounds: pygame.Rect) -> list[pygame.Rect]:
+    """
+    Clips rectangles to the screen, dropping empty ones and exact repeats
+    Args:
+        rects (list[pygame.Rect]): rectangles in any order
+        bounds (pygame.Rect): the screen
+    Returns:
+        list[pygame.Rect]: clipped rectangles, in their first order
+    """
+    seen = set()
+    clipped = []
+    for rect in rects:
+        rect = bounds.clip(rect)
+        key = tuple(rect)
+        if rect.width > 0 and rect.height > 0 and key not in seen:
+            seen.add(key)
+            clipped.append(rect)
+    return clipped
+
+
+def union_area(rects: list[pygame.Rect]) -> int:
+    """
+    Counts the pixels covered by at least one rectangle, so overlaps are only counted once
+    Args:
+        rects (list[pygame.Rect]): rectangles, possibly overlapping
+    Returns:
+        int: covered area in pixels
+    """
+    edges = sorted({rect.left for rect in rects} | {rect.right for rect in rects})
+    area = 0
+    for left, right in zip(edges, edges[1:]):
+        spans = sorted((rect.top, rect.bottom) for rect in rects if rect.left <= left and right <= rect.right)
+        covered = 0
+        top = bottom = None
+        for span_top, span_bottom in spans:
+            if bottom is None or span_top > bottom:
+                if bottom is not None:
+                    covered += bottom - top
+                top, bottom = span_top, span_bottom
+            else:
+                bottom = max(bottom, span_bottom)
+        if bottom is not None:
+            covered += bottom - top
+        area += covered * (right - left)
+    return area
+
+
+def dirty_fraction(tracker: DirtyRegionTracker = DIRTY_TRACKER) -> float:
+    """
+    Average share of the screen updated per frame
+    Args:
+        tracker (DirtyRegionTracker): DirtyRegionTracker instance
+    Returns:
+        float: between 0 and 1, 0 before any frame is tracked
+    """
+    if tracker.frames == 0 or tracker.screen_area == 0:
+        return 0.0
+    return tracker.area / (tracker.frames * tracker.screen_area)
+
+
+def reset_dirty_regions(tracker: DirtyRegionTracker = DIRTY_TRACKER):
+    """
+    Forgets the totals, for example when a new scene starts
+    Args:
+        tracker (DirtyRegionTracker): DirtyRegionTracker instance
+    """
+    tracker.frames = 0
+    tracker.regions = 0
+    tracker.area = 0
+
+
+def capture_pending_regions():
+    """
+    Before a frame is drawn, remembers the rectangles Designer is about to repaint over the
+    previous frame. Designer appends to the same list while drawing, so it is read after drawing
+    """
+    DIRTY_TRACKER.pending = get_director().current_scene._clear_this_frame
+
+
+def track_dirty_regions():
+    """
+    After a frame is drawn, adds the regions it updated to the totals and, in debug mode,
+    outlines the regions drawn on. Those are repainted on the next frame, which erases the outlines
+    """
+    tracker = DIRTY_TRACKER
+    scene = get_director().current_scene
+    screen = scene._surface
+    bounds = screen.get_rect()
+    drawn = clip_rects(scene._clear_this_frame, bounds)
+    # Designer updated what it cleared from the previous frame and everything it drew on this one
+    regions = clip_rects(tracker.pending + drawn, bounds)
+    tracker.pending = []
+    tracker.last_regions = regions
+    tracker.last_area = union_area(regions)
+    tracker.frames += 1
+    tracker.regions += len(regions)
+    tracker.area += tracker.last_area
+    tracker.screen_area = bounds.width * bounds.height
+    if tracker.debug and drawn:
+        for rect in drawn:
+            pygame.draw.rect(screen, DEBUG_OUTLINE_COLOR, rect, 1)
+        pygame.display.update(drawn)
+        pygame.display.set_caption(f"{len(regions)} regions, "
+                                   f"{100 * tracker.last_area / tracker.screen_area:.1f}% of the screen updated")
+
+
+def watch_dirty_regions(scenes: list[str]):
+    """
+    Tracks the regions updated on every frame of some scenes
+    Args:
+        scenes (list[str]): names of the scenes to track
+    """
+    register('director.pre_render', capture_pending_regions, targets=scenes)
+    register('director.post_render', track_dirty_regions, targets=scenes)
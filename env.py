@@ -0,0 +1,361 @@
+"""
+Gym-style environments for automated players, stepping the headless simulation.
+
+SalamanderEnv plays one game through reset(seed) and step(action), in the shape of
+the Gymnasium API but without depending on it. Each observation is a flat float32
+vector: the salamander's x, hearts left and page count, then the x and y of every
+page and then every bomb on screen, lowest first, with -1 filling the rows of
+objects that are not there.
+
+VectorEnv runs many games split across worker processes. Actions, observations,
+rewards and done flags live in one shared memory block that the workers write
+into directly, so a step costs one short message per worker and no copying or
+pickling of observations. A game that ends is reset inside its worker, and the
+observation returned for it is the first of the next game.
+
+Usage: python env.py [--envs N] [--workers N] [--steps N]   measures steps per second
+"""
+import argparse
+import os
+from dataclasses import dataclass
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from random import Random
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+
+from simulation import GameState, Inputs, MAX_OBJECTS, new_game, reset_game, step
+from falling_store import PAGE, BOMB
+from replay import Replay
+
+# actions, as the arrow keys held for the step
+ACTION_NONE = 0
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+NUM_ACTIONS = 3
+
+# value in the rows of pages and bombs that are not on screen
+MISSING = -1.0
+# salamander x, hearts left and page count come before the pages and bombs
+HEADER_SIZE = 3
+
+# messages sent to the workers
+RESET = 'reset'
+STEP = 'step'
+CLOSE = 'close'
+
+
+def observation_size(max_objects: int = MAX_OBJECTS) -> int:
+    """
+    Length of an observation vector
+    Args:
+        max_objects (int): most pages, and separately bombs, that can fall at once
+    Returns:
+        int: number of floats in each observation
+    """
+    return HEADER_SIZE + 4 * max_objects
+
+
+def write_observation(state: GameState, observation: np.ndarray):
+    """
+    Fills an observation vector from the state of a game
+    Args:
+        state (GameState): GameState instance
+        observation (np.ndarray): float32 vector of observation_size() values
+    """
+    store = state.objects
+    width = 2 * state.max_objects
+    # the store holds a few dozen slots, which plain lists sort faster than NumPy can
+    objects = sorted(zip(store.y.tolist(), store.kind.tolist(), store.x.tolist(), store.alive.tolist()),
+                     reverse=True)
+    positions = ([], [])
+    for y, kind, x, alive in objects:
+        if alive:
+            positions[kind].extend((x, y))
+    values = [state.salamander_x, state.hearts_remaining, state.page_count]
+    for kind in (PAGE, BOMB):
+        rows = positions[kind][:width]
+        values += rows + [MISSING] * (width - len(rows))
+    observation[:] = values
+
+
+class SalamanderEnv:
+    """ One game, played one step per call """
+
+    def __init__(self, settings_mode: str = 'medium', max_objects: int = MAX_OBJECTS,
+                 max_steps: Optional[int] = None, geometry: Optional[Replay] = None,
+                 observation: Optional[np.ndarray] = None):
+        """
+        Args:
+            settings_mode (str): difficulty of every game
+            max_objects (int): most pages, and separately bombs, that can fall at once
+            max_steps (Optional[int]): steps after which a game is cut short, None to play it out
+            geometry (Optional[Replay]): recorded run to copy the sprites' hitboxes and bitmasks from,
+                None to collide with the default boxes
+            observation (Optional[np.ndarray]): float32 vector to write observations into, such as a row of
+                shared memory, None to allocate one
+        """
+        self.settings_mode = settings_mode
+        self.max_steps = max_steps
+        self.state = new_game(None, settings_mode, max_objects)
+        if geometry is not None:
+            self.state.page_hitbox, self.state.bomb_hitbox, self.state.salamander_hitbox = geometry.hitboxes
+            self.state.page_mask, self.state.bomb_mask, self.state.salamander_mask = geometry.masks
+        self.inputs = Inputs()
+        self.observation = observation if observation is not None else \
+            np.zeros(observation_size(max_objects), dtype=np.float32)
+
+    def reset(self, seed: Optional[int] = None) -> tuple[np.ndarray, dict]:
+        """
+        Starts a new game
+        Args:
+            seed (Optional[int]): seed for the spawns, None for an unseeded game
+        Returns:
+            tuple[np.ndarray, dict]: first observation, and an empty info dict
+        """
+        reset_game(self.state, seed, self.settings_mode)
+        write_observation(self.state, self.observation)
+        return self.observation, {}
+
+    def step(self, action: int) -> tuple[np.ndarray, float, bool, bool, dict]:
+        """
+        Holds the keys for an action for one frame
+        Args:
+            action (int): ACTION_NONE, ACTION_LEFT or ACTION_RIGHT
+        Returns:
+            tuple[np.ndarray, float, bool, bool, dict]: observation, change in page count, whether the
+                game is over, whether it was cut short by max_steps, and the events of the step
+        """
+        state = self.state
+        self.inputs.left = action == ACTION_LEFT
+        self.inputs.right = action == ACTION_RIGHT
+        page_count = state.page_count
+        events = step(state, self.inputs)
+        write_observation(state, self.observation)
+        truncated = self.max_steps is not None and state.frame >= self.max_steps and not state.game_over
+        return self.observation, float(state.page_count - page_count), state.game_over, truncated, \
+            {'events': events}
+
+
+@dataclass
+class SharedBuffers:
+    """ Arrays of every game in a VectorEnv, all views of one shared memory block """
+    memory: SharedMemory
+    observations: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    terminated: np.ndarray
+    truncated: np.ndarray
+
+
+def attach_buffers(memory: SharedMemory, num_envs: int, max_objects: int) -> SharedBuffers:
+    """
+    Lays out the arrays of a VectorEnv over a shared memory block
+    Args:
+        memory (SharedMemory): block of at least buffers_size() bytes
+        num_envs (int): number of games
+        max_objects (int): most pages, and separately bombs, in each game
+    Returns:
+        SharedBuffers: SharedBuffers instance
+    """
+    arrays = []
+    offset = 0
+    for dtype, shape in buffer_layout(num_envs, max_objects):
+        array = np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset)
+        arrays.append(array)
+        offset += array.nbytes
+    return SharedBuffers(memory, *arrays)
+
+
+def buffer_layout(num_envs: int, max_objects: int) -> list[tuple[type, tuple[int, ...]]]:
+    """
+    Type and shape of each array in SharedBuffers, in order, with the widest first so each stays aligned
+    Args:
+        num_envs (int): number of games
+        max_objects (int): most pages, and separately bombs, in each game
+    Returns:
+        list[tuple[type, tuple[int, ...]]]: dtype and shape of observations, actions, rewards,
+            terminated and truncated
+    """
+    return [(np.float32, (num_envs, observation_size(max_objects))),
+            (np.float32, (num_envs,)),
+            (np.float32, (num_envs,)),
+            (np.bool_, (num_envs,)),
+            (np.bool_, (num_envs,))]
+
+
+def buffers_size(num_envs: int, max_objects: int) -> int:
+    """
+    Bytes of shared memory needed by a VectorEnv
+    Args:
+        num_envs (int): number of games
+        max_objects (int): most pages, and separately bombs, in each game
+    Returns:
+        int: size in bytes
+    """
+    return sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for dtype, shape in buffer_layout(num_envs, max_objects))
+
+
+def run_worker(connection: Connection, memory_name: str, num_envs: int, first: int, last: int,
+               settings_mode: str, max_objects: int, max_steps: Optional[int], geometry: Optional[Replay]):
+    """
+    Plays games first to last of a VectorEnv in a worker process, until told to close
+    Args:
+        connection (Connection): end of the pipe to the VectorEnv
+        memory_name (str): name of the shared memory block
+        num_envs (int): number of games in the whole VectorEnv
+        first (int): index of this worker's first game
+        last (int): index after this worker's last game
+        settings_mode (str): difficulty of every game
+        max_objects (int): most pages, and separately bombs, in each game
+        max_steps (Optional[int]): steps after which a game is cut short
+        geometry (Optional[Replay]): recorded run to copy hitboxes and bitmasks from
+    """
+    memory = SharedMemory(memory_name)
+    buffers = attach_buffers(memory, num_envs, max_objects)
+    envs = [SalamanderEnv(settings_mode, max_objects, max_steps, geometry, buffers.observations[index])
+            for index in range(first, last)]
+    # each game draws the seeds of the games after it from its own stream, so runs repeat exactly
+    seed_streams = [Random() for _ in envs]
+    try:
+        while True:
+            message, seeds = connection.recv()
+            if message == CLOSE:
+                break
+            if message == RESET:
+                for env, stream, seed in zip(envs, seed_streams, seeds[first:last]):
+                    stream.seed(seed)
+                    env.reset(seed)
+            elif message == STEP:
+                actions = buffers.actions[first:last].tolist()
+                for offset, (env, stream, action) in enumerate(zip(envs, seed_streams, actions)):
+                    _, reward, terminated, truncated, _ = env.step(action)
+                    index = first + offset
+                    buffers.rewards[index] = reward
+                    buffers.terminated[index] = terminated
+                    buffers.truncated[index] = truncated
+                    if terminated or truncated:
+                        env.reset(stream.getrandbits(32))
+            connection.send(None)
+    finally:
+        del buffers
+        memory.close()
+
+
+class VectorEnv:
+    """ Many games stepped together in worker processes, sharing their arrays through shared memory """
+
+    def __init__(self, num_envs: int, workers: Optional[int] = None, settings_mode: str = 'medium',
+                 max_objects: int = MAX_OBJECTS, max_steps: Optional[int] = None,
+                 geometry: Optional[Replay] = None):
+        """
+        Args:
+            num_envs (int): number of games
+            workers (Optional[int]): number of worker processes, None for one per CPU
+            settings_mode (str): difficulty of every game
+            max_objects (int): most pages, and separately bombs, in each game
+            max_steps (Optional[int]): steps after which a game is cut short, None to play it out
+            geometry (Optional[Replay]): recorded run to copy the sprites' hitboxes and bitmasks from
+        """
+        workers = min(workers or os.cpu_count() or 1, num_envs)
+        self.num_envs = num_envs
+        self.memory = SharedMemory(create=True, size=buffers_size(num_envs, max_objects))
+        self.buffers = attach_buffers(self.memory, num_envs, max_objects)
+        self.connections = []
+        self.processes = []
+        bounds = np.linspace(0, num_envs, workers + 1).astype(int).tolist()
+        for first, last in zip(bounds, bounds[1:]):
+            parent, child = Pipe()
+            process = Process(target=run_worker, daemon=True,
+                              args=(child, self.memory.name, num_envs, first, last, settings_mode,
+                                    max_objects, max_steps, geometry))
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def broadcast(self, message: str, seeds: Optional[list[Optional[int]]] = None):
+        """
+        Sends a message to every worker and waits for all of them to finish it
+        Args:
+            message (str): RESET, STEP or CLOSE
+            seeds (Optional[list[Optional[int]]]): seed of each game, for RESET
+        """
+        for connection in self.connections:
+            connection.send((message, seeds))
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self, seed: Optional[int] = None) -> tuple[np.ndarray, dict]:
+        """
+        Starts a new game in every slot
+        Args:
+            seed (Optional[int]): seed of the first game, the others get the following seeds; None for unseeded games
+        Returns:
+            tuple[np.ndarray, dict]: observations of every game, shaped (num_envs, observation_size()),
+                and an empty info dict
+        """
+        seeds = [None if seed is None else seed + index for index in range(self.num_envs)]
+        self.broadcast(RESET, seeds)
+        return self.buffers.observations, {}
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict]:
+        """
+        Steps every game with its own action. Finished games start over on their own
+        Args:
+            actions (np.ndarray): one action per game
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict]: observations, rewards, terminated
+                and truncated flags of every game, and an empty info dict. The arrays are the shared
+                buffers themselves and are overwritten by the next step
+        """
+        self.buffers.actions[:] = actions
+        self.broadcast(STEP)
+        buffers = self.buffers
+        return buffers.observations, buffers.rewards, buffers.terminated, buffers.truncated, {}
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory
+        """
+        if not self.processes:
+            return
+        for connection in self.connections:
+            connection.send((CLOSE, None))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+        self.buffers = None
+        self.memory.close()
+        self.memory.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how many steps per second a VectorEnv sustains")
+    parser.add_argument('--envs', type=int, default=64, help="number of games")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes, one per CPU by default")
+    parser.add_argument('--steps', type=int, default=500, help="steps of every game to time")
+    parser.add_argument('--settings-mode', default='medium', help="difficulty of every game")
+    args = parser.parse_args()
+    envs = VectorEnv(args.envs, args.workers, args.settings_mode)
+    workers = len(envs.processes)
+    try:
+        envs.reset(0)
+        rng = np.random.default_rng(0)
+        started = perf_counter()
+        for _ in range(args.steps):
+            envs.step(rng.integers(NUM_ACTIONS, size=args.envs))
+        elapsed = perf_counter() - started
+    finally:
+        envs.close()
+    total = args.envs * args.steps
+    print(f"{total} steps across {args.envs} games and {workers} workers in {elapsed:.2f}s: "
+          f"{total / elapsed:.0f} steps/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Event-driven despawning and collision windows for objects falling at a steady speed.
+
+A page or bomb moves down by the same speed every step, so from where it is now,
+the step it reaches into the salamander's band, the step it drops below the band
+and the step it reaches the ground are all known in advance. A FallSchedule works
+them out once, when the object spawns, and files them in a timing wheel under the
+step they are due. Each step then only handles the events due: objects reaching
+into the band join the collision window, objects dropping below it leave, and
+objects reaching the ground are removed. The collision test only looks at the
+window, so the cost of a step follows the number of events rather than the
+number of objects falling.
+
+The schedule learns about new objects and speed changes from the FallingStore,
+which logs them, and works out every live object again when the band itself
+moves, such as when the salamander's hitbox changes.
+"""
+import math
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+from falling_store import FallingStore
+
+# what happens to an object when its event is due
+ENTER_WINDOW = 0
+LEAVE_WINDOW = 1
+LAND = 2
+
+
+@dataclass
+class FallSchedule:
+    """ Events due at each upcoming step, the objects in the collision window, and the band they were worked out for """
+    # step -> (event, slot, version) tuples, a version older than the slot's current one is stale
+    due: dict[int, list[tuple[int, int, int]]] = field(default_factory=dict)
+    window: set[int] = field(default_factory=set)
+    versions: dict[int, int] = field(default_factory=dict)
+    # top and bottom of the band and the height of each kind, None until the first step
+    band: Optional[tuple] = None
+
+
+def clear_fall_schedule(schedule: FallSchedule):
+    """
+    Forgets every event and every object in the window
+    Args:
+        schedule (FallSchedule): FallSchedule instance
+    """
+    schedule.due.clear()
+    schedule.window.clear()
+    schedule.band = None
+
+
+def steps_until(position: float, speed: float, limit: float, strict: bool) -> Optional[int]:
+    """
+    Fewest steps after which a position moving by speed each step reaches a limit
+    Args:
+        position (float): position now
+        speed (float): distance moved each step
+        limit (float): position to reach
+        strict (bool): whether it must go past the limit rather than reach it
+    Returns:
+        Optional[int]: number of steps, 0 if it is there already, None if it never gets there
+    """
+    if position > limit or (position == limit and not strict):
+        return 0
+    if speed <= 0:
+        return None
+    steps = max(math.ceil((limit - position) / speed), 1)
+    # the division can round either way, so settle on the first step that gets there when moved
+    # the way the store moves it
+    if strict:
+        while steps > 1 and position + speed * (steps - 1) > limit:
+            steps -= 1
+        while position + speed * steps <= limit:
+            steps += 1
+    else:
+        while steps > 1 and position + speed * (steps - 1) >= limit:
+            steps -= 1
+        while position + speed * steps < limit:
+            steps += 1
+    return steps
+
+
+def file_event(schedule: FallSchedule, step: int, event: int, slot: int, version: int):
+    """
+    Adds an event to the wheel under the step it is due
+    Args:
+        schedule (FallSchedule): FallSchedule instance
+        step (int): step the event is due
+        event (int): ENTER_WINDOW, LEAVE_WINDOW or LAND
+        slot (int): slot of the object
+        version (int): version of the slot's schedule the event belongs to
+    """
+    events = schedule.due.get(step)
+    if events is None:
+        schedule.due[step] = [(event, slot, version)]
+    else:
+        events.append((event, slot, version))
+
+
+def schedule_slot(schedule: FallSchedule, store: FallingStore, slot: int, step: int, heights: np.ndarray,
+                  ground_y: float):
+    """
+    Works out when an object enters and leaves the window and lands, from where it is at this
+    step, replacing anything scheduled for the slot before
+    Args:
+        schedule (FallSchedule): FallSchedule instance
+        store (FallingStore): FallingStore instance
+        slot (int): slot of the object
+        step (int): step being run
+        heights (np.ndarray): hitbox height for each kind
+        ground_y (float): y position of the ground
+    """
+    version = schedule.versions.get(slot, 0) + 1
+    schedule.versions[slot] = version
+    schedule.window.discard(slot)
+    top, bottom = schedule.band[0], schedule.band[1]
+    y = float(store.y[slot])
+    speed = float(store.speed[slot])
+    lands = steps_until(y, speed, ground_y, False)
+    if lands is not None:
+        file_event(schedule, step + lands, LAND, slot, version)
+    # in the window while its top is above the band's bottom and its bottom below the band's top
+    leaves = steps_until(y, speed, bottom, False)
+    enters = steps_until(float(heights[store.kind[slot]]) + y, speed, top, True)
+    if enters is not None and (leaves is None or enters < leaves):
+        file_event(schedule, step + enters, ENTER_WINDOW, slot, version)
+        if leaves is not None:
+            file_event(schedule, step + leaves, LEAVE_WINDOW, slot, version)
+
+
+def refresh_schedule(schedule: FallSchedule, store: FallingStore, step: int, band: tuple, heights: np.ndarray,
+                     ground_y: float):
+    """
+    Schedules the objects spawned and the kinds whose speed changed since the last step,
+    or every live object if the band has moved
+    Args:
+        schedule (FallSchedule): FallSchedule instance
+        store (FallingStore): FallingStore instance
+        step (int): step being run
+        band (tuple): top and bottom of the band and the height of each kind
+        heights (np.ndarray): hitbox height for each kind
+        ground_y (float): y position of the ground
+    """
+    if band != schedule.band:
+        schedule.band = band
+        schedule.due.clear()
+        schedule.window.clear()
+        slots = np.flatnonzero(store.alive).tolist()
+    else:
+        slots = store.spawned
+        if store.retimed:
+            retimed = np.isin(store.kind, store.retimed) & store.alive
+            slots = slots + np.flatnonzero(retimed).tolist()
+    for slot in slots:
+        if store.alive[slot]:
+            schedule_slot(schedule, store, slot, step, heights, ground_y)
+    store.spawned.clear()
+    store.retimed.clear()
+
+
+def run_due_events(schedule: FallSchedule, store: FallingStore, step: int):
+    """
+    Handles the events due at a step: landed objects are removed and the window is updated
+    Args:
+        schedule (FallSchedule): FallSchedule instance
+        store (FallingStore): FallingStore instance
+        step (int): step being run
+    """
+    events = schedule.due.pop(step, None)
+    if events is None:
+        return
+    versions = schedule.versions
+    for event, slot, version in events:
+        if versions[slot] != version:
+            continue
+        if event == ENTER_WINDOW:
+            schedule.window.add(slot)
+        else:
+            schedule.window.discard(slot)
+            if event == LAND:
+                store.alive[slot] = False
+
+
+def window_slots(schedule: FallSchedule, store: FallingStore) -> np.ndarray:
+    """
+    Live objects in the collision window, dropping any removed since they entered
+    Args:
+        schedule (FallSchedule): FallSchedule instance
+        store (FallingStore): FallingStore instance
+    Returns:
+        np.ndarray: slots, in no particular order
+    """
+    window = schedule.window
+    slots = np.fromiter(window, dtype=np.intp, count=len(window))
+    live = slots[store.alive[slots]]
+    if len(live) < len(slots):
+        window.intersection_update(live.tolist())
+    return live
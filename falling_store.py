@@ -0,0 +1,162 @@
+"""
+Struct-of-arrays store for the pages and bombs falling down the screen.
+
+Each falling object is a slot in a set of parallel NumPy arrays rather than a
+Python object, so moving and culling every object is a single vectorized
+operation per frame no matter how many are alive. The collision broadphase in
+collision.py works on the same columns.
+
+Spawning and speed changes are also logged, so a FallSchedule can work out
+when the new or changed objects will need handling without looking at the rest.
+
+The store also owns scratch columns that counting, culling and the broadphase
+write their intermediate results into, so a frame does not allocate temporary
+arrays the size of the store.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+
+PAGE = 0
+BOMB = 1
+
+
+@dataclass
+class FallingStore:
+    """ Fixed-capacity columns for falling objects, a slot is in use while alive is set """
+    x: np.ndarray
+    y: np.ndarray
+    speed: np.ndarray
+    # intp, so it indexes per-kind arrays without being copied to another type first
+    kind: np.ndarray
+    alive: np.ndarray
+    # reused for intermediate results, their contents mean nothing between calls
+    mask_buffer: np.ndarray
+    band_buffer: np.ndarray
+    value_buffer: np.ndarray
+    # slots spawned, and kinds whose speed changed, since a FallSchedule last took them
+    spawned: list[int] = field(default_factory=list)
+    retimed: list[int] = field(default_factory=list)
+
+
+def create_falling_store(capacity: int) -> FallingStore:
+    """
+    Creates an empty store
+    Args:
+        capacity (int): most objects that can be alive at once
+    Returns:
+        FallingStore: FallingStore instance
+    """
+    return FallingStore(np.zeros(capacity, dtype=np.float64),
+                        np.zeros(capacity, dtype=np.float64),
+                        np.zeros(capacity, dtype=np.float64),
+                        np.zeros(capacity, dtype=np.intp),
+                        np.zeros(capacity, dtype=np.bool_),
+                        np.zeros(capacity, dtype=np.bool_),
+                        np.zeros(capacity, dtype=np.bool_),
+                        np.zeros(capacity, dtype=np.float64))
+
+
+def clear_falling(store: FallingStore):
+    """
+    Removes every object from the store
+    Args:
+        store (FallingStore): FallingStore instance
+    """
+    store.alive[:] = False
+    store.spawned.clear()
+    store.retimed.clear()
+
+
+def spawn_falling(store: FallingStore, kind: int, x: float, y: float, speed: float) -> int:
+    """
+    Puts a new object into the first free slot
+    Args:
+        store (FallingStore): FallingStore instance
+        kind (int): PAGE or BOMB
+        x (float): x position of the middle of the top edge
+        y (float): y position of the top edge
+        speed (float): pixels moved down each frame
+    Returns:
+        int: slot of the new object
+    """
+    slot = int(np.argmin(store.alive))
+    if store.alive[slot]:
+        raise ValueError(f"FallingStore is full, all {len(store.alive)} slots are in use")
+    store.x[slot] = x
+    store.y[slot] = y
+    store.speed[slot] = speed
+    store.kind[slot] = kind
+    store.alive[slot] = True
+    store.spawned.append(slot)
+    return slot
+
+
+def count_falling(store: FallingStore, kind: int) -> int:
+    """
+    Counts live objects of one kind
+    Args:
+        store (FallingStore): FallingStore instance
+        kind (int): PAGE or BOMB
+    Returns:
+        int: number alive
+    """
+    return int(np.count_nonzero(mark_kind(store, kind)))
+
+
+def live_slots(store: FallingStore, kind: int) -> np.ndarray:
+    """
+    Finds the slots holding live objects of one kind
+    Args:
+        store (FallingStore): FallingStore instance
+        kind (int): PAGE or BOMB
+    Returns:
+        np.ndarray: slot indexes in ascending order
+    """
+    return np.flatnonzero(mark_kind(store, kind))
+
+
+def mark_kind(store: FallingStore, kind: int) -> np.ndarray:
+    """
+    Marks the live objects of one kind in the store's mask buffer
+    Args:
+        store (FallingStore): FallingStore instance
+        kind (int): PAGE or BOMB
+    Returns:
+        np.ndarray: mask_buffer, set for each live slot of that kind
+    """
+    mask = np.equal(store.kind, kind, out=store.mask_buffer)
+    mask &= store.alive
+    return mask
+
+
+def set_falling_speed(store: FallingStore, kind: int, speed: float):
+    """
+    Changes the speed of every object of one kind, alive or not
+    Args:
+        store (FallingStore): FallingStore instance
+        kind (int): PAGE or BOMB
+        speed (float): pixels moved down each frame
+    """
+    store.speed[store.kind == kind] = speed
+    store.retimed.append(kind)
+
+
+def move_falling(store: FallingStore):
+    """
+    Moves every live object down by its speed
+    Args:
+        store (FallingStore): FallingStore instance
+    """
+    np.add(store.y, store.speed, out=store.y, where=store.alive)
+
+
+def cull_falling(store: FallingStore, ground_y: float):
+    """
+    Removes objects that have reached the ground
+    Args:
+        store (FallingStore): FallingStore instance
+        ground_y (float): y position of the ground
+    """
+    store.alive &= np.less(store.y, ground_y, out=store.mask_buffer)
+
@@ -0,0 +1,188 @@
+"""
+Per-frame timing samples kept in a fixed-size ring buffer, with Chrome trace export.
+
+Each sample holds when a frame's update started, the time since the previous frame,
+how long the update took and how many pages and bombs were alive. Samples are
+written into preallocated NumPy columns, and every time the buffer fills it is
+appended to a trace file in the Chrome trace event format, which chrome://tracing
+and Perfetto both open even while the game is still writing it.
+
+Each trace gets a numbered file of its own from numbered_trace_path(), so a new
+trace never overwrites one written earlier in the session or by an earlier one.
+A trace still open when the program exits is finished before it does.
+"""
+import atexit
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional, TextIO
+
+import numpy as np
+
+# number of recent frames kept, also how many are written to the trace at a time
+DEFAULT_PROFILER_CAPACITY = 256
+
+
+@dataclass
+class FrameProfiler:
+    """ Ring buffer of frame samples; count is the total ever recorded """
+    start_ns: np.ndarray
+    interval_ns: np.ndarray
+    work_ns: np.ndarray
+    pages: np.ndarray
+    bombs: np.ndarray
+    count: int = 0
+    flushed: int = 0
+    last_start_ns: Optional[int] = None
+    enabled: bool = False
+    trace_file: Optional[TextIO] = None
+    # whether close_trace() has been registered to run at exit
+    closes_at_exit: bool = False
+
+
+def create_frame_profiler(capacity: int = DEFAULT_PROFILER_CAPACITY) -> FrameProfiler:
+    """
+    Creates a profiler with room for a fixed number of frames
+    Args:
+        capacity (int): number of recent frames kept
+    Returns:
+        FrameProfiler: FrameProfiler instance
+    """
+    return FrameProfiler(np.zeros(capacity, dtype=np.int64),
+                         np.zeros(capacity, dtype=np.int64),
+                         np.zeros(capacity, dtype=np.int64),
+                         np.zeros(capacity, dtype=np.int32),
+                         np.zeros(capacity, dtype=np.int32))
+
+
+def record_frame(profiler: FrameProfiler, start_ns: int, work_ns: int, pages: int, bombs: int):
+    """
+    Stores one frame, appending the buffer to the trace file each time it fills
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+        start_ns (int): perf_counter_ns when the frame's update started
+        work_ns (int): how long the update took in nanoseconds
+        pages (int): pages alive
+        bombs (int): bombs alive
+    """
+    capacity = len(profiler.start_ns)
+    slot = profiler.count % capacity
+    interval = 0 if profiler.last_start_ns is None else start_ns - profiler.last_start_ns
+    profiler.start_ns[slot] = start_ns
+    profiler.interval_ns[slot] = interval
+    profiler.work_ns[slot] = work_ns
+    profiler.pages[slot] = pages
+    profiler.bombs[slot] = bombs
+    profiler.last_start_ns = start_ns
+    profiler.count += 1
+    if profiler.trace_file is not None and profiler.count - profiler.flushed >= capacity:
+        flush_trace(profiler)
+
+
+def recent_slots(profiler: FrameProfiler, frames: int) -> np.ndarray:
+    """
+    Finds the buffer slots of the most recent frames
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+        frames (int): how many frames to look back
+    Returns:
+        np.ndarray: slot indexes, oldest first
+    """
+    capacity = len(profiler.start_ns)
+    frames = min(frames, profiler.count, capacity)
+    return np.arange(profiler.count - frames, profiler.count) % capacity
+
+
+def recent_frame_times(profiler: FrameProfiler, frames: int) -> np.ndarray:
+    """
+    Time between the most recent frames in milliseconds
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+        frames (int): how many frames to look back
+    Returns:
+        np.ndarray: frame times, oldest first
+    """
+    return profiler.interval_ns[recent_slots(profiler, frames)] / 1e6
+
+
+def frames_per_second(profiler: FrameProfiler, frames: int = 30) -> float:
+    """
+    Frame rate over the most recent frames
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+        frames (int): how many frames to average over
+    Returns:
+        float: frames per second, 0 before two frames have been recorded
+    """
+    times = recent_frame_times(profiler, frames)
+    times = times[times > 0]
+    return 1000 / times.mean() if len(times) else 0.0
+
+
+def numbered_trace_path(path: str) -> str:
+    """
+    First free numbered file next to a trace path, such as frame_trace-0003.json for frame_trace.json
+    Args:
+        path (str): trace file the numbered ones are named after
+    Returns:
+        str: path of a file that does not exist yet
+    """
+    root, extension = os.path.splitext(path)
+    number = 1
+    while os.path.exists(f"{root}-{number:04d}{extension}"):
+        number += 1
+    return f"{root}-{number:04d}{extension}"
+
+
+def open_trace(profiler: FrameProfiler, path: str):
+    """
+    Starts streaming frames to a new Chrome trace file. Only frames recorded from now on are written.
+    The trace is finished when the program exits, if close_trace() has not been called by then
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+        path (str): trace file to create, which must not exist yet
+    """
+    profiler.trace_file = open(path, 'x')
+    if not profiler.closes_at_exit:
+        atexit.register(close_trace, profiler)
+        profiler.closes_at_exit = True
+    # the JSON array format allows the closing bracket to be missing until close_trace()
+    profiler.trace_file.write('[')
+    profiler.flushed = profiler.count
+
+
+def flush_trace(profiler: FrameProfiler):
+    """
+    Appends every frame recorded since the last flush to the trace file
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+    """
+    lines = []
+    for slot in recent_slots(profiler, profiler.count - profiler.flushed).tolist():
+        start_us = int(profiler.start_ns[slot]) / 1000
+        lines.append(json.dumps({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': start_us,
+                                 'dur': int(profiler.work_ns[slot]) / 1000}))
+        lines.append(json.dumps({'name': 'frame time (ms)', 'ph': 'C', 'pid': 1, 'ts': start_us,
+                                 'args': {'ms': int(profiler.interval_ns[slot]) / 1e6}}))
+        lines.append(json.dumps({'name': 'entities', 'ph': 'C', 'pid': 1, 'ts': start_us,
+                                 'args': {'pages': int(profiler.pages[slot]),
+                                          'bombs': int(profiler.bombs[slot])}}))
+    if lines:
+        separator = '\n' if profiler.trace_file.tell() <= 1 else ',\n'
+        profiler.trace_file.write(separator + ',\n'.join(lines))
+        profiler.trace_file.flush()
+    profiler.flushed = profiler.count
+
+
+def close_trace(profiler: FrameProfiler):
+    """
+    Writes any remaining frames and closes the trace file
+    Args:
+        profiler (FrameProfiler): FrameProfiler instance
+    """
+    if profiler.trace_file is None:
+        return
+    flush_trace(profiler)
+    profiler.trace_file.write('\n]\n')
+    profiler.trace_file.close()
+    profiler.trace_file = None
@@ -0,0 +1,172 @@
+"""
+HUD text drawn from cached glyphs and redrawn only when its value changes.
+
+Each font, size and color gets a glyph atlas holding every character rendered
+once. A HudText is bound to a value and composes its image by copying glyphs out
+of the atlas, and only when the value differs from the one it last showed, so a
+score that changes a few times a minute costs nothing on the other frames.
+"""
+from dataclasses import dataclass, field
+from typing import Any
+
+import pygame
+from designer import DesignerObject
+from designer.colors import _process_color
+from designer.core.internal_image import InternalImage
+from designer.objects.text import Text
+
+from assets import surface_sprite
+
+# characters rendered into a new atlas up front, others are added the first time they are shown
+PRELOADED_GLYPHS = "0123456789 "
+# most composed strings each atlas keeps, so values that come back (like difficulty names) are free
+MAX_CACHED_STRINGS = 64
+
+
+@dataclass
+class GlyphAtlas:
+    """ Every character rendered once in one font, size and color """
+    font: pygame.font.Font
+    color: tuple[int, int, int]
+    glyphs: dict[str, pygame.Surface] = field(default_factory=dict)
+    strings: dict[str, InternalImage] = field(default_factory=dict)
+
+
+@dataclass
+class HudText:
+    """ Sprite showing a value, with the value it last composed """
+    sprite: DesignerObject
+    atlas: GlyphAtlas
+    value: Any
+    redraws: int = 0
+
+
+ATLASES: dict[tuple[str, int, tuple[int, int, int]], GlyphAtlas] = {}
+
+
+def glyph_atlas(color: str, text_size: int, font_name: str = Text.DEFAULT_FONT_NAME) -> GlyphAtlas:
+    """
+    Gets the shared atlas for a font, size and color, creating it the first time
+    Args:
+        color (str): color of the text
+        text_size (int): font size
+        font_name (str): system font name, the same default as Designer's text()
+    Returns:
+        GlyphAtlas: GlyphAtlas instance
+    """
+    rgb = tuple(_process_color(color))
+    key = (font_name, text_size, rgb)
+    atlas = ATLASES.get(key)
+    if atlas is None:
+        atlas = GlyphAtlas(pygame.font.SysFont(font_name, text_size), rgb)
+        for character in PRELOADED_GLYPHS:
+            glyph(atlas, character)
+        ATLASES[key] = atlas
+    return atlas
+
+
+def glyph(atlas: GlyphAtlas, character: str) -> pygame.Surface:
+    """
+    Gets one character from an atlas, rendering it the first time
+    Args:
+        atlas (GlyphAtlas): GlyphAtlas instance
+        character (str): single character
+    Returns:
+        pygame.Surface: rendered character
+    """
+    surface = atlas.glyphs.get(character)
+    if surface is None:
+        surface = atlas.font.render(character, True, atlas.color)
+        atlas.glyphs[character] = surface
+    return surface
+
+
+def compose_text(atlas: GlyphAtlas, string: str) -> InternalImage:
+    """
+    Lays glyphs from an atlas side by side, reusing the result if the string was composed before.
+    The returned image is shared, so it must not be drawn on
+    Args:
+        atlas (GlyphAtlas): GlyphAtlas instance
+        string (str): text to compose
+    Returns:
+        InternalImage: composed text
+    """
+    composed = atlas.strings.get(string)
+    if composed is not None:
+        return composed
+    glyphs = [glyph(atlas, character) for character in string]
+    width = max(sum(surface.get_width() for surface in glyphs), 1)
+    composed = InternalImage(size=(width, atlas.font.get_height()))
+    x = 0
+    for surface in glyphs:
+        composed._surf.blit(surface, (x, 0))
+        x += surface.get_width()
+    if len(atlas.strings) >= MAX_CACHED_STRINGS:
+        atlas.strings.pop(next(iter(atlas.strings)))
+    atlas.strings[string] = composed
+    return composed
+
+
+def atlas_text(color: str, string: str, text_size: int, x: float, y: float, **kwargs) -> DesignerObject:
+    """
+    Creates a text sprite from a glyph atlas, in place of Designer's text() for text that is shown often
+    Args:
+        color (str): color of the text
+        string (str): text to show
+        text_size (int): font size
+        x (float): x position
+        y (float): y position
+        **kwargs: other properties of the sprite, such as layer or anchor
+    Returns:
+        DesignerObject: text sprite
+    """
+    sprite = surface_sprite(compose_text(glyph_atlas(color, text_size), string), **kwargs)
+    sprite.x = x
+    sprite.y = y
+    return sprite
+
+
+def set_atlas_text(sprite: DesignerObject, color: str, string: str, text_size: int):
+    """
+    Changes the text of a sprite made by atlas_text()
+    Args:
+        sprite (DesignerObject): text sprite
+        color (str): color of the text
+        string (str): text to show
+        text_size (int): font size
+    """
+    sprite.image = compose_text(glyph_atlas(color, text_size), string)
+
+
+def create_hud_text(color: str, value: Any, text_size: int, x: float, y: float, **kwargs) -> HudText:
+    """
+    Creates HUD text showing a value
+    Args:
+        color (str): color of the text
+        value (Any): value to show, converted with str()
+        text_size (int): font size
+        x (float): x position
+        y (float): y position
+        **kwargs: other properties of the sprite, such as layer or anchor
+    Returns:
+        HudText: HudText instance
+    """
+    atlas = glyph_atlas(color, text_size)
+    sprite = surface_sprite(compose_text(atlas, str(value)), **kwargs)
+    sprite.x = x
+    sprite.y = y
+    return HudText(sprite, atlas, value)
+
+
+def bind_hud_text(hud: HudText, value: Any):
+    """
+    Shows a value, recomposing the text only if it changed
+    Args:
+        hud (HudText): HudText instance
+        value (Any): value to show, converted with str()
+    """
+    if value == hud.value:
+        return
+    hud.value = value
+    hud.redraws += 1
+    hud.sprite.image = compose_text(hud.atlas, str(value))
@@ -0,0 +1,109 @@
+"""
+How long an arrow key takes to show on screen.
+
+Each press or release of an arrow key that changes how the salamander moves is
+stamped with perf_counter_ns when Designer hands it to the world; a key that
+shows nothing, such as one pressed at a screen limit, is left out. The stamp
+goes with the first simulation step that moves the salamander by it, which
+depends on whether the game applies keys on the step they arrive. After every
+frame is drawn, the keys whose step has run are taken as shown, and the time
+since they arrived is recorded into a fixed-size ring buffer, so percentiles of
+recent keys can be reported. The time ends when the frame is handed to the
+display, which leaves out the display's own delay.
+"""
+import json
+from dataclasses import dataclass, field
+from time import perf_counter_ns
+
+import numpy as np
+
+# number of recent key events kept
+DEFAULT_LATENCY_CAPACITY = 1024
+
+
+@dataclass
+class InputLatency:
+    """ Keys not yet on screen, and the latency of the most recent ones in nanoseconds, oldest overwritten first """
+    latencies_ns: np.ndarray
+    count: int = 0
+    # perf_counter_ns when each key arrived, and the first step that moves the salamander by it
+    pending: list[tuple[int, int]] = field(default_factory=list)
+
+
+def create_input_latency(capacity: int = DEFAULT_LATENCY_CAPACITY) -> InputLatency:
+    """
+    Creates a latency recorder with room for a fixed number of key events
+    Args:
+        capacity (int): number of recent key events kept
+    Returns:
+        InputLatency: InputLatency instance
+    """
+    return InputLatency(np.zeros(capacity, dtype=np.int64))
+
+
+def note_key(latency: InputLatency, first_step: int):
+    """
+    Stamps a key event as it arrives
+    Args:
+        latency (InputLatency): InputLatency instance
+        first_step (int): first step that moves the salamander by it
+    """
+    latency.pending.append((perf_counter_ns(), first_step))
+
+
+def note_presented(latency: InputLatency, steps_run: int):
+    """
+    Records the latency of every key shown by the frame just drawn
+    Args:
+        latency (InputLatency): InputLatency instance
+        steps_run (int): number of steps run before the frame was drawn
+    """
+    if not latency.pending:
+        return
+    now = perf_counter_ns()
+    waiting = []
+    for arrived, first_step in latency.pending:
+        if first_step < steps_run:
+            latency.latencies_ns[latency.count % len(latency.latencies_ns)] = now - arrived
+            latency.count += 1
+        else:
+            waiting.append((arrived, first_step))
+    latency.pending = waiting
+
+
+def forget_pending(latency: InputLatency):
+    """
+    Drops the keys not yet shown, for when the run they belong to is over
+    Args:
+        latency (InputLatency): InputLatency instance
+    """
+    latency.pending.clear()
+
+
+def latency_percentiles(latency: InputLatency) -> dict[str, float]:
+    """
+    Summarizes the latency of recent key events
+    Args:
+        latency (InputLatency): InputLatency instance
+    Returns:
+        dict[str, float]: p50, p95, p99 and max in milliseconds, and how many keys were sampled
+    """
+    recent = latency.latencies_ns[:min(latency.count, len(latency.latencies_ns))] / 1e6
+    if not len(recent):
+        return {'keys': 0}
+    return {'p50_ms': float(np.percentile(recent, 50)),
+            'p95_ms': float(np.percentile(recent, 95)),
+            'p99_ms': float(np.percentile(recent, 99)),
+            'max_ms': float(recent.max()),
+            'keys': len(recent)}
+
+
+def write_input_latency(latency: InputLatency, path: str):
+    """
+    Writes the latency summary to a JSON file
+    Args:
+        latency (InputLatency): InputLatency instance
+        path (str): file to write
+    """
+    with open(path, 'w') as latency_file:
+        json.dump(latency_percentiles(latency), latency_file, indent=2)
@@ -0,0 +1,165 @@
+"""
+High scores for each difficulty, kept in a local SQLite file across sessions.
+
+A Leaderboard never touches the file on the main thread once it is open. Scores
+are handed to a writer thread through a queue, and the writer commits whatever
+has queued up in one transaction, so ending a run never waits on the disk's
+fsync. The scores shown come from a top-k list per difficulty kept in memory:
+it is read once when the leaderboard opens, with an indexed query that stays
+fast however many runs the file holds, and a new score is merged into it as it
+is submitted, before the writer has stored it.
+"""
+import atexit
+import sqlite3
+import threading
+from bisect import insort
+from dataclasses import dataclass, field
+from queue import SimpleQueue
+from time import time
+from typing import Optional
+
+# most scores kept in memory, and shown, for each difficulty
+TOP_SCORES = 5
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS scores (mode TEXT NOT NULL, score INTEGER NOT NULL, recorded REAL NOT NULL)",
+    # answers the top-k query from the index alone, already in order
+    "CREATE INDEX IF NOT EXISTS scores_by_mode ON scores (mode, score DESC)",
+]
+
+
+@dataclass
+class Leaderboard:
+    """ The best scores for each difficulty, and the writer thread storing new ones """
+    path: str
+    k: int
+    top: dict[str, list[int]]
+    # (mode, score, time) for each score not yet stored, None to stop the writer
+    queue: SimpleQueue
+    writer: Optional[threading.Thread] = None
+    submitted: int = 0
+    written: int = 0
+    write_errors: list[str] = field(default_factory=list)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens the score file, creating the table and index if they are missing
+    Args:
+        path (str): SQLite file
+    Returns:
+        sqlite3.Connection: connection for the calling thread
+    """
+    connection = sqlite3.connect(path)
+    # readers in other sessions are not blocked while a batch is written
+    connection.execute("PRAGMA journal_mode=WAL")
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+def query_top_scores(connection: sqlite3.Connection, mode: str, k: int) -> list[int]:
+    """
+    Reads the best scores for a difficulty from the file
+    Args:
+        connection (sqlite3.Connection): open connection
+        mode (str): difficulty the scores were set on
+        k (int): most scores to read
+    Returns:
+        list[int]: scores, highest first
+    """
+    rows = connection.execute("SELECT score FROM scores WHERE mode = ? ORDER BY score DESC LIMIT ?", (mode, k))
+    return [score for score, in rows]
+
+
+def write_scores(leaderboard: Leaderboard):
+    """
+    Stores queued scores until told to stop, each batch in one transaction. Runs on the writer thread
+    Args:
+        leaderboard (Leaderboard): Leaderboard instance
+    """
+    connection = sqlite3.connect(leaderboard.path)
+    stopping = False
+    while not stopping:
+        batch = [leaderboard.queue.get()]
+        while not leaderboard.queue.empty():
+            batch.append(leaderboard.queue.get())
+        if None in batch:
+            stopping = True
+            batch = [entry for entry in batch if entry is not None]
+        if not batch:
+            continue
+        try:
+            with connection:
+                connection.executemany("INSERT INTO scores VALUES (?, ?, ?)", batch)
+            leaderboard.written += len(batch)
+        except sqlite3.Error as error:
+            # the scores stay in memory for this session, the game goes on without them stored
+            leaderboard.write_errors.append(str(error))
+    connection.close()
+
+
+def open_leaderboard(path: str, modes: list[str], k: int = TOP_SCORES) -> Leaderboard:
+    """
+    Reads the best scores for each difficulty and starts the writer thread. Scores still queued
+    when the program exits are stored before it does
+    Args:
+        path (str): SQLite file, created if it does not exist
+        modes (list[str]): difficulties to read the scores of
+        k (int): most scores to keep for each difficulty
+    Returns:
+        Leaderboard: Leaderboard instance
+    """
+    connection = connect(path)
+    top = {mode: query_top_scores(connection, mode, k) for mode in modes}
+    connection.close()
+    leaderboard = Leaderboard(path, k, top, SimpleQueue())
+    leaderboard.writer = threading.Thread(target=write_scores, args=(leaderboard,), name='leaderboard',
+                                          daemon=True)
+    leaderboard.writer.start()
+    atexit.register(close_leaderboard, leaderboard)
+    return leaderboard
+
+
+def submit_score(leaderboard: Leaderboard, mode: str, score: int):
+    """
+    Adds a score to the best scores shown and queues it to be stored, without waiting for it
+    Args:
+        leaderboard (Leaderboard): Leaderboard instance
+        mode (str): difficulty the score was set on
+        score (int): final score of the run
+    """
+    scores = leaderboard.top.setdefault(mode, [])
+    if len(scores) < leaderboard.k or score > scores[-1]:
+        insort(scores, score, key=lambda kept: -kept)
+        del scores[leaderboard.k:]
+    leaderboard.submitted += 1
+    leaderboard.queue.put((mode, score, time()))
+
+
+def top_scores(leaderboard: Leaderboard, mode: str) -> list[int]:
+    """
+    Best scores for a difficulty, including ones submitted but not yet stored
+    Args:
+        leaderboard (Leaderboard): Leaderboard instance
+        mode (str): difficulty
+    Returns:
+        list[int]: at most k scores, highest first
+    """
+    return leaderboard.top.get(mode, [])
+
+
+def close_leaderboard(leaderboard: Leaderboard, timeout: Optional[float] = None):
+    """
+    Stores every score still queued and stops the writer thread. Does nothing once closed
+    Args:
+        leaderboard (Leaderboard): Leaderboard instance
+        timeout (Optional[float]): most seconds to wait for the writer, None to wait until it is done
+    """
+    writer = leaderboard.writer
+    if writer is None:
+        return
+    leaderboard.writer = None
+    leaderboard.queue.put(None)
+    writer.join(timeout)
@@ -0,0 +1,179 @@
+"""
+Decoding and scaling images on worker threads before the scenes that show them start.
+
+A Preloader hands every image and emoji a scene will need to a thread pool.
+Decoding and smooth scaling run in pygame's C code without holding the GIL, so
+they proceed while the main thread keeps drawing the current scene. The main
+thread picks up finished surfaces each frame with collect_preloaded() and adds
+them to the asset cache, so the scenes that need them later find them there.
+Images and emojis are converted to the display's pixel format on the worker,
+an image before it is transformed as when load_image() misses the cache, so
+both give the same pixels and storing them on the main thread copies nothing.
+wait_for_preloaded() is the readiness barrier: it blocks only on whatever is
+still loading, and returns at once when everything already is.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Union
+
+import pygame
+from designer.core.internal_image import InternalImage
+
+from assets import (ASSET_CACHE, AssetCache, image_key, emoji_key, decode_image_file, transform_surface,
+                    render_emoji, store_loaded_surface, load_image, emoji_image)
+
+PRELOAD_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class ImageRequest:
+    """ An image file and how it will be transformed, the same arguments as load_image() """
+    filename: str
+    scale: float = 1.0
+    flip_x: bool = False
+    flip_y: bool = False
+    tint: Optional[tuple[int, int, int]] = None
+    size: Optional[tuple[int, int]] = None
+
+
+@dataclass(frozen=True)
+class EmojiRequest:
+    """ An emoji and its scale, the same arguments as emoji_image() """
+    name: str
+    scale: float = 1.0
+
+
+@dataclass
+class Preloader:
+    """ Images loading on worker threads, each with the cache key and name it will be stored under """
+    executor: ThreadPoolExecutor
+    pending: dict[Future, tuple[tuple, str]]
+    total: int
+    cache: AssetCache
+    on_progress: Optional[Callable[[int, int], None]] = None
+    loaded: int = 0
+    failed: list[str] = field(default_factory=list)
+
+
+def request_key(request: Union[ImageRequest, EmojiRequest]) -> tuple:
+    """
+    Key a requested image is cached under
+    Args:
+        request (Union[ImageRequest, EmojiRequest]): ImageRequest or EmojiRequest instance
+    Returns:
+        tuple: cache key
+    """
+    if isinstance(request, EmojiRequest):
+        return emoji_key(request.name, request.scale)
+    return image_key(request.filename, request.scale, request.flip_x, request.flip_y, request.tint, request.size)
+
+
+def load_request(request: Union[ImageRequest, EmojiRequest], cache: AssetCache = ASSET_CACHE) -> InternalImage:
+    """
+    Gets a requested image on the main thread, from the cache if it was preloaded
+    Args:
+        request (Union[ImageRequest, EmojiRequest]): ImageRequest or EmojiRequest instance
+        cache (AssetCache): AssetCache instance
+    Returns:
+        InternalImage: the image
+    """
+    if isinstance(request, EmojiRequest):
+        return emoji_image(request.name, request.scale, cache)
+    return load_image(request.filename, request.scale, request.flip_x, request.flip_y, request.tint,
+                      request.size, cache)
+
+
+def decode_image(request: ImageRequest) -> pygame.Surface:
+    """
+    Reads and transforms an image file, converting it before transforming it as load_image() does.
+    Runs on a worker thread
+    Args:
+        request (ImageRequest): ImageRequest instance
+    Returns:
+        pygame.Surface: transformed surface
+    """
+    return transform_surface(decode_image_file(request.filename), request.scale, request.flip_x,
+                             request.flip_y, request.tint, request.size)
+
+
+def start_preloading(images: list[ImageRequest], emojis: list[EmojiRequest],
+                     on_progress: Optional[Callable[[int, int], None]] = None,
+                     workers: int = PRELOAD_WORKERS, cache: AssetCache = ASSET_CACHE) -> Preloader:
+    """
+    Starts loading images and emojis on worker threads, skipping any already cached
+    Args:
+        images (list[ImageRequest]): image files to load
+        emojis (list[EmojiRequest]): emojis to render
+        on_progress (Optional[Callable[[int, int], None]]): called on the main thread with the number
+            loaded so far and the total, each time collect_preloaded() stores more
+        workers (int): number of worker threads
+        cache (AssetCache): AssetCache instance to store them in
+    Returns:
+        Preloader: Preloader instance
+    """
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='preload')
+    pending = {}
+    for request in images:
+        key = request_key(request)
+        if key not in cache.entries:
+            pending[executor.submit(decode_image, request)] = (key, request.filename)
+    for request in emojis:
+        key = request_key(request)
+        if key not in cache.entries:
+            pending[executor.submit(render_emoji, request.name, request.scale)] = (key, request.name)
+    preloader = Preloader(executor, pending, len(pending), cache, on_progress)
+    if not pending:
+        executor.shutdown(wait=False)
+    return preloader
+
+
+def preload_ready(preloader: Preloader) -> bool:
+    """
+    Whether every image has been loaded and stored
+    Args:
+        preloader (Preloader): Preloader instance
+    Returns:
+        bool: True once nothing is pending
+    """
+    return not preloader.pending
+
+
+def collect_preloaded(preloader: Preloader) -> bool:
+    """
+    Stores every image the workers have finished in the cache, without waiting for the others.
+    Must run on the main thread, since it adds them to the cache; the workers have already
+    converted them
+    Args:
+        preloader (Preloader): Preloader instance
+    Returns:
+        bool: True once every image is stored
+    """
+    finished = [future for future in preloader.pending if future.done()]
+    if not finished:
+        return preload_ready(preloader)
+    for future in finished:
+        key, name = preloader.pending.pop(future)
+        if future.exception() is not None:
+            # left out of the cache, so loading it when it is needed raises the error where it matters
+            preloader.failed.append(name)
+        else:
+            store_loaded_surface(preloader.cache, key, future.result(), name)
+        preloader.loaded += 1
+    if preloader.on_progress is not None:
+        preloader.on_progress(preloader.loaded, preloader.total)
+    if not preloader.pending:
+        preloader.executor.shutdown(wait=False)
+    return preload_ready(preloader)
+
+
+def wait_for_preloaded(preloader: Preloader, timeout: Optional[float] = None) -> bool:
+    """
+    Blocks until every image is loaded, then stores them in the cache
+    Args:
+        preloader (Preloader): Preloader instance
+        timeout (Optional[float]): most seconds to wait, None to wait for all of them
+    Returns:
+        bool: True if every image is stored, False if the timeout ran out first
+    """
+    wait(list(preloader.pending), timeout)
+    return collect_preloaded(preloader)
@@ -0,0 +1,98 @@
+"""
+On-screen frame-time graph, FPS and entity counts drawn from a FrameProfiler.
+
+The graph is painted into one of two preallocated surfaces each frame and the
+sprite is switched to it, so showing the overlay does not allocate a new surface
+every frame. The labels are HUD text drawn from cached glyphs and recomposed
+only when what they show changes, so the overlay does not rasterize text into
+the frame times it is measuring.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import pygame
+from designer import DesignerObject
+from designer.core.internal_image import InternalImage
+
+from assets import surface_sprite
+from hud_text import HudText, create_hud_text, bind_hud_text
+from frame_profiler import FrameProfiler, recent_frame_times, frames_per_second
+
+GRAPH_WIDTH = 240
+GRAPH_HEIGHT = 80
+# frame time at the top of the graph, and the budget line for 30 updates per second
+GRAPH_MAX_MS = 66.7
+FRAME_BUDGET_MS = 1000 / 30
+
+
+@dataclass
+class ProfilerOverlay:
+    """ Graph sprite with two surfaces it alternates between, and labels beneath it """
+    graph: DesignerObject
+    buffers: list[InternalImage]
+    fps_label: HudText
+    entity_label: HudText
+    front: int = 0
+
+
+def create_profiler_overlay(x: int, y: int) -> ProfilerOverlay:
+    """
+    Creates the overlay with its top left corner at a position
+    Args:
+        x (int): left edge of the overlay
+        y (int): top edge of the overlay
+    Returns:
+        ProfilerOverlay: ProfilerOverlay instance
+    """
+    buffers = [InternalImage(size=(GRAPH_WIDTH, GRAPH_HEIGHT)) for _ in range(2)]
+    graph = surface_sprite(buffers[0], layer='top')
+    graph.anchor = 'topleft'
+    graph.x = x
+    graph.y = y
+    fps_label = create_hud_text('black', "", 16, x, y + GRAPH_HEIGHT + 4, anchor='topleft', layer='top')
+    entity_label = create_hud_text('black', "", 16, x, y + GRAPH_HEIGHT + 22, anchor='topleft', layer='top')
+    return ProfilerOverlay(graph, buffers, fps_label, entity_label)
+
+
+def set_overlay_visible(overlay: ProfilerOverlay, visible: bool):
+    """
+    Shows or hides every part of the overlay
+    Args:
+        overlay (ProfilerOverlay): ProfilerOverlay instance
+        visible (bool): whether to show it
+    """
+    overlay.graph.visible = visible
+    overlay.fps_label.sprite.visible = visible
+    overlay.entity_label.sprite.visible = visible
+
+
+def draw_profiler_overlay(overlay: ProfilerOverlay, profiler: FrameProfiler, pages: int, bombs: int,
+                          skipped_frames: Optional[int] = None):
+    """
+    Paints the latest frame times into the back surface and shows it, then updates the labels
+    Args:
+        overlay (ProfilerOverlay): ProfilerOverlay instance
+        profiler (FrameProfiler): FrameProfiler instance
+        pages (int): pages alive
+        bombs (int): bombs alive
+        skipped_frames (Optional[int]): draws skipped so far to keep up with the simulation, if counted
+    """
+    overlay.front = 1 - overlay.front
+    buffer = overlay.buffers[overlay.front]
+    surface = buffer._surf
+    surface.fill((255, 255, 255, 180))
+    times = recent_frame_times(profiler, GRAPH_WIDTH)
+    offset = GRAPH_WIDTH - len(times)
+    for column, frame_ms in enumerate(times.tolist()):
+        bar = int(min(frame_ms / GRAPH_MAX_MS, 1) * GRAPH_HEIGHT)
+        color = (200, 30, 30) if frame_ms > FRAME_BUDGET_MS * 1.5 else (30, 120, 30)
+        pygame.draw.line(surface, color, (offset + column, GRAPH_HEIGHT - 1),
+                         (offset + column, GRAPH_HEIGHT - 1 - bar))
+    budget_y = GRAPH_HEIGHT - 1 - int(FRAME_BUDGET_MS / GRAPH_MAX_MS * GRAPH_HEIGHT)
+    pygame.draw.line(surface, (0, 0, 0), (0, budget_y), (GRAPH_WIDTH, budget_y))
+    overlay.graph.image = buffer
+    bind_hud_text(overlay.fps_label, f"{frames_per_second(profiler):.0f} FPS")
+    label = f"pages {pages}  bombs {bombs}"
+    if skipped_frames is not None:
+        label += f"  skipped {skipped_frames}"
+    bind_hud_text(overlay.entity_label, label)
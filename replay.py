@@ -0,0 +1,199 @@
+"""
+Recording a seeded run's inputs and replaying it frame-exactly without a display.
+
+A replay holds everything a run depends on besides its inputs: the seed, the
+starting difficulty, whether keys took effect on the step they were held, and
+the collision geometry the view gave the simulation. The
+inputs are stored only on the frames where the held keys or the difficulty
+changed, as one frame number and one flags byte each, so a replay of a full game
+is a few kilobytes. replay_game() feeds the same inputs to step() on the same
+frames, as fast as the simulation runs.
+
+Usage: python replay.py session.npz
+"""
+import sys
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Optional
+
+import numpy as np
+
+from simulation import GameState, Inputs, Hitbox, DIFFICULTY_SETTINGS, new_game, step, update_difficulty_mode
+from stage_timer import StageTimer
+
+# bits of the flags byte stored with each change
+LEFT_HELD = 1
+RIGHT_HELD = 2
+# set when the difficulty was chosen in the settings before this frame, even if it did not change,
+# since choosing it again also restarts objects stopped by a fall
+DIFFICULTY_CHOSEN = 4
+# the difficulty is stored in the bits above those, as its position in DIFFICULTY_SETTINGS
+MODE_SHIFT = 3
+DIFFICULTY_MODES = list(DIFFICULTY_SETTINGS)
+
+
+@dataclass
+class Replay:
+    """ A seeded run's settings and collision geometry, and each frame where its inputs changed """
+    seed: int
+    settings_mode: str
+    max_objects: int
+    hitboxes: list[Hitbox]
+    masks: list[Optional[np.ndarray]]
+    frames: list[int] = field(default_factory=list)
+    flags: list[int] = field(default_factory=list)
+    length: int = 0
+    difficulty_chosen: bool = False
+    same_tick_input: bool = False
+
+
+def start_recording(state: GameState, seed: int) -> Replay:
+    """
+    Starts recording a run from its starting state
+    Args:
+        state (GameState): GameState instance, created by new_game() with the same seed
+        seed (int): seed the run was created with
+    Returns:
+        Replay: Replay instance with no inputs yet
+    """
+    return Replay(seed, state.settings_mode, state.max_objects,
+                  [state.page_hitbox, state.bomb_hitbox, state.salamander_hitbox],
+                  [state.page_mask, state.bomb_mask, state.salamander_mask],
+                  same_tick_input=state.same_tick_input)
+
+
+def input_flags(inputs: Inputs, settings_mode: str) -> int:
+    """
+    Packs held keys and the difficulty into one byte
+    Args:
+        inputs (Inputs): arrow keys held
+        settings_mode (str): current difficulty
+    Returns:
+        int: flags byte
+    """
+    flags = (LEFT_HELD if inputs.left else 0) | (RIGHT_HELD if inputs.right else 0)
+    return flags | DIFFICULTY_MODES.index(settings_mode) << MODE_SHIFT
+
+
+def record_difficulty(replay: Replay):
+    """
+    Notes that the difficulty was chosen in the settings, to be recorded with the next frame's inputs
+    Args:
+        replay (Replay): Replay instance
+    """
+    replay.difficulty_chosen = True
+
+
+def record_inputs(replay: Replay, state: GameState, inputs: Inputs):
+    """
+    Records the inputs for the frame about to be stepped, if they changed since the last one
+    Args:
+        replay (Replay): Replay instance
+        state (GameState): GameState instance, before step() is called
+        inputs (Inputs): arrow keys held for this frame
+    """
+    flags = input_flags(inputs, state.settings_mode)
+    chosen = replay.difficulty_chosen
+    if chosen:
+        flags |= DIFFICULTY_CHOSEN
+        replay.difficulty_chosen = False
+    if chosen or not replay.flags or replay.flags[-1] != flags:
+        replay.frames.append(state.frame)
+        replay.flags.append(flags)
+    replay.length = state.frame + 1
+
+
+def save_replay(replay: Replay, path: str):
+    """
+    Writes a replay to a compressed NumPy archive
+    Args:
+        replay (Replay): Replay instance
+        path (str): file to write, conventionally ending in .npz
+    """
+    arrays = {
+        'header': np.array([replay.seed, DIFFICULTY_MODES.index(replay.settings_mode),
+                            replay.max_objects, replay.length, replay.same_tick_input], dtype=np.int64),
+        'hitboxes': np.array([[box.width, box.height] for box in replay.hitboxes], dtype=np.float64),
+        'frames': np.array(replay.frames, dtype=np.uint32),
+        'flags': np.array(replay.flags, dtype=np.uint8),
+    }
+    for index, mask in enumerate(replay.masks):
+        if mask is not None:
+            arrays[f'mask{index}'] = np.packbits(mask, axis=1)
+            arrays[f'mask{index}_width'] = np.array(mask.shape[1])
+    with open(path, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+
+
+def load_replay(path: str) -> Replay:
+    """
+    Reads a replay written by save_replay()
+    Args:
+        path (str): replay file
+    Returns:
+        Replay: Replay instance
+    """
+    with np.load(path) as archive:
+        # replays from before same_tick_input have four header fields
+        seed, mode, max_objects, length, same_tick_input = (archive['header'].tolist() + [0])[:5]
+        hitboxes = [Hitbox(width, height) for width, height in archive['hitboxes'].tolist()]
+        masks = []
+        for index in range(len(hitboxes)):
+            if f'mask{index}' in archive:
+                width = int(archive[f'mask{index}_width'])
+                masks.append(np.unpackbits(archive[f'mask{index}'], axis=1, count=width).astype(np.bool_))
+            else:
+                masks.append(None)
+        return Replay(seed, DIFFICULTY_MODES[mode], max_objects, hitboxes, masks,
+                      archive['frames'].tolist(), archive['flags'].tolist(), length,
+                      same_tick_input=bool(same_tick_input))
+
+
+def replay_state(replay: Replay) -> GameState:
+    """
+    Creates the starting state of a recorded run
+    Args:
+        replay (Replay): Replay instance
+    Returns:
+        GameState: GameState instance
+    """
+    state = new_game(replay.seed, replay.settings_mode, replay.max_objects)
+    state.page_hitbox, state.bomb_hitbox, state.salamander_hitbox = replay.hitboxes
+    state.page_mask, state.bomb_mask, state.salamander_mask = replay.masks
+    state.same_tick_input = replay.same_tick_input
+    return state
+
+
+def replay_game(replay: Replay, timer: Optional[StageTimer] = None) -> tuple[GameState, list[str]]:
+    """
+    Re-runs a recorded run frame by frame, as fast as the simulation steps
+    Args:
+        replay (Replay): Replay instance
+        timer (Optional[StageTimer]): records how long each stage took, if given
+    Returns:
+        tuple[GameState, list[str]]: final state, and every event reported during the run
+    """
+    state = replay_state(replay)
+    inputs = Inputs()
+    events = []
+    change = 0
+    for frame in range(replay.length):
+        if change < len(replay.frames) and replay.frames[change] == frame:
+            flags = replay.flags[change]
+            inputs.left = bool(flags & LEFT_HELD)
+            inputs.right = bool(flags & RIGHT_HELD)
+            if flags & DIFFICULTY_CHOSEN:
+                state.settings_mode = DIFFICULTY_MODES[flags >> MODE_SHIFT]
+                update_difficulty_mode(state)
+            change += 1
+        events.extend(step(state, inputs, timer))
+    return state, events
+
+
+if __name__ == '__main__':
+    loaded = load_replay(sys.argv[1])
+    started = perf_counter()
+    final, _ = replay_game(loaded)
+    elapsed = perf_counter() - started
+    print(f"{final.frame} frames in {elapsed:.3f}s ({final.frame / max(elapsed, 1e-9):.0f} frames/s), "
+          f"pages {final.page_count}, hearts {final.hearts_remaining}, game over {final.game_over}")
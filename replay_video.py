@@ -0,0 +1,289 @@
+"""
+Rendering a recorded run to a video offline, faster than it was played.
+
+A replay holds the seed and every input change of a run, so the world scene
+can play it again without anyone at the keyboard. The frames are split into
+chunks, and each chunk is rendered by its own worker process, which starts the
+real world scene with SDL's dummy video driver the way benchmark.py does. A
+worker feeds the recorded inputs to the world frame by frame, updating without
+drawing until it reaches its chunk, then drawing each of its frames and encoding
+it straight from the display surface. Nothing waits for Designer's clock, and
+the chunks render side by side on as many cores as there are workers.
+
+Frames are written as a PNG sequence, or as one YUV4MPEG2 (.y4m) file: an
+uncompressed container of 4:4:4 frames that ffmpeg and most players read as is.
+The worker rendering the last chunk checks that the run ended the way the
+headless replay does.
+
+Usage:
+    python replay_video.py session.npz frames/              one PNG per frame in frames/
+    python replay_video.py session.npz session.y4m --format y4m
+    python replay_video.py session.npz frames/ --workers 8 --chunks 16
+
+Run it from the directory holding the game's images, like the game itself.
+"""
+import argparse
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+
+import numpy as np
+
+from replay import (Replay, load_replay, replay_game, LEFT_HELD, RIGHT_HELD, DIFFICULTY_CHOSEN, MODE_SHIFT,
+                    DIFFICULTY_MODES)
+from simulation import FRAMES_PER_SECOND, TIMESTEP_SECONDS, SCREEN_WIDTH, SCREEN_HEIGHT, update_difficulty_mode
+
+PNG = 'png'
+Y4M = 'y4m'
+FORMATS = [PNG, Y4M]
+Y4M_HEADER = f"YUV4MPEG2 W{SCREEN_WIDTH} H{SCREEN_HEIGHT} F{FRAMES_PER_SECOND}:1 Ip A1:1 C444\n"
+
+# BT.601 studio-swing RGB to YCbCr, as Y4M readers expect by default, in 8-bit fixed point:
+# the R, G and B weights of Y, Cb and Cr, and the offset each is shifted by once scaled back down
+YUV_WEIGHTS = [(66, 129, 25), (-38, -74, 112), (112, -94, -18)]
+YUV_OFFSETS = [16, 128, 128]
+# zlib level of the PNG frames; pygame saves at a level several times slower for a smaller file
+PNG_COMPRESSION = 1
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def frame_chunks(length: int, chunks: int) -> list[tuple[int, int]]:
+    """
+    Splits a run's frames into ranges of nearly equal length
+    Args:
+        length (int): number of frames
+        chunks (int): number of ranges wanted
+    Returns:
+        list[tuple[int, int]]: first frame and the frame after the last of each range, none of them empty
+    """
+    bounds = np.linspace(0, length, min(chunks, length) + 1).round().astype(int).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def yuv_planes(rgb: bytes) -> bytes:
+    """
+    Converts a frame to the Y, Cb and Cr planes of a 4:4:4 Y4M frame
+    Args:
+        rgb (bytes): RGB pixels row by row, as pygame.image.tobytes() gives them
+    Returns:
+        bytes: the three planes, one after another, each row by row
+    """
+    pixels = np.frombuffer(rgb, dtype=np.uint8).reshape(-1, 3)
+    channels = [pixels[:, channel].astype(np.uint16) for channel in range(3)]
+    planes = np.empty((3, len(pixels)), dtype=np.uint16)
+    for plane, weights, offset in zip(planes, YUV_WEIGHTS, YUV_OFFSETS):
+        # the offset goes in first, so a sum that ends up in range never goes below zero on the way
+        plane[:] = (offset << 8) + 128
+        for channel, weight in zip(channels, weights):
+            if weight > 0:
+                plane += channel * np.uint16(weight)
+            else:
+                plane -= channel * np.uint16(-weight)
+    planes >>= 8
+    return planes.astype(np.uint8).tobytes()
+
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    """
+    One chunk of a PNG file
+    Args:
+        kind (bytes): four-letter chunk type
+        data (bytes): chunk contents
+    Returns:
+        bytes: length, type, contents and checksum
+    """
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def write_png(path: str, rgb: bytes, width: int, height: int):
+    """
+    Writes an RGB frame as a PNG with unfiltered rows, compressed at PNG_COMPRESSION
+    Args:
+        path (str): file to write
+        rgb (bytes): RGB pixels row by row
+        width (int): width in pixels
+        height (int): height in pixels
+    """
+    rows = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    # each row starts with its filter type, 0 for none
+    rows[:, 0] = 0
+    rows[:, 1:] = np.frombuffer(rgb, dtype=np.uint8).reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    with open(path, 'wb') as file:
+        file.write(PNG_SIGNATURE + png_chunk(b'IHDR', header)
+                   + png_chunk(b'IDAT', zlib.compress(rows.tobytes(), PNG_COMPRESSION)) + png_chunk(b'IEND', b''))
+
+
+def chunk_part_path(output: str, index: int) -> str:
+    """
+    File the Y4M frames of one chunk are written to before they are joined
+    Args:
+        output (str): the video file being made
+        index (int): position of the chunk
+    Returns:
+        str: path of the part file
+    """
+    return f"{output}.part{index:04d}"
+
+
+def apply_replay_inputs(game, world, replay: Replay, change: int) -> int:
+    """
+    Holds the keys recorded for the world's current frame, and picks the difficulty if it was chosen then
+    Args:
+        game: the salamander_exists module
+        world (World): World instance
+        replay (Replay): Replay instance
+        change (int): position in the replay of the next input change
+    Returns:
+        int: position of the change after that, or the same one if this frame has none
+    """
+    if change < len(replay.frames) and replay.frames[change] == world.state.frame:
+        flags = replay.flags[change]
+        world.inputs.left = bool(flags & LEFT_HELD)
+        world.inputs.right = bool(flags & RIGHT_HELD)
+        if flags & DIFFICULTY_CHOSEN:
+            game.resume_from_settings(world, DIFFICULTY_MODES[flags >> MODE_SHIFT])
+        change += 1
+    return change
+
+
+def render_chunk(replay_path: str, start: int, end: int, output: str, output_format: str, index: int) -> dict:
+    """
+    Plays a replay in the world scene and draws the frames from start up to end. Starts Designer,
+    so it can only be called once per process
+    Args:
+        replay_path (str): replay file
+        start (int): first frame to draw
+        end (int): frame to stop before
+        output (str): directory for PNG frames, or the Y4M file being made
+        output_format (str): PNG or Y4M
+        index (int): position of the chunk
+    Returns:
+        dict: frames drawn, seconds spent updating and drawing, and the state at the end of the chunk
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    from designer import start as start_designer, stop, get_director, register
+    from designer.core.event import Event
+    import salamander_exists as game
+
+    replay = load_replay(replay_path)
+    game.DETERMINISTIC_SEED = replay.seed
+    game.MAX_FALLING_OBJECTS = replay.max_objects
+    game.FIXED_TICK_LOOP = False
+    game.SAME_TICK_INPUT = replay.same_tick_input
+    results = {}
+
+    def play():
+        if results:
+            return
+        started = perf_counter()
+        results['started'] = True
+        scene = get_director().current_scene
+        world = scene._game_state
+        if world.state.settings_mode != replay.settings_mode:
+            world.state.settings_mode = replay.settings_mode
+            update_difficulty_mode(world.state)
+        change = 0
+        part = open(chunk_part_path(output, index), 'wb') if output_format == Y4M else None
+        for frame in range(end):
+            change = apply_replay_inputs(game, world, replay, change)
+            # the events of one pass through Designer's update callback
+            scene._handle_event('director.pre_update')
+            scene._handle_event('director.update', Event(world=world, delta=TIMESTEP_SECONDS))
+            scene._handle_event('director.post_update')
+            if frame == start:
+                results['update_seconds'] = perf_counter() - started
+                started = perf_counter()
+            if frame < start:
+                continue
+            # and of its frame callback
+            scene._handle_event('director.pre_render')
+            scene._handle_event('director.render', Event(world=world))
+            scene._draw()
+            scene._handle_event('director.post_render')
+            surface = pygame.display.get_surface()
+            rgb = pygame.image.tobytes(surface, 'RGB')
+            if part is None:
+                write_png(os.path.join(output, f"frame_{frame:06d}.png"), rgb, *surface.get_size())
+            else:
+                part.write(b"FRAME\n")
+                part.write(yuv_planes(rgb))
+        if part is not None:
+            part.close()
+        state = world.state
+        results.update({'frames': end - start, 'draw_seconds': perf_counter() - started,
+                        'frame': state.frame, 'page_count': state.page_count,
+                        'hearts_remaining': state.hearts_remaining, 'game_over': state.game_over})
+        stop()
+
+    # before the world's own update handler, so no frame is run before the first recorded inputs are held
+    register('director.pre_update', play, targets=['world'])
+    start_designer(scene='world')
+    del results['started']
+    return results
+
+
+def render_replay(replay_path: str, output: str, output_format: str = PNG, workers: int = os.cpu_count(),
+                  chunks: int = 0) -> list[dict]:
+    """
+    Renders every frame of a replay, each chunk of frames in a worker process of its own
+    Args:
+        replay_path (str): replay file
+        output (str): directory for PNG frames, or the Y4M file to write
+        output_format (str): PNG or Y4M
+        workers (int): worker processes rendering at once
+        chunks (int): number of chunks to split the frames into, 0 for one per worker
+    Returns:
+        list[dict]: results of render_chunk() for each chunk, in order
+    """
+    replay = load_replay(replay_path)
+    ranges = frame_chunks(replay.length, chunks or workers)
+    if output_format == PNG:
+        os.makedirs(output, exist_ok=True)
+    # a fresh process for every chunk, since Designer starts only once in each
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), max_tasks_per_child=1) as pool:
+        futures = [pool.submit(render_chunk, replay_path, start, end, output, output_format, index)
+                   for index, (start, end) in enumerate(ranges)]
+        results = [future.result() for future in futures]
+    if output_format == Y4M:
+        with open(output, 'wb') as video:
+            video.write(Y4M_HEADER.encode('ascii'))
+            for index in range(len(ranges)):
+                with open(chunk_part_path(output, index), 'rb') as part:
+                    shutil.copyfileobj(part, video)
+                os.remove(chunk_part_path(output, index))
+    expected, _ = replay_game(replay)
+    last = results[-1]
+    if (last['frame'], last['page_count'], last['hearts_remaining']) != \
+            (expected.frame, expected.page_count, expected.hearts_remaining):
+        raise RuntimeError(f"The rendered run ended at frame {last['frame']} with {last['page_count']} pages and "
+                           f"{last['hearts_remaining']} hearts, the replay at frame {expected.frame} with "
+                           f"{expected.page_count} pages and {expected.hearts_remaining} hearts")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a recorded run to a PNG sequence or a Y4M video")
+    parser.add_argument('replay', help="replay file written with REPLAY_RECORD_FILE")
+    parser.add_argument('output', help="directory for the PNG frames, or the .y4m file to write")
+    parser.add_argument('--format', choices=FORMATS, default=PNG, help="PNG sequence or Y4M video")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes rendering at once")
+    parser.add_argument('--chunks', type=int, default=0, help="chunks to split the frames into, default one per worker")
+    args = parser.parse_args()
+    started = perf_counter()
+    results = render_replay(args.replay, args.output, args.format, args.workers, args.chunks)
+    elapsed = perf_counter() - started
+    frames = sum(result['frames'] for result in results)
+    played = frames / FRAMES_PER_SECOND
+    print(f"{frames} frames ({played:.1f}s of play) in {elapsed:.1f}s, {played / elapsed:.1f}x real time, "
+          f"{len(results)} chunks on {args.workers} workers")
+
+
+if __name__ == '__main__':
+    main()
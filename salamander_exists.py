@@ -1,22 +1,148 @@
 from dataclasses import dataclass
+from random import randrange
+from time import perf_counter_ns
+from typing import Optional, Union
+import pygame
 from designer import *
-from random import randint
-
-SALAMANDER_SPEED = 10
-MAX_OBJECTS = 7
+from designer import register
+from simulation import (GameState, Inputs, new_game, reset_game, step, update_difficulty_mode,
+                        difficulty_index, record_telemetry, input_lag_steps, next_steering_speed, Hitbox,
+                        DIFFICULTY_SETTINGS, MAX_OBJECTS, FRAMES_PER_SECOND, FALL_FRAMES, BOMB_HIT, SALAMANDER_FELL,
+                        GAME_OVER)
+from falling_store import FallingStore, PAGE, BOMB, live_slots, count_falling
+from sprite_pool import SpritePool, create_sprite_pool, acquire_sprite, release_sprite
+from assets import cached_background, load_image, surface_sprite, sprite_hitmask
+from scrolling_layer import ScrollingLayer, render_layer, crop_layer, create_scrolling_layer, scroll_layer
+from stage_timer import StageTimer, run_stages, write_stage_timings, start_counting_allocations
+from hud_text import HudText, create_hud_text, bind_hud_text, atlas_text, set_atlas_text
+from frame_profiler import (FrameProfiler, create_frame_profiler, record_frame, numbered_trace_path, open_trace,
+                            close_trace)
+from profiler_overlay import ProfilerOverlay, create_profiler_overlay, set_overlay_visible, draw_profiler_overlay
+from dirty_rects import DIRTY_TRACKER, watch_dirty_regions
+from replay import Replay, start_recording, record_inputs, record_difficulty, save_replay
+from scene_cache import remember_scene, push_cached_scene, queued_push, carry_out_queued_push
+from preload import (Preloader, ImageRequest, EmojiRequest, start_preloading, collect_preloaded,
+                     wait_for_preloaded, request_key, load_request)
+from atlas import TextureAtlas, build_atlas, atlas_image, atlas_blits
+from tick_loop import TickLoop, advance_loop, pause_loop, interpolation_alpha, interpolate
+from animation_frames import (FrameTable, FrameAnimator, bake_frame_table, iterate_sequence, play_sequence,
+                              advance_animator, reset_animator)
+from leaderboard import Leaderboard, open_leaderboard, submit_score, top_scores
+from telemetry import open_telemetry, start_run, RECORD_DIFFICULTY_CHANGED
+from input_latency import (InputLatency, create_input_latency, note_key, note_presented, forget_pending,
+                           write_input_latency)
+from designer.core.internal_image import InternalImage
 
 # x position of hearts in corner
 LEFT_HEART_X = 710
 MIDDLE_HEART_X = 745
 RIGHT_HEART_X = 780
 
-# screen limit x max and min positions
-MAX_X_POSITION = 650
-MIN_X_POSITION = 150
-
-# filenames for salamander hurt animation
+# salamander image, and the color it is multiplied by while it flashes hurt
 NORMAL = "salamander_with_glasses.png"
-RED = "hurt_salamander.png"
+SALAMANDER_SCALE = 0.22
+HURT_TINT = (255, 90, 90)
+# the hurt flash goes normal, hurt, normal, HURT_FLASH_TIMES over HURT_FLASH_SECONDS
+HURT_FLASH_SECONDS = 1
+HURT_FLASH_TIMES = 2
+# the fall spin is baked at one angle per tick of the fall
+FALL_ROTATION_STEPS = FALL_FRAMES
+# variants in the salamander's frame tables
+NORMAL_FRAME = 0
+HURT_FRAME = 1
+HURT_FLASH_SEQUENCE = iterate_sequence([NORMAL_FRAME, HURT_FRAME, NORMAL_FRAME],
+                                       HURT_FLASH_SECONDS * FRAMES_PER_SECOND, HURT_FLASH_TIMES)
+
+# pre-render the clouds, building and windows into layers that scroll as a whole,
+# instead of moving every cloud and window sprite each frame
+PARALLAX_BACKGROUND = True
+
+# paint the building into the scene background and scroll only the strips that change,
+# the sky on each side of the building and each column of windows, so most of the screen
+# is not repainted every frame. Only the world needs it: nothing moves in the settings and
+# end scenes, so once Designer has drawn them on entering they repaint nothing
+DIRTY_RECT_RENDERING = False
+# outline every region repainted in the world, settings and end scenes, also toggled by DIRTY_RECT_DEBUG_KEY
+DIRTY_RECT_DEBUG = False
+DIRTY_RECT_DEBUG_KEY = "f4"
+
+# background layout
+CLOUD_POSITIONS = [(100, 150), (150, 400), (700, 100), (740, 500)]
+WINDOW_COLUMNS = [200, 333, 466, 600]
+BUILDING_WIDTH = 570
+BUILDING_HEIGHT = 600
+CLOUD_SCROLL_SPEED = 1
+BUILDING_SCROLL_SPEED = 1
+
+# set to a filename to write the p50/p99 time of each update stage there at game over
+STAGE_TIMINGS_FILE: Optional[str] = None
+# also record what each update stage allocates, written with the timings; slows every stage down
+COUNT_STAGE_ALLOCATIONS = False
+
+# seed for the page and bomb spawns, so every run plays out the same with the same inputs;
+# None seeds each run differently
+DETERMINISTIC_SEED: Optional[int] = None
+# most pages, and separately bombs, falling at once
+MAX_FALLING_OBJECTS = MAX_OBJECTS
+
+# set to a filename to record each run's inputs there at game over, replayable with replay.py
+REPLAY_RECORD_FILE: Optional[str] = None
+
+WINDOW_IMAGE = ImageRequest('window.png', 0.15)
+CLOUD_IMAGE = ImageRequest('cloud.png', 0.5)
+SALAMANDER_IMAGE = ImageRequest(NORMAL, SALAMANDER_SCALE)
+HURT_IMAGE = ImageRequest(NORMAL, SALAMANDER_SCALE, tint=HURT_TINT)
+HEART_IMAGE = ImageRequest('heart_icon.png', 0.037)
+
+# images and emojis the world shows, loaded on worker threads while the title screen is up;
+# each must match how create_world and the functions it calls load it, or it is loaded again
+PRELOADED_IMAGES = [
+    WINDOW_IMAGE,
+    CLOUD_IMAGE,
+    SALAMANDER_IMAGE,
+    HURT_IMAGE,
+    HEART_IMAGE,
+]
+PAGE_EMOJI = EmojiRequest("📃", 0.8)
+BOMB_EMOJI = EmojiRequest("💣")
+PRELOADED_EMOJIS = [PAGE_EMOJI, BOMB_EMOJI]
+# atlases of the world's sprites built so far, by the cache keys of the images in them;
+# built once and kept, since the sprites of every world made afterwards draw from it
+BUILT_ATLASES: dict[tuple, TextureAtlas] = {}
+
+# draw the falling pages and bombs straight from the sprite atlas in one blits() call after
+# the rest of the world is drawn, instead of through a Designer sprite each. Much cheaper with
+# thousands of objects, but they are then drawn over the HUD instead of under it
+BATCHED_FALLING_SPRITES = False
+
+# step the simulation at its own fixed rate from the real time that has passed, and let the
+# world update up to RENDER_UPDATES_PER_SECOND times a second, drawing sprites part of the way
+# between ticks. A slow frame then runs the ticks it missed instead of slowing the game down,
+# and the draws skipped that way are counted in the profiler overlay
+FIXED_TICK_LOOP = False
+RENDER_UPDATES_PER_SECOND = 120
+
+# set to a directory to record spawns, pickups, hits, difficulty changes and deaths there as
+# compressed segment files, written on their own thread; read them back with telemetry.py
+TELEMETRY_DIRECTORY: Optional[str] = None
+
+# set to a filename to keep the best scores for each difficulty there across sessions,
+# shown on the title and end screens
+LEADERBOARD_FILE: Optional[str] = None
+# leaderboards opened so far, by filename
+OPEN_LEADERBOARDS: dict[str, Leaderboard] = {}
+
+# move the salamander on the frame an arrow key is pressed or released, instead of the frame after,
+# which the original handler order left it to
+SAME_TICK_INPUT = False
+# set to a filename to time how long each arrow key takes to reach the screen, writing the
+# p50/p95/p99 there at game over
+INPUT_LATENCY_FILE: Optional[str] = None
+
+# key that toggles the frame-time overlay, and the Chrome trace written while it is on. Each run traced
+# gets a numbered file of its own named after PROFILER_TRACE_FILE, such as frame_trace-0001.json
+PROFILER_KEY = "f3"
+PROFILER_TRACE_FILE = "frame_trace.json"
 
 set_window_color('skyblue')
 
@@ -38,31 +164,44 @@ class TitleScreen:
     instruction_line4: DesignerObject
     instruction_line5: DesignerObject
     play_button: Button
+    loading_text: DesignerObject
+    preloader: Preloader
+    high_scores: DesignerObject
 
 @dataclass
 class World:
     """ Main gameplay """
     clouds: list[DesignerObject]
-    building: DesignerObject
+    building: Optional[DesignerObject]
     windows: list[list[DesignerObject]]
+    layers: list[ScrollingLayer]
     salamander: DesignerObject
-    salamander_speed: int
-    moving_left: bool
-    moving_right: bool
     page_in_corner: DesignerObject
-    page_count: int
-    page_count_in_corner: DesignerObject
+    page_count_in_corner: HudText
     hearts: list[DesignerObject]
-    pages: list[DesignerObject]
-    bombs: list[DesignerObject]
-    hearts_remaining: int
+    pages: dict[int, DesignerObject]
+    bombs: dict[int, DesignerObject]
+    page_pool: SpritePool
+    bomb_pool: SpritePool
     settings_button: Button
-    settings_mode: str
-    page_speed: int
-    bomb_speed: int
-    spawn_rate: int
     display_mode: DesignerObject
-    display_difficulty: DesignerObject
+    display_difficulty: HudText
+    state: GameState
+    inputs: Inputs
+    timer: StageTimer
+    profiler: FrameProfiler
+    overlay: Optional[ProfilerOverlay]
+    replay: Optional[Replay]
+    atlas: TextureAtlas
+    loop: TickLoop
+    # salamander position before the latest tick, drawn from when FIXED_TICK_LOOP is on
+    previous_salamander_x: float
+    previous_salamander_y: float
+    # the salamander upright, normal then hurt, and the same two at every angle of the fall
+    upright_frames: FrameTable
+    fall_frames: FrameTable
+    salamander_frames: FrameAnimator
+    latency: Optional[InputLatency]
 
 @dataclass
 class SettingsScreen:
@@ -81,8 +220,10 @@ class EndScreen:
     message: DesignerObject
     quit_button: Button
     play_again_button: Button
+    high_scores: DesignerObject
 
-def make_button(message: str, x: int, y: int, length: int, width: int, text_size: int, color: str) -> Button:
+def make_button(message: str, x: int, y: int, length: int, width: int, text_size: int, color: str,
+                cached_text: bool = False) -> Button:
     """
     Creates a Button with inner rectangle, outer rectangle, and text
     Args:
@@ -93,10 +234,14 @@ def make_button(message: str, x: int, y: int, length: int, width: int, text_size
         width (int): how tall rectangular button is
         text_size (int): size of button text
         color (str): color of button background
+        cached_text (bool): whether to draw the text from cached glyphs
     Returns:
         Button: collection of DesignerObjects to make a button
     """
-    label = text('black', message, text_size, x, y, layer= 'top')
+    if cached_text:
+        label = atlas_text('black', message, text_size, x, y, layer= 'top')
+    else:
+        label = text('black', message, text_size, x, y, layer= 'top')
     return Button(rectangle(color, length, width, x, y),
                   rectangle('black', length, width, x, y, 1),
                   label)
@@ -110,8 +255,7 @@ def create_window(x: int, y: int) -> DesignerObject:
     Returns:
         DesignerObject: window image
     """
-    window = image('window.png')
-    grow(window, 0.15)
+    window = atlas_sprite(WINDOW_IMAGE)
     window.x = x
     window.y = y
     return window
@@ -149,8 +293,7 @@ def create_cloud(x: int, y: int) -> DesignerObject:
     Returns:
         DesignerObject: cloud image
     """
-    cloud = image('cloud.png')
-    grow(cloud, 0.5)
+    cloud = atlas_sprite(CLOUD_IMAGE)
     cloud.x = x
     cloud.y = y
     return cloud
@@ -166,9 +309,77 @@ def move_clouds_down(world: World):
         cloud.y = cloud.y % get_window_height()
 
 
+def create_cloud_layer() -> ScrollingLayer:
+    """
+    Pre-renders every cloud into one scrolling layer
+    Returns:
+        ScrollingLayer: cloud layer
+    """
+    cloud = load_image('cloud.png', 0.5)._surf
+    stamps = [(cloud, x, y) for x, y in CLOUD_POSITIONS]
+    return create_scrolling_layer(render_layer(get_width(), get_height(), stamps), CLOUD_SCROLL_SPEED)
+
+def create_building_layer() -> ScrollingLayer:
+    """
+    Pre-renders the building and every window into one scrolling layer
+    Returns:
+        ScrollingLayer: building layer
+    """
+    window = load_image('window.png', 0.15)._surf
+    stamps = [(window, x, number*100) for x in WINDOW_COLUMNS for number in [1,2,3,4,5,6,7]]
+    return create_scrolling_layer(render_layer(get_width(), get_height(), stamps, ('saddlebrown', building_rect())),
+                                  BUILDING_SCROLL_SPEED)
+
+def building_rect() -> tuple[int, int, int, int]:
+    """
+    Finds where the building is drawn, centered on the screen
+    Returns:
+        tuple[int, int, int, int]: left, top, width and height of the building
+    """
+    return ((get_width() - BUILDING_WIDTH) // 2, (get_height() - BUILDING_HEIGHT) // 2,
+            BUILDING_WIDTH, BUILDING_HEIGHT)
+
+def create_strip_layers() -> list[ScrollingLayer]:
+    """
+    Paints the sky and building into the scene background, which is only repainted under
+    sprites, then creates scrolling strips for the sky beside the building and each window column
+    Returns:
+        list[ScrollingLayer]: sky strips, then window strips
+    """
+    width, height = get_width(), get_height()
+    left, _, building_width, _ = building_rect()
+    background = InternalImage(size=(width, height))
+    background._surf.fill('skyblue')
+    background._surf.fill('saddlebrown', building_rect())
+    get_director().current_scene.background = background
+    cloud = load_image('cloud.png', 0.5)._surf
+    clouds = render_layer(width, height, [(cloud, x, y) for x, y in CLOUD_POSITIONS])
+    strips = [create_scrolling_layer(crop_layer(clouds, 0, left), CLOUD_SCROLL_SPEED),
+              create_scrolling_layer(crop_layer(clouds, left + building_width, width - left - building_width),
+                                     CLOUD_SCROLL_SPEED, left + building_width)]
+    window = load_image('window.png', 0.15)._surf
+    for x in WINDOW_COLUMNS:
+        column = render_layer(width, height, [(window, x, number*100) for number in [1,2,3,4,5,6,7]])
+        column_left = x - window.get_width() // 2 - 1
+        strips.append(create_scrolling_layer(crop_layer(column, column_left, window.get_width() + 2),
+                                             BUILDING_SCROLL_SPEED, column_left))
+    return strips
+
+def scroll_background(world: World):
+    """
+    Scrolls each background layer downward and wraps around
+    Args:
+        world (World): World instance
+    """
+    for layer in world.layers:
+        scroll_layer(layer)
+    move_windows_down(world)
+    move_clouds_down(world)
+
 def create_title_screen() -> TitleScreen:
     """
-    Creates Title Screen with background, header, empty button with text instructions, and play button
+    Creates Title Screen with background, header, empty button with text instructions, and play button,
+    and starts loading the world's images in the background
     Returns:
         TitleScreen: TitleScreen instance
     """
@@ -177,7 +388,11 @@ def create_title_screen() -> TitleScreen:
     instruction3 = "by maneuvering SuperSpy Salamander with the left and right arrow keys."
     instruction4 = "Beware of bombs left by enemy agents! If SuperSpy Salamander is hit three times,"
     instruction5 = "he will lose his grip and fall."
-    return TitleScreen(background_image('city_background.jpg'),
+    loading_text = atlas_text('black', "", 16, 400, 450)
+    preloader = start_preloading(PRELOADED_IMAGES, PRELOADED_EMOJIS,
+                                 lambda loaded, total: show_loading_progress(loading_text, loaded, total))
+    show_loading_progress(loading_text, 0, preloader.total)
+    return TitleScreen(cached_background('city_background.jpg'),
                        text('black', "Welcome to Salamander Spy Scale", 50, 400, 90),
                        make_button("", get_width()/2, 240, 650, 180, 20, 'oldlace'),
                        text('black', instruction1, 20, 400, 180),
@@ -185,7 +400,29 @@ def create_title_screen() -> TitleScreen:
                        text('black', instruction3, 20, 400, 240),
                        text('black', instruction4, 20, 400, 270),
                        text('black', instruction5, 20, 400, 300),
-                       make_button("PLAY", get_width()/2, 400, 80, 50, 30, 'chartreuse'))
+                       make_button("PLAY", get_width()/2, 400, 80, 50, 30, 'chartreuse'),
+                       loading_text,
+                       preloader,
+                       atlas_text('black', best_scores_message(game_leaderboard()), 20, 400, 500))
+
+def show_loading_progress(loading_text: DesignerObject, loaded: int, total: int):
+    """
+    Shows how many of the world's images have loaded under the play button, and nothing once all have
+    Args:
+        loading_text (DesignerObject): text sprite under the play button
+        loaded (int): images loaded so far
+        total (int): images being loaded
+    """
+    message = "" if loaded == total else f"Loading {loaded}/{total}"
+    set_atlas_text(loading_text, 'black', message, 16)
+
+def poll_preloader(world: TitleScreen):
+    """
+    Stores whatever images finished loading since the last frame
+    Args:
+        world (TitleScreen): TitleScreen instance
+    """
+    collect_preloaded(world.preloader)
 
 def create_world() -> World:
     """
@@ -194,20 +431,150 @@ def create_world() -> World:
     Returns:
         World: World instance
     """
-    return World([create_cloud(100, 150), create_cloud(150, 400), create_cloud(700, 100), create_cloud(740, 500)],
-                 create_building(),
-                 [create_window_list(200), create_window_list(333), create_window_list(466), create_window_list(600)],
-                 create_salamander(), 0, False, False,
-                 show_page_in_corner(), 0,
+    atlas = sprite_atlas()
+    if DIRTY_RECT_RENDERING:
+        clouds, building, windows = [], None, []
+        layers = create_strip_layers()
+    elif PARALLAX_BACKGROUND:
+        clouds, building, windows = [], None, []
+        layers = [create_cloud_layer(), create_building_layer()]
+    else:
+        clouds = [create_cloud(x, y) for x, y in CLOUD_POSITIONS]
+        building = create_building()
+        windows = [create_window_list(x) for x in WINDOW_COLUMNS]
+        layers = []
+    salamander = create_salamander()
+    upright_frames, fall_frames = bake_salamander_frames()
+    seed = run_seed()
+    state = new_game(seed, max_objects=MAX_FALLING_OBJECTS)
+    # batched objects need no sprites, beyond one each to measure their hitboxes from
+    pool_capacity = 1 if BATCHED_FALLING_SPRITES else state.max_objects
+    page_pool = create_sprite_pool(create_page, pool_capacity)
+    bomb_pool = create_sprite_pool(create_bomb, pool_capacity)
+    use_sprite_hitboxes(state, salamander, page_pool, bomb_pool)
+    state.same_tick_input = SAME_TICK_INPUT
+    replay = start_recording(state, seed) if REPLAY_RECORD_FILE is not None else None
+    if TELEMETRY_DIRECTORY is not None:
+        state.telemetry = open_telemetry(TELEMETRY_DIRECTORY)
+        start_run(state.telemetry, difficulty_index(state.settings_mode))
+    timer = StageTimer()
+    if COUNT_STAGE_ALLOCATIONS:
+        start_counting_allocations(timer)
+    if FIXED_TICK_LOOP:
+        get_director().current_scene.clock.max_ups = RENDER_UPDATES_PER_SECOND
+    return World(clouds, building, windows, layers,
+                 salamander,
+                 show_page_in_corner(),
                  show_page_count_in_corner(),
                  [create_heart(LEFT_HEART_X), create_heart(MIDDLE_HEART_X), create_heart(RIGHT_HEART_X)],
-                 [], [], 3,
+                 {}, {},
+                 page_pool, bomb_pool,
                  make_button("SETTINGS", 50, 40, 80, 40, 18, 'tan'),
-                 'medium', 6, 8, 30,
                  text('black', "MODE:", 18, 50, 80),
-                 text('black', "MEDIUM", 20, 50, 100)
+                 create_hud_text('black', "MEDIUM", 20, 50, 100),
+                 state, Inputs(), timer,
+                 create_frame_profiler(), None,
+                 replay,
+                 atlas,
+                 TickLoop(paused=True), state.salamander_x, state.salamander_y,
+                 upright_frames, fall_frames, FrameAnimator(salamander, upright_frames),
+                 create_input_latency() if INPUT_LATENCY_FILE is not None else None
                  )
 
+def bake_salamander_frames() -> tuple[FrameTable, FrameTable]:
+    """
+    Renders the salamander's animation frames once: normal and hurt, upright and
+    upside down at every angle of the fall spin
+    Returns:
+        tuple[FrameTable, FrameTable]: upright frames and fall frames
+    """
+    # in the order of NORMAL_FRAME and HURT_FRAME
+    variants = [load_image(NORMAL, SALAMANDER_SCALE), load_request(HURT_IMAGE)]
+    return bake_frame_table(variants), bake_frame_table(variants, FALL_ROTATION_STEPS, flip_y=True)
+
+def sprite_atlas() -> TextureAtlas:
+    """
+    Every image and emoji the world's sprites show, packed into one atlas the first time it is
+    needed and kept for the rest of the process
+    Returns:
+        TextureAtlas: TextureAtlas instance
+    """
+    requests = PRELOADED_IMAGES + PRELOADED_EMOJIS
+    keys = tuple(request_key(request) for request in requests)
+    if keys not in BUILT_ATLASES:
+        BUILT_ATLASES[keys] = build_atlas({request_key(request): load_request(request) for request in requests})
+    return BUILT_ATLASES[keys]
+
+def atlas_sprite(request: Union[ImageRequest, EmojiRequest]) -> DesignerObject:
+    """
+    Creates a sprite drawing an image or emoji from the sprite atlas
+    Args:
+        request (Union[ImageRequest, EmojiRequest]): one of PRELOADED_IMAGES or PRELOADED_EMOJIS
+    Returns:
+        DesignerObject: image sprite
+    """
+    return surface_sprite(atlas_image(sprite_atlas(), request_key(request)))
+
+def run_seed() -> Optional[int]:
+    """
+    Picks the seed for a new run
+    Returns:
+        Optional[int]: DETERMINISTIC_SEED if set, otherwise a random seed if runs are recorded, otherwise None
+    """
+    if DETERMINISTIC_SEED is None and REPLAY_RECORD_FILE is not None:
+        # a recorded run needs a known seed to be replayed
+        return randrange(2**32)
+    return DETERMINISTIC_SEED
+
+def reset_world(world: World):
+    """
+    Puts the world back to the start of a run in place, so PLAY AGAIN does not build it again
+    Args:
+        world (World): World instance
+    """
+    seed = run_seed()
+    reset_game(world.state, seed)
+    world.inputs.left = False
+    world.inputs.right = False
+    # with every slot now empty, syncing returns all the page and bomb sprites to their pools
+    sync_stage(world, [])
+    reset_animator(world.salamander_frames, world.upright_frames)
+    update_score(world)
+    show_hearts(world)
+    show_difficulty_mode(world)
+    if world.replay is not None:
+        world.replay = start_recording(world.state, seed)
+    if world.state.telemetry is not None:
+        start_run(world.state.telemetry, difficulty_index(world.state.settings_mode))
+    if world.latency is not None:
+        forget_pending(world.latency)
+    # the last run's trace was finished at game over, this run gets its own
+    if world.profiler.enabled and world.profiler.trace_file is None:
+        start_trace(world.profiler)
+    world.loop = TickLoop()
+    world.previous_salamander_x = world.state.salamander_x
+    world.previous_salamander_y = world.state.salamander_y
+
+def use_sprite_hitboxes(state: GameState, salamander: DesignerObject, page_pool: SpritePool, bomb_pool: SpritePool):
+    """
+    Gives the simulation the real size and bitmask of the salamander, page and bomb sprites
+    Args:
+        state (GameState): GameState instance
+        salamander (DesignerObject): salamander sprite
+        page_pool (SpritePool): pool of page sprites
+        bomb_pool (SpritePool): pool of bomb sprites
+    """
+    state.salamander_hitbox = Hitbox(salamander.width, salamander.height)
+    state.salamander_mask = sprite_hitmask(salamander)
+    if page_pool.free:
+        page = page_pool.free[-1]
+        state.page_hitbox = Hitbox(page.width, page.height)
+        state.page_mask = sprite_hitmask(page)
+    if bomb_pool.free:
+        bomb = bomb_pool.free[-1]
+        state.bomb_hitbox = Hitbox(bomb.width, bomb.height)
+        state.bomb_mask = sprite_hitmask(bomb)
+
 def create_settings_screen() -> SettingsScreen:
     """
     Creates Settings to allow user to change difficulty with background, empty button for background,
@@ -215,7 +582,8 @@ def create_settings_screen() -> SettingsScreen:
     Returns:
         SettingsScreen: SettingScreen instance
     """
-    return SettingsScreen(background_image('city_background.jpg'),
+    remember_scene('settings')
+    return SettingsScreen(cached_background('city_background.jpg'),
                           make_button("", 400, 300, 640, 400, 0, 'cadetblue'),
                           text('black', "SETTINGS", 50, 400, 200),
                           make_button("EASY", 200, 350, 80, 50, 30, 'green'),
@@ -223,28 +591,98 @@ def create_settings_screen() -> SettingsScreen:
                           make_button("HARD", 600, 350, 80, 50, 30, 'green')
                           )
 
-def create_end_screen(final_page_count: int) -> EndScreen:
+def game_leaderboard() -> Optional[Leaderboard]:
     """
-    Game over screen with background, message and final score, quit button, and play again button
+    The leaderboard kept in LEADERBOARD_FILE, opened the first time it is needed
+    Returns:
+        Optional[Leaderboard]: Leaderboard instance, None if LEADERBOARD_FILE is not set
+    """
+    if LEADERBOARD_FILE is None:
+        return None
+    if LEADERBOARD_FILE not in OPEN_LEADERBOARDS:
+        OPEN_LEADERBOARDS[LEADERBOARD_FILE] = open_leaderboard(LEADERBOARD_FILE, list(DIFFICULTY_SETTINGS))
+    return OPEN_LEADERBOARDS[LEADERBOARD_FILE]
+
+def best_scores_message(leaderboard: Optional[Leaderboard]) -> str:
+    """
+    Line on the title screen with the best score on each difficulty
+    Args:
+        leaderboard (Optional[Leaderboard]): Leaderboard instance, or None to show nothing
+    Returns:
+        str: the line, empty if there are no scores yet
+    """
+    if leaderboard is None:
+        return ""
+    best = [f"{mode.upper()}: {top_scores(leaderboard, mode)[0]}" for mode in DIFFICULTY_SETTINGS
+            if top_scores(leaderboard, mode)]
+    return "BEST   " + "   ".join(best) if best else ""
+
+def high_scores_message(leaderboard: Optional[Leaderboard], settings_mode: str) -> str:
+    """
+    Line on the end screen with the best scores on the difficulty just played
+    Args:
+        leaderboard (Optional[Leaderboard]): Leaderboard instance, or None to show nothing
+        settings_mode (str): difficulty the run was played on
+    Returns:
+        str: the line, empty without a leaderboard
+    """
+    if leaderboard is None:
+        return ""
+    scores = "  ".join(str(score) for score in top_scores(leaderboard, settings_mode))
+    return f"BEST ON {settings_mode.upper()}:  {scores}"
+
+def create_end_screen(final_page_count: int, settings_mode: str = 'medium') -> EndScreen:
+    """
+    Game over screen with background, message and final score, quit button, play again button,
+    and the best scores on the difficulty played
     Args:
          final_page_count (int): number of pages user collected, passed in from World
+         settings_mode (str): difficulty the run was played on, passed in from World
     Returns:
         EndScreen: EndScreen instance
     """
-    game_over_message = "GAME OVER! SCORE:  " + str(final_page_count)
-    return EndScreen(background_image('city_background.jpg'),
-                     make_button(game_over_message, 400, 270, 450, 90, 40, 'oldlace'),
+    remember_scene('end')
+    return EndScreen(cached_background('city_background.jpg'),
+                     make_button(game_over_message(final_page_count), 400, 270, 450, 90, 40, 'oldlace', True),
                      make_button("QUIT", 300, 350, 80, 50, 30, 'skyblue'),
-                     make_button("PLAY AGAIN", 450, 350, 160, 50, 30, 'skyblue')
+                     make_button("PLAY AGAIN", 450, 350, 160, 50, 30, 'skyblue'),
+                     atlas_text('black', "", 24, 400, 420)
                      )
 
+def game_over_message(final_page_count: int) -> str:
+    """
+    Message shown on the end screen
+    Args:
+        final_page_count (int): number of pages user collected
+    Returns:
+        str: message with the final score
+    """
+    return "GAME OVER! SCORE:  " + str(final_page_count)
+
+def show_final_score(world: EndScreen, final_page_count: int, settings_mode: str = 'medium'):
+    """
+    Called each time the end screen is entered, since it is reused between runs.
+    Shows the final score of the run that just ended, and adds it to the leaderboard,
+    which stores it on its own thread
+    Args:
+        world (EndScreen): EndScreen instance
+        final_page_count (int): number of pages user collected, passed in from World
+        settings_mode (str): difficulty the run was played on, passed in from World
+    """
+    set_atlas_text(world.message.label, 'black', game_over_message(final_page_count), 40)
+    leaderboard = game_leaderboard()
+    if leaderboard is not None:
+        submit_score(leaderboard, settings_mode, final_page_count)
+    set_atlas_text(world.high_scores, 'black', high_scores_message(leaderboard, settings_mode), 24)
+
 def handle_title_buttons(world: TitleScreen):
     """
-    When user presses play button, scene changes to world
+    When user presses play button, scene changes to world, once the world's images have loaded
     Args:
         world (TitleScreen): TitleScreen instance
     """
     if colliding_with_mouse(world.play_button.background):
+        wait_for_preloaded(world.preloader)
         change_scene('world')
 
 def handle_world_buttons(world: World):
@@ -254,7 +692,7 @@ def handle_world_buttons(world: World):
         world (World): World instance
     """
     if colliding_with_mouse(world.settings_button.background):
-        push_scene('settings')
+        push_cached_scene('settings')
 
 def handle_settings_buttons(world: SettingsScreen):
     """
@@ -273,14 +711,30 @@ def handle_settings_buttons(world: SettingsScreen):
 def handle_end_buttons(world: EndScreen):
     """
     When user clicks quit button, application closes
-    When user clicks play again button, scene changes to world
+    When user clicks play again button, the end screen closes and the world underneath restarts
     Args:
         world (EndScreen): EndScreen instance
     """
     if colliding_with_mouse(world.quit_button.background):
         quit()
     if colliding_with_mouse(world.play_again_button.background):
-        change_scene('world')
+        pop_scene(restart = True)
+
+def enter_world(world: World, difficulty: Optional[str] = None, restart: bool = False):
+    """
+    Called whenever the world becomes the current scene. Restarts the run when coming back
+    from the end screen, and applies the difficulty when coming back from settings
+    Args:
+        world (World): World instance
+        difficulty (Optional[str]): difficulty chosen in settings, if coming back from there
+        restart (bool): whether PLAY AGAIN was clicked on the end screen
+    """
+    if restart:
+        reset_world(world)
+    if difficulty is not None:
+        resume_from_settings(world, difficulty)
+    # the time spent in the other scene is not played out
+    pause_loop(world.loop)
 
 def resume_from_settings(world: World, difficulty: str):
     """
@@ -290,8 +744,12 @@ def resume_from_settings(world: World, difficulty: str):
         world (World): World instance
         difficulty (str): string representing chosen difficulty setting
     """
-    world.settings_mode = difficulty
-    update_difficulty_mode(world)
+    world.state.settings_mode = difficulty
+    update_difficulty_mode(world.state)
+    record_telemetry(world.state, RECORD_DIFFICULTY_CHANGED, difficulty_index(difficulty))
+    if world.replay is not None:
+        record_difficulty(world.replay)
+    show_difficulty_mode(world)
 
 def create_building() -> DesignerObject:
     """
@@ -299,7 +757,7 @@ def create_building() -> DesignerObject:
     Returns:
         DesignerObject: brown rectangle
     """
-    building = rectangle('saddlebrown', 570, 600)
+    building = rectangle('saddlebrown', BUILDING_WIDTH, BUILDING_HEIGHT)
     return building
 
 def create_salamander() -> DesignerObject:
@@ -308,10 +766,9 @@ def create_salamander() -> DesignerObject:
     Returns:
         DesignerObject: image of salamander
     """
-    salamander = image("salamander_with_glasses.png")
+    salamander = atlas_sprite(SALAMANDER_IMAGE)
     salamander.x = 400
     salamander.y = 360
-    grow(salamander, 0.22)
     return salamander
 
 def show_page_in_corner() -> DesignerObject:
@@ -320,22 +777,18 @@ def show_page_in_corner() -> DesignerObject:
     Returns:
         DesignerObject: page emoji
     """
-    page = emoji("📃")
+    page = atlas_sprite(PAGE_EMOJI)
     page.y = 30
     page.x = get_width() - 30
-    grow(page, 0.8)
     return page
 
-def show_page_count_in_corner() -> DesignerObject:
+def show_page_count_in_corner() -> HudText:
     """
     Display number of pages collected in corner
     Returns:
-        DesignerObject: text displaying page count
+        HudText: text displaying page count
     """
-    number = text("black", "0", 30)
-    number.y = 30
-    number.x = get_width() - 60
-    return number
+    return create_hud_text("black", 0, 30, get_width() - 60, 30)
 
 def create_heart(x: int) -> DesignerObject:
     """
@@ -345,36 +798,11 @@ def create_heart(x: int) -> DesignerObject:
     Returns:
         DesignerObject: heart image
     """
-    heart = image("heart_icon.png")
+    heart = atlas_sprite(HEART_IMAGE)
     heart.y = 70
     heart.x = x
-    grow(heart, 0.037)
     return heart
 
-def move_salamander(world: World):
-    """
-    Changes speed to move salamander horizontally left and right
-    Args:
-        world (World): World instance
-    """
-    world.salamander.x += world.salamander_speed
-
-def move_right(world: World):
-    """
-    Salamander moves right
-    Args:
-        world (World): World instance
-    """
-    world.salamander_speed = SALAMANDER_SPEED
-
-def move_left(world: World):
-    """
-    Salamander moves left
-    Args:
-        world (World): World instance
-    """
-    world.salamander_speed = -SALAMANDER_SPEED
-
 def keys_pressed(world: World, key: str):
     """
     Checks to see if key is pressed
@@ -383,9 +811,15 @@ def keys_pressed(world: World, key: str):
         key (str): name of key being pressed
     """
     if key == "right":
-        world.moving_right = True
+        note_arrow_key(world, world.inputs.left, True)
+        world.inputs.right = True
     elif key == "left":
-        world.moving_left = True
+        note_arrow_key(world, True, world.inputs.right)
+        world.inputs.left = True
+    elif key == PROFILER_KEY:
+        toggle_profiler(world)
+    elif key == DIRTY_RECT_DEBUG_KEY and DIRTY_RECT_RENDERING:
+        DIRTY_TRACKER.debug = not DIRTY_TRACKER.debug
 
 def keys_not_pressed(world: World, key: str):
     """
@@ -395,23 +829,27 @@ def keys_not_pressed(world: World, key: str):
         key (str): name of key being pressed
     """
     if key == "right":
-        world.moving_right = False
+        note_arrow_key(world, world.inputs.left, False)
+        world.inputs.right = False
     elif key == "left":
-        world.moving_left = False
+        note_arrow_key(world, False, world.inputs.right)
+        world.inputs.left = False
 
-def salamander_direction(world: World):
+def note_arrow_key(world: World, left: bool, right: bool):
     """
-    Checks if a key is pressed and if Salamander is within screen limit,
-    then move horizontally or not at all
+    Stamps an arrow key press or release as it arrives, if INPUT_LATENCY_FILE is set. Only a key that
+    changes how the salamander moves is stamped: one pressed at a screen limit, or while the other key
+    already sets the way it goes, shows nothing on screen to measure
     Args:
-        world (World): World instance
-    """
-    if world.moving_right and world.salamander.x < MAX_X_POSITION:
-        move_right(world)
-    elif world.moving_left and world.salamander.x > MIN_X_POSITION:
-        move_left(world)
-    else:
-        world.salamander_speed = 0
+        world (World): World instance, still holding the keys from before this one
+        left (bool): whether the left arrow key is held after this key
+        right (bool): whether the right arrow key is held after this key
+    """
+    if world.latency is None or world.state.game_over:
+        return
+    before = next_steering_speed(world.state, world.inputs.left, world.inputs.right)
+    if next_steering_speed(world.state, left, right) != before:
+        note_key(world.latency, world.state.frame + input_lag_steps(world.state))
 
 def create_page() -> DesignerObject:
     """
@@ -419,249 +857,309 @@ def create_page() -> DesignerObject:
     Returns:
         DesignerObject: page emoji
     """
-    page = emoji("📃")
-    grow(page, 0.8)
+    page = atlas_sprite(PAGE_EMOJI)
     page.anchor = "midtop"
-    page.x = randint(MIN_X_POSITION, MAX_X_POSITION)
-    page.y = 0
     return page
 
-def make_pages(world: World):
+def create_bomb() -> DesignerObject:
     """
-    Creates page randomly if there aren't enough currently
-    Args:
-        world (World): World instance
+    Create bomb that falls down screen
+    Returns:
+        DesignerObject: bomb emoji
     """
-    not_enough_pages = len(world.pages) < MAX_OBJECTS
-    random_chance = randint(1, world.spawn_rate) == 1
-    if not_enough_pages and random_chance:
-        world.pages.append(create_page())
+    bomb = atlas_sprite(BOMB_EMOJI)
+    bomb.anchor = "midtop"
+    return bomb
 
-def move_pages_down(world: World):
+def sync_falling_sprites(store: FallingStore, kind: int, sprites: dict[int, DesignerObject], pool: SpritePool):
     """
-    Moves each page downward
+    Moves a sprite onto each live slot of one kind in the simulation, taking sprites from
+    the pool for new objects and returning sprites whose slots are no longer alive
     Args:
-        world (World): World instance
-    """
-    for page in world.pages:
-        page.y += world.page_speed
+        store (FallingStore): pages and bombs in the simulation
+        kind (int): PAGE or BOMB
+        sprites (dict[int, DesignerObject]): sprites keyed by the slot of their object
+        pool (SpritePool): hidden sprites of this kind
+    """
+    slots = live_slots(store, kind).tolist()
+    for slot in slots:
+        sprite = sprites.get(slot)
+        if sprite is None:
+            sprite = acquire_sprite(pool)
+            sprites[slot] = sprite
+        sprite.x = float(store.x[slot])
+        sprite.y = float(store.y[slot])
+    if len(sprites) > len(slots):
+        live = set(slots)
+        for slot in [slot for slot in sprites if slot not in live]:
+            release_sprite(pool, sprites.pop(slot))
 
-def destroy_page_on_ground(world: World):
+def update_score(world: World):
     """
-    Destroy pages that touch the ground
+    Score is updated to world
     Args:
         world (World): World instance
     """
-    keep = []
-    for page in world.pages:
-        if page.y < get_height():
-            keep.append(page)
-        else:
-            destroy(page)
-        world.pages = keep
+    bind_hud_text(world.page_count_in_corner, world.state.page_count)
 
-def destroy_when_page_collide(world: World):
+def salamander_show_damage(world: World):
     """
-    Filters and destroys pages that collide with Salamander, then adds to score
+    Flashes red, restarting the flash if it is already playing
     Args:
         world (World): World instance
     """
-    keep = []
-    for page in world.pages:
-        if colliding(page, world.salamander):
-            destroy(page)
-            world.page_count += 1
-        else:
-            keep.append(page)
-    world.pages = keep
+    play_sequence(world.salamander_frames, HURT_FLASH_SEQUENCE)
 
-def update_score(world: World):
+def show_hearts(world: World):
     """
-    Score is updated to world
+    Shows one heart for each heart remaining, from the right, and hides the rest
     Args:
         world (World): World instance
     """
-    world.page_count_in_corner.text = str(world.page_count)
+    lost = len(world.hearts) - world.state.hearts_remaining
+    for index, heart in enumerate(world.hearts):
+        heart.visible = index >= lost
 
-def create_bomb() -> DesignerObject:
+def show_difficulty_mode(world: World):
     """
-    Create bomb that falls down screen
-    Returns:
-        DesignerObject: bomb emoji
+    Updates display with current difficulty level
+    Args:
+        world (World): World instance
     """
-    bomb = emoji("💣")
-    bomb.anchor = "midtop"
-    bomb.x = randint(MIN_X_POSITION, MAX_X_POSITION)
-    bomb.y = 0
-    return bomb
+    bind_hud_text(world.display_difficulty, world.state.settings_mode.upper())
 
-def make_bombs(world: World):
+def sync_stage(world: World, events: list[str]):
     """
-    Create bomb randomly if there aren't enough currently
+    Moves the salamander, page and bomb sprites to match the simulation
     Args:
         world (World): World instance
+        events (list[str]): events reported by the simulation this frame
     """
-    not_enough_bombs = len(world.bombs) < MAX_OBJECTS
-    random_odds = randint(1, world.spawn_rate) == 1
-    if not_enough_bombs and random_odds:
-        world.bombs.append(create_bomb())
+    world.salamander.x = world.state.salamander_x
+    world.salamander.y = world.state.salamander_y
+    if not BATCHED_FALLING_SPRITES:
+        sync_falling_sprites(world.state.objects, PAGE, world.pages, world.page_pool)
+        sync_falling_sprites(world.state.objects, BOMB, world.bombs, world.bomb_pool)
 
-def move_bombs_down(world: World):
+def draw_falling_batch():
+    """
+    After the world is drawn, draws every page and bomb from the atlas in one call, if
+    BATCHED_FALLING_SPRITES is on. The regions drawn are cleared again on the next frame
+    like those of Designer's own sprites
+    """
+    if not BATCHED_FALLING_SPRITES:
+        return
+    scene = get_director().current_scene
+    world = scene._game_state
+    store = world.state.objects
+    sequence = []
+    for kind, request in ((PAGE, PAGE_EMOJI), (BOMB, BOMB_EMOJI)):
+        key = request_key(request)
+        slots = live_slots(store, kind)
+        ys = store.y[slots]
+        if FIXED_TICK_LOOP:
+            ys = ys - store.speed[slots] * (1 - interpolation_alpha(world.loop))
+        # anchored at the middle of their top edge, like the sprites
+        sequence += atlas_blits(world.atlas, key, store.x[slots] - world.atlas.regions[key].width / 2, ys)
+    if not sequence:
+        return
+    drawn = scene._surface.blits(sequence)
+    scene._clear_this_frame.extend(drawn)
+    pygame.display.update(drawn)
+
+def measure_input_latency():
     """
-    Move each bomb down
-    Args:
-        world (World): World instance
+    After the world is drawn, records how long the arrow keys it is the first to show took to get
+    there, if INPUT_LATENCY_FILE is set
     """
-    for bomb in world.bombs:
-        bomb.y += world.bomb_speed
+    world = get_director().current_scene._game_state
+    if world.latency is not None:
+        note_presented(world.latency, world.state.frame)
 
-def destroy_bomb_on_ground(world: World):
+def hud_stage(world: World, events: list[str]):
     """
-    Destroy bombs that touch the ground
+    Updates the score and, after a bomb hit, the hearts
     Args:
         world (World): World instance
+        events (list[str]): events reported by the simulation this frame
     """
-    keep = []
-    for bomb in world.bombs:
-        if bomb.y < get_height():
-            keep.append(bomb)
-        else:
-            destroy(bomb)
-        world.bombs = keep
+    update_score(world)
+    if BOMB_HIT in events:
+        show_hearts(world)
 
+def effects_stage(world: World, events: list[str]):
+    """
+    Plays the hurt flash and fall, and ends the game once the salamander is gone
+    Args:
+        world (World): World instance
+        events (list[str]): events reported by the simulation this frame
+    """
+    if BOMB_HIT in events:
+        salamander_show_damage(world)
+    if SALAMANDER_FELL in events:
+        world.salamander_frames.table = world.fall_frames
+    if world.state.falling:
+        world.salamander_frames.angle = world.state.salamander_angle
+    advance_animator(world.salamander_frames)
+    if GAME_OVER in events:
+        if STAGE_TIMINGS_FILE is not None:
+            write_stage_timings(world.timer, STAGE_TIMINGS_FILE)
+        if world.replay is not None:
+            save_replay(world.replay, REPLAY_RECORD_FILE)
+        if world.latency is not None:
+            write_input_latency(world.latency, INPUT_LATENCY_FILE)
+        # the world stays underneath the end screen, so PLAY AGAIN can restart it in place
+        push_cached_scene('end', final_page_count = world.state.page_count,
+                          settings_mode = world.state.settings_mode)
 
-def salamander_show_damage(world: World):
+def background_stage(world: World, events: list[str]):
     """
-    Sequence animation flashes red
+    Scrolls the background
     Args:
         world (World): World instance
+        events (list[str]): events reported by the simulation this frame
     """
-    salamander_hurt_sequence = [NORMAL, RED, NORMAL]
-    sequence_animation(world.salamander, 'filename', salamander_hurt_sequence,
-                       1, 2)
+    scroll_background(world)
 
-def subtract_from_score(world: World):
+# stages run after the simulation each frame, in order
+VIEW_STAGES = [
+    ('sync', sync_stage),
+    ('hud', hud_stage),
+    ('effects', effects_stage),
+    ('background', background_stage),
+]
+
+def toggle_profiler(world: World):
     """
-    Subtract 2 from score if possible. Score must stay above 0
+    Turns the frame-time overlay and trace file on or off
     Args:
         world (World): World instance
     """
-    if world.page_count >= 2:
-        world.page_count -= 2
+    profiler = world.profiler
+    profiler.enabled = not profiler.enabled
+    if profiler.enabled:
+        if world.overlay is None:
+            world.overlay = create_profiler_overlay(10, 130)
+        start_trace(profiler)
     else:
-        world.page_count = 0
+        close_trace(profiler)
+    set_overlay_visible(world.overlay, profiler.enabled)
 
-def salamander_bombs_collide(world: World):
+def start_trace(profiler: FrameProfiler):
     """
-    When salamander and bombs collide, filter and destroy bombs, salamander show hurt,
-    remove_heart, and subtracts from score
+    Starts streaming frames to a new numbered trace file
     Args:
-        world (World): World instance
+        profiler (FrameProfiler): FrameProfiler instance
     """
-    keep = []
-    for bomb in world.bombs:
-        if colliding(bomb, world.salamander):
-            destroy(bomb)
-            salamander_show_damage(world)
-            remove_heart(world)
-            subtract_from_score(world)
-        else:
-            keep.append(bomb)
-    world.bombs = keep
+    open_trace(profiler, numbered_trace_path(PROFILER_TRACE_FILE))
+    profiler.last_start_ns = None
 
-def salamander_fall_animation(world: World):
+def run_tick(world: World) -> list[str]:
     """
-    Stops objects from falling and spawning, animation for salamander to spin offscreen
+    Steps the simulation by one tick, then runs each of VIEW_STAGES, timing every stage
     Args:
         world (World): World instance
-    """
-    world.page_speed = 0
-    world.bomb_speed = 0
-    world.spawn_rate = 10000
-    world.salamander.flip_y = True
-    linear_animation(world.salamander, 'angle', 0, 360, 2.0, True, None, False)
-    linear_animation(world.salamander, 'y', 360, 700, 2.0, True, None, False)
+    Returns:
+        list[str]: events reported by the simulation
+    """
+    world.previous_salamander_x = world.state.salamander_x
+    world.previous_salamander_y = world.state.salamander_y
+    if world.replay is not None:
+        record_inputs(world.replay, world.state, world.inputs)
+    events = step(world.state, world.inputs, world.timer)
+    run_stages(VIEW_STAGES, world.timer, world, events)
+    return events
 
-def when_game_over(world: World):
+def run_due_ticks(world: World, delta: float) -> list[str]:
     """
-    When the game is over, change scene to EndScreen
+    Runs every tick the time since the last update covers, stopping early at game over
     Args:
         world (World): World instance
-    """
-    if world.salamander.y >= 600:
-        change_scene('end', final_page_count = world.page_count)
+        delta (float): seconds since the last update
+    Returns:
+        list[str]: events reported by the simulation over all of them
+    """
+    events = []
+    for _ in range(advance_loop(world.loop, delta)):
+        events += run_tick(world)
+        if world.state.game_over:
+            break
+    return events
 
-def remove_heart(world: World):
+def interpolate_sprites(world: World):
     """
-    Subtract from heart count, destroys heart, and update hearts in world
+    Draws the salamander, pages and bombs part of the way from the previous tick to the
+    latest one, by how far the real time has reached toward the next tick
     Args:
         world (World): World instance
     """
-    world.hearts_remaining -= 1
-    for heart in world.hearts:
-        destroy(heart)
-    if (world.hearts_remaining == 3):
-        world.hearts = [create_heart(LEFT_HEART_X), create_heart(MIDDLE_HEART_X), create_heart(RIGHT_HEART_X)]
-    elif (world.hearts_remaining == 2):
-        world.hearts = [create_heart(MIDDLE_HEART_X), create_heart(RIGHT_HEART_X)]
-    elif (world.hearts_remaining == 1):
-        world.hearts = [create_heart(RIGHT_HEART_X)]
-    elif (world.hearts_remaining == 0):
-        world.hearts = []
-        salamander_fall_animation(world)
+    alpha = interpolation_alpha(world.loop)
+    state = world.state
+    world.salamander.x = interpolate(world.previous_salamander_x, state.salamander_x, alpha)
+    world.salamander.y = interpolate(world.previous_salamander_y, state.salamander_y, alpha)
+    store = state.objects
+    # falling objects only move straight down by their speed each tick
+    lag = 1 - alpha
+    for sprites in (world.pages, world.bombs):
+        for slot, sprite in sprites.items():
+            sprite.y = float(store.y[slot] - store.speed[slot] * lag)
 
-def update_difficulty_mode(world: World):
+def update_world(world: World, delta: float):
     """
-    Adjusts speed and spawn rate of bombs and pages depending on selected difficulty mode,
-    then updates display with current difficulty level
+    The only update handler of the world scene. Steps the simulation by one tick, or
+    with FIXED_TICK_LOOP by as many ticks as the time since the last update covers,
+    running VIEW_STAGES after each, and records the frame if the profiler is on
     Args:
         world (World): World instance
-    """
-    if world.settings_mode == 'easy':
-        world.display_difficulty.text = "EASY"
-        world.page_speed = 4
-        world.bomb_speed = 6
-        world.spawn_rate = 60
-    elif world.settings_mode == 'medium':
-        world.display_difficulty.text = "MEDIUM"
-        world.page_speed = 6
-        world.bomb_speed = 8
-        world.spawn_rate = 30
-    elif world.settings_mode == 'hard':
-        world.display_difficulty.text = "HARD"
-        world.page_speed = 8
-        world.bomb_speed = 10
-        world.spawn_rate = 20
+        delta (float): seconds since the last update
+    """
+    if queued_push() is not None:
+        # a scene push waits for the world's next drawn frame, and the game stands still until then
+        return
+    start = perf_counter_ns()
+    if FIXED_TICK_LOOP:
+        events = run_due_ticks(world, delta)
+        interpolate_sprites(world)
+    else:
+        events = run_tick(world)
+    if world.profiler.enabled:
+        pages = count_falling(world.state.objects, PAGE)
+        bombs = count_falling(world.state.objects, BOMB)
+        record_frame(world.profiler, start, perf_counter_ns() - start, pages, bombs)
+        skipped = world.loop.skipped_frames if FIXED_TICK_LOOP else None
+        draw_profiler_overlay(world.overlay, world.profiler, pages, bombs, skipped)
+        if GAME_OVER in events:
+            # the run's trace is complete; reset_world() starts a new one if PLAY AGAIN is pressed
+            close_trace(world.profiler)
 
 when("starting: title", create_title_screen)
 when("clicking: title", handle_title_buttons)
+when("updating: title", poll_preloader)
 
 when('starting: world', create_world)
 when('clicking: world', handle_world_buttons)
-when('entering: world', resume_from_settings)
+when('entering: world', enter_world)
 
-when('updating: world', move_salamander)
 when('typing: world', keys_pressed)
 when('done typing: world', keys_not_pressed)
-when('updating: world', salamander_direction)
-when('updating: world', make_pages)
-when('updating: world', move_pages_down)
-when('updating: world', destroy_page_on_ground)
-when('updating: world',destroy_when_page_collide)
-when('updating: world', update_score)
-when('updating: world', make_bombs)
-when('updating: world', move_bombs_down)
-when('updating: world', destroy_bomb_on_ground)
-when('updating: world',salamander_bombs_collide)
-when('updating: world', when_game_over)
-when('updating: world', move_windows_down)
-when('updating: world', move_clouds_down)
+when('updating: world', update_world)
+register('director.post_render', draw_falling_batch, targets=['world'])
+register('director.post_render', measure_input_latency, targets=['world'])
+# after everything else drawn in the frame, settings or end is pushed if asked for during the update
+register('director.post_render', carry_out_queued_push, targets=['world'])
 
 when('starting: settings', create_settings_screen)
 when('clicking: settings', handle_settings_buttons)
 
 when('starting: end', create_end_screen)
+when('entering: end', show_final_score)
 when('clicking: end', handle_end_buttons)
 
-start()
-debug(scene = 'title')
\ No newline at end of file
+if DIRTY_RECT_RENDERING:
+    DIRTY_TRACKER.debug = DIRTY_RECT_DEBUG
+    watch_dirty_regions(['world', 'settings', 'end'])
+
+# only open the game when run directly, so benchmark.py can import the scenes and drive them headless
+if __name__ == '__main__':
+    start()
+    debug(scene = 'title')
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Scenes kept alive after they close, so opening them again skips building them.
+
+Designer builds a brand new scene, and every sprite in it, each time a scene is
+pushed. A scene that remembers itself here is built that way only the first
+time. After it is popped, the same Designer scene, with its sprites and state
+untouched, goes back on top of the stack. Its entering handler then refreshes
+whatever differs between visits.
+
+Like Designer's own push_scene(), push_cached_scene() only queues the push.
+It is carried out by carry_out_queued_push() once the scene asking for it has
+finished its update and drawn its frame, the same point in the loop where
+Designer changes scenes, so the rest of that update still runs in the scene
+it started in. A scene pushed for the first time is handed to Designer's
+push_scene() at that point, so a first push and a warm one happen at the same
+moment. Designer has no call that puts an existing scene back on the stack,
+so a warm push takes the steps of Designer's push itself, except that it
+leaves the pygame event queue alone.
+"""
+from typing import Optional
+
+from designer import get_director, push_scene
+from designer.core.event import Event
+from designer.core.scene import Scene
+
+SCENE_CACHE: dict[str, Scene] = {}
+# name and handler arguments of the scene waiting to be pushed, if any
+QUEUED_PUSH: list[tuple[str, dict]] = []
+
+
+def remember_scene(name: str):
+    """
+    Keeps the scene that is starting, to be pushed again by push_cached_scene(). Call it from
+    the scene's starting handler
+    Args:
+        name (str): name the scene's handlers are registered under
+    """
+    SCENE_CACHE[name] = get_director().current_scene
+
+
+def push_cached_scene(name: str, **kwargs):
+    """
+    Queues a scene to be pushed on top of the current one, reusing it if it was remembered. Like
+    Designer's push_scene(), the keyword arguments are passed to the scene's entering handler,
+    and to its starting handler the first time. A later push in the same frame replaces it
+    Args:
+        name (str): name of the scene
+        **kwargs: arguments for the scene's handlers
+    """
+    QUEUED_PUSH[:] = [(name, kwargs)]
+
+
+def queued_push() -> Optional[str]:
+    """
+    The scene waiting to be pushed
+    Returns:
+        Optional[str]: its name, None if no push is queued
+    """
+    return QUEUED_PUSH[0][0] if QUEUED_PUSH else None
+
+
+def carry_out_queued_push():
+    """
+    Pushes the queued scene, if any. Register it for the post_render event of every scene
+    that calls push_cached_scene()
+    """
+    if not QUEUED_PUSH:
+        return
+    name, kwargs = QUEUED_PUSH.pop()
+    scene = SCENE_CACHE.get(name)
+    if scene is None:
+        push_scene(name, **kwargs)
+        return
+    director = get_director()
+    old_scene = director.current_scene
+    old_scene._handle_event('director.scene.exit', Event(world=old_scene._game_state, scene=old_scene, **kwargs))
+    director._switch_scene()
+    director._scenes.append(scene)
+    director.scene_name = name
+    scene._handle_event('director.scene.enter', Event(world=scene._game_state, scene=scene, **kwargs))
+
+
+def forget_scenes():
+    """
+    Drops every remembered scene and any queued push, so each scene is built again the next time
+    it is pushed
+    """
+    SCENE_CACHE.clear()
+    QUEUED_PUSH.clear()
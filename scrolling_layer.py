@@ -0,0 +1,105 @@
+"""
+Background layers pre-rendered once and scrolled as a whole.
+
+A layer is a surface the size of the screen that tiles vertically. It is shown by
+two sprites, one directly above the other, so scrolling the layer is a single
+offset change and drawing it costs two blits however much is painted on it.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import pygame
+from designer import DesignerObject
+from designer.core.internal_image import InternalImage
+
+from assets import surface_sprite
+
+
+@dataclass
+class ScrollingLayer:
+    """ Two copies of a tiling surface that wrap around the screen together """
+    top: DesignerObject
+    bottom: DesignerObject
+    height: int
+    speed: float
+    offset: float = 0
+
+
+def render_layer(width: int, height: int, stamps: list[tuple[pygame.Surface, float, float]],
+                 fill: Optional[tuple[str, tuple[int, int, int, int]]] = None) -> InternalImage:
+    """
+    Paints surfaces onto a transparent layer. Each surface is centered on its position
+    and also painted one layer height above and below, so the layer tiles seamlessly
+    Args:
+        width (int): width of the layer
+        height (int): height of the layer, which is also how far it scrolls before repeating
+        stamps (list[tuple[pygame.Surface, float, float]]): surface and center x and y to paint it at
+        fill (Optional[tuple[str, tuple[int, int, int, int]]]): color and left, top, width, height to fill first
+    Returns:
+        InternalImage: finished layer
+    """
+    layer = InternalImage(size=(width, height))
+    if fill is not None:
+        layer._surf.fill(*fill)
+    for surface, x, y in stamps:
+        rect = surface.get_rect(center=(x, y % height))
+        for wrap in (-height, 0, height):
+            layer._surf.blit(surface, rect.move(0, wrap))
+    return layer
+
+
+def crop_layer(layer: InternalImage, left: int, width: int) -> InternalImage:
+    """
+    Copies a vertical strip out of a layer. The strip still tiles, so it can scroll on its own
+    Args:
+        layer (InternalImage): full layer
+        left (int): x position of the strip's left edge
+        width (int): width of the strip
+    Returns:
+        InternalImage: the strip
+    """
+    strip = InternalImage(size=(width, layer.height))
+    # adding onto the empty strip copies the pixels exactly instead of blending their alpha
+    strip._surf.blit(layer._surf, (0, 0), pygame.Rect(left, 0, width, layer.height), pygame.BLEND_RGBA_ADD)
+    return strip
+
+
+def create_scrolling_layer(layer: InternalImage, speed: float, x: int = 0) -> ScrollingLayer:
+    """
+    Creates the two sprites that show a layer
+    Args:
+        layer (InternalImage): surface that tiles vertically
+        speed (float): pixels scrolled down each frame
+        x (int): x position of the layer's left edge
+    Returns:
+        ScrollingLayer: ScrollingLayer instance
+    """
+    halves = []
+    for _ in range(2):
+        half = surface_sprite(layer)
+        half.anchor = 'topleft'
+        half.x = x
+        halves.append(half)
+    scrolling = ScrollingLayer(halves[0], halves[1], layer.height, speed)
+    place_layer(scrolling)
+    return scrolling
+
+
+def place_layer(layer: ScrollingLayer):
+    """
+    Moves the two sprites of a layer to its current offset
+    Args:
+        layer (ScrollingLayer): ScrollingLayer instance
+    """
+    layer.top.y = layer.offset - layer.height
+    layer.bottom.y = layer.offset
+
+
+def scroll_layer(layer: ScrollingLayer):
+    """
+    Scrolls a layer down by its speed and wraps around
+    Args:
+        layer (ScrollingLayer): ScrollingLayer instance
+    """
+    layer.offset = (layer.offset + layer.speed) % layer.height
+    place_layer(layer)
@@ -0,0 +1,607 @@
+"""
+Headless simulation core for Salamander Spy Scale.
+
+All of the game rules live here and work on plain data: positions, axis-aligned
+hitboxes, score and hearts. Nothing in this module touches Designer or pygame, so
+a run can be stepped as fast as Python allows without a display. The Designer
+scenes in salamander_exists.py are a thin view that calls step() once per frame
+and copies the resulting positions onto their sprites.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from random import Random
+from typing import Optional
+
+import numpy as np
+
+from falling_store import (FallingStore, PAGE, BOMB, create_falling_store, clear_falling, spawn_falling,
+                           count_falling, set_falling_speed, move_falling, cull_falling)
+from collision import band_candidates, within_range, precise_hits
+from fall_schedule import FallSchedule, clear_fall_schedule, refresh_schedule, run_due_events, window_slots
+from stage_timer import StageTimer, run_stages
+from telemetry import (Telemetry, record_event, RECORD_PAGE_SPAWNED, RECORD_BOMB_SPAWNED, RECORD_PAGE_COLLECTED,
+                       RECORD_BOMB_HIT, RECORD_SALAMANDER_FELL, RECORD_GAME_OVER)
+
+SALAMANDER_SPEED = 10
+MAX_OBJECTS = 7
+
+# screen dimensions used by the Designer window
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+
+# screen limit x max and min positions
+MAX_X_POSITION = 650
+MIN_X_POSITION = 150
+
+# salamander starting position
+SALAMANDER_START_X = 400
+SALAMANDER_START_Y = 360
+
+STARTING_HEARTS = 3
+
+# Designer runs updates at a fixed 30 per second
+FRAMES_PER_SECOND = 30
+# game time advanced by each step(); speeds are in pixels per step and nothing reads the wall clock,
+# so a seeded run with the same inputs plays out the same however fast it is stepped
+TIMESTEP_SECONDS = 1 / FRAMES_PER_SECOND
+
+# the fall animation moves the salamander from its start to FALL_END_Y over FALL_SECONDS,
+# and the game is over once it passes GAME_OVER_Y
+FALL_SECONDS = 2.0
+FALL_END_Y = 700
+GAME_OVER_Y = 600
+FALL_FRAMES = int(FALL_SECONDS * FRAMES_PER_SECOND)
+
+# page speed, bomb speed, spawn rate for each difficulty
+DIFFICULTY_SETTINGS = {
+    'easy': (4, 6, 60),
+    'medium': (6, 8, 30),
+    'hard': (8, 10, 20),
+}
+
+# spawn rate once the salamander has lost its grip, effectively stops spawning
+FALLING_SPAWN_RATE = 10000
+
+# names of events reported by step()
+PAGE_SPAWNED = 'page spawned'
+BOMB_SPAWNED = 'bomb spawned'
+PAGE_COLLECTED = 'page collected'
+BOMB_HIT = 'bomb hit'
+SALAMANDER_FELL = 'salamander fell'
+GAME_OVER = 'game over'
+
+
+@dataclass(frozen=True)
+class Hitbox:
+    """ Size of an axis-aligned hitbox; position comes from the object using it """
+    width: float
+    height: float
+
+
+# emoji are drawn 36 pixels square, pages are grown to 0.8 of that
+PAGE_HITBOX = Hitbox(28, 28)
+BOMB_HITBOX = Hitbox(36, 36)
+# default salamander size for headless runs, the view measures the real sprite
+SALAMANDER_HITBOX = Hitbox(90, 110)
+
+
+@dataclass
+class Inputs:
+    """ Which arrow keys are held down during a step """
+    left: bool = False
+    right: bool = False
+
+
+@dataclass
+class GameState:
+    """ Everything needed to advance the game by one frame """
+    rng: Random
+    objects: FallingStore
+    max_objects: int = MAX_OBJECTS
+    salamander_x: float = SALAMANDER_START_X
+    salamander_y: float = SALAMANDER_START_Y
+    salamander_angle: float = 0
+    salamander_speed: int = 0
+    moving_left: bool = False
+    moving_right: bool = False
+    page_count: int = 0
+    hearts_remaining: int = STARTING_HEARTS
+    settings_mode: str = 'medium'
+    page_speed: int = 6
+    bomb_speed: int = 8
+    spawn_rate: int = 30
+    falling: bool = False
+    game_over: bool = False
+    frame: int = 0
+    page_hitbox: Hitbox = PAGE_HITBOX
+    bomb_hitbox: Hitbox = BOMB_HITBOX
+    salamander_hitbox: Hitbox = SALAMANDER_HITBOX
+    # bitmasks matching each hitbox, indexed [row, column]; without them collisions use the boxes
+    page_mask: Optional[np.ndarray] = None
+    bomb_mask: Optional[np.ndarray] = None
+    salamander_mask: Optional[np.ndarray] = None
+    # when each page and bomb will reach the salamander's band and the ground, used until it falls
+    schedule: FallSchedule = field(default_factory=FallSchedule)
+    # records spawns, pickups, hits and the end of the run as they happen, if set
+    telemetry: Optional[Telemetry] = None
+    # move the salamander by the speed picked from this step's keys, instead of the previous step's
+    same_tick_input: bool = False
+
+
+def new_game(seed: Optional[int] = None, settings_mode: str = 'medium', max_objects: int = MAX_OBJECTS,
+             rng: Optional[Random] = None) -> GameState:
+    """
+    Creates the starting state of a run
+    Args:
+        seed (Optional[int]): seed for the random spawns, None for an unseeded run
+        settings_mode (str): starting difficulty
+        max_objects (int): most pages, and separately bombs, that can fall at once
+        rng (Optional[Random]): random stream to spawn from instead of a new one seeded with seed
+    Returns:
+        GameState: GameState instance
+    """
+    if rng is None:
+        rng = Random(seed)
+    state = GameState(rng, create_falling_store(2 * max_objects), max_objects, settings_mode=settings_mode)
+    update_difficulty_mode(state)
+    return state
+
+
+def reset_game(state: GameState, seed: Optional[int] = None, settings_mode: str = 'medium'):
+    """
+    Puts a state back to the start of a run in place, keeping its object store, hitboxes and bitmasks.
+    Plays out exactly like new_game() with the same seed
+    Args:
+        state (GameState): GameState instance
+        seed (Optional[int]): seed for the random spawns, None for an unseeded run
+        settings_mode (str): starting difficulty
+    """
+    state.rng.seed(seed)
+    clear_falling(state.objects)
+    clear_fall_schedule(state.schedule)
+    state.salamander_x = SALAMANDER_START_X
+    state.salamander_y = SALAMANDER_START_Y
+    state.salamander_angle = 0
+    state.salamander_speed = 0
+    state.moving_left = False
+    state.moving_right = False
+    state.page_count = 0
+    state.hearts_remaining = STARTING_HEARTS
+    state.settings_mode = settings_mode
+    state.falling = False
+    state.game_over = False
+    state.frame = 0
+    update_difficulty_mode(state)
+
+
+def difficulty_index(settings_mode: str) -> int:
+    """
+    Position of a difficulty in DIFFICULTY_SETTINGS, as telemetry stores it
+    Args:
+        settings_mode (str): difficulty
+    Returns:
+        int: its position, -1 if it is not a known difficulty
+    """
+    modes = list(DIFFICULTY_SETTINGS)
+    return modes.index(settings_mode) if settings_mode in modes else -1
+
+
+def record_telemetry(state: GameState, event: int, value: int = 0, x: float = 0.0):
+    """
+    Records a telemetry event on the current step, if telemetry is on
+    Args:
+        state (GameState): GameState instance
+        event (int): one of the telemetry record events
+        value (int): value stored with the event
+        x (float): x position stored with the event
+    """
+    if state.telemetry is not None:
+        record_event(state.telemetry, state.frame, event, value, x)
+
+
+@lru_cache(maxsize=16)
+def kind_sizes(page_hitbox: Hitbox, bomb_hitbox: Hitbox) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hitbox widths and heights indexed by kind. Cached, so each pair of hitboxes builds its
+    arrays once; they are shared and must not be changed
+    Args:
+        page_hitbox (Hitbox): hitbox of a page
+        bomb_hitbox (Hitbox): hitbox of a bomb
+    Returns:
+        tuple[np.ndarray, np.ndarray]: widths and heights
+    """
+    widths = np.array([page_hitbox.width, bomb_hitbox.width], dtype=np.float64)
+    heights = np.array([page_hitbox.height, bomb_hitbox.height], dtype=np.float64)
+    return widths, heights
+
+
+def salamander_box(state: GameState) -> tuple[int, int, float, float]:
+    """
+    Where the salamander's hitbox is
+    Args:
+        state (GameState): GameState instance
+    Returns:
+        tuple[int, int, float, float]: left, top, right and bottom edges
+    """
+    hitbox = state.salamander_hitbox
+    left = int(state.salamander_x - hitbox.width / 2)
+    top = int(state.salamander_y - hitbox.height / 2)
+    return left, top, left + hitbox.width, top + hitbox.height
+
+
+def colliding_with_salamander(state: GameState) -> np.ndarray:
+    """
+    Checks which falling objects touch the salamander. Only objects inside its
+    vertical band and horizontal range get the precise bitmask test. The band
+    holds just the objects the schedule has put in the collision window, except
+    while the salamander falls and moves the band, when every object is tested
+    Args:
+        state (GameState): GameState instance
+    Returns:
+        np.ndarray: slots in state.objects that touch the salamander
+    """
+    left, top, right, bottom = salamander_box(state)
+    widths, heights = kind_sizes(state.page_hitbox, state.bomb_hitbox)
+    if state.falling:
+        candidates = band_candidates(state.objects, widths, heights, left, top, right, bottom)
+    else:
+        candidates = within_range(state.objects, window_slots(state.schedule, state.objects), widths, left, right)
+    return precise_hits(state.objects, candidates, widths, [state.page_mask, state.bomb_mask],
+                        state.salamander_mask, left, top)
+
+
+def move_salamander(state: GameState):
+    """
+    Moves salamander horizontally by its current speed
+    Args:
+        state (GameState): GameState instance
+    """
+    state.salamander_x += state.salamander_speed
+
+
+def steering_speed(salamander_x: float, moving_left: bool, moving_right: bool) -> int:
+    """
+    Speed the held keys give the salamander from where it is, none past a screen limit
+    Args:
+        salamander_x (float): x position of the salamander
+        moving_left (bool): whether the left arrow key is held
+        moving_right (bool): whether the right arrow key is held
+    Returns:
+        int: horizontal speed
+    """
+    if moving_right and salamander_x < MAX_X_POSITION:
+        return SALAMANDER_SPEED
+    if moving_left and salamander_x > MIN_X_POSITION:
+        return -SALAMANDER_SPEED
+    return 0
+
+
+def salamander_direction(state: GameState):
+    """
+    Checks if a key is pressed and if Salamander is within screen limit,
+    then sets the speed to move horizontally or not at all
+    Args:
+        state (GameState): GameState instance
+    """
+    state.salamander_speed = steering_speed(state.salamander_x, state.moving_left, state.moving_right)
+
+
+def make_pages(state: GameState, events: list[str]):
+    """
+    Creates page randomly if there aren't enough currently
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    not_enough_pages = count_falling(state.objects, PAGE) < state.max_objects
+    random_chance = state.rng.randint(1, state.spawn_rate) == 1
+    if not_enough_pages and random_chance:
+        x = state.rng.randint(MIN_X_POSITION, MAX_X_POSITION)
+        spawn_falling(state.objects, PAGE, x, 0, state.page_speed)
+        events.append(PAGE_SPAWNED)
+        record_telemetry(state, RECORD_PAGE_SPAWNED, state.page_speed, x)
+
+
+def make_bombs(state: GameState, events: list[str]):
+    """
+    Create bomb randomly if there aren't enough currently
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    not_enough_bombs = count_falling(state.objects, BOMB) < state.max_objects
+    random_odds = state.rng.randint(1, state.spawn_rate) == 1
+    if not_enough_bombs and random_odds:
+        x = state.rng.randint(MIN_X_POSITION, MAX_X_POSITION)
+        spawn_falling(state.objects, BOMB, x, 0, state.bomb_speed)
+        events.append(BOMB_SPAWNED)
+        record_telemetry(state, RECORD_BOMB_SPAWNED, state.bomb_speed, x)
+
+
+def move_objects_down(state: GameState):
+    """
+    Moves each page and bomb downward by its speed
+    Args:
+        state (GameState): GameState instance
+    """
+    move_falling(state.objects)
+
+
+def destroy_on_ground(state: GameState):
+    """
+    Removes pages and bombs that touch the ground, and moves objects into and out of the
+    collision window, as scheduled for this step. While the salamander falls and moves the
+    band, every object is checked instead
+    Args:
+        state (GameState): GameState instance
+    """
+    if state.falling:
+        cull_falling(state.objects, SCREEN_HEIGHT)
+        return
+    _, top, _, bottom = salamander_box(state)
+    _, heights = kind_sizes(state.page_hitbox, state.bomb_hitbox)
+    band = (top, bottom, float(heights[PAGE]), float(heights[BOMB]))
+    refresh_schedule(state.schedule, state.objects, state.frame, band, heights, SCREEN_HEIGHT)
+    run_due_events(state.schedule, state.objects, state.frame)
+
+
+def destroy_when_page_collide(state: GameState, hits: np.ndarray, events: list[str]):
+    """
+    Removes pages that collide with Salamander, then adds to score
+    Args:
+        state (GameState): GameState instance
+        hits (np.ndarray): slots touching the salamander
+        events (list[str]): events reported this step
+    """
+    page_hits = hits[state.objects.kind[hits] == PAGE]
+    collected = len(page_hits)
+    if collected:
+        state.objects.alive[page_hits] = False
+        state.page_count += collected
+        events.extend([PAGE_COLLECTED] * collected)
+        if state.telemetry is not None:
+            for x in state.objects.x[page_hits].tolist():
+                record_telemetry(state, RECORD_PAGE_COLLECTED, state.page_count, x)
+
+
+def subtract_from_score(state: GameState):
+    """
+    Subtract 2 from score if possible. Score must stay above 0
+    Args:
+        state (GameState): GameState instance
+    """
+    if state.page_count >= 2:
+        state.page_count -= 2
+    else:
+        state.page_count = 0
+
+
+def salamander_bombs_collide(state: GameState, hits: np.ndarray, events: list[str]):
+    """
+    When salamander and bombs collide, removes bombs, removes a heart,
+    and subtracts from score
+    Args:
+        state (GameState): GameState instance
+        hits (np.ndarray): slots touching the salamander
+        events (list[str]): events reported this step
+    """
+    bomb_hits = hits[state.objects.kind[hits] == BOMB]
+    if len(bomb_hits):
+        state.objects.alive[bomb_hits] = False
+        for x in state.objects.x[bomb_hits].tolist():
+            events.append(BOMB_HIT)
+            remove_heart(state, events)
+            subtract_from_score(state)
+            record_telemetry(state, RECORD_BOMB_HIT, state.hearts_remaining, x)
+
+
+def remove_heart(state: GameState, events: list[str]):
+    """
+    Subtract from heart count, and start the fall when none are left
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    state.hearts_remaining -= 1
+    if state.hearts_remaining == 0:
+        salamander_fall_animation(state)
+        events.append(SALAMANDER_FELL)
+        record_telemetry(state, RECORD_SALAMANDER_FELL, state.page_count)
+
+
+def salamander_fall_animation(state: GameState):
+    """
+    Stops objects from falling and spawning, and starts the salamander spinning offscreen
+    Args:
+        state (GameState): GameState instance
+    """
+    state.page_speed = 0
+    state.bomb_speed = 0
+    state.spawn_rate = FALLING_SPAWN_RATE
+    state.falling = True
+    set_falling_speed(state.objects, PAGE, state.page_speed)
+    set_falling_speed(state.objects, BOMB, state.bomb_speed)
+
+
+def move_falling_salamander(state: GameState):
+    """
+    Spins the salamander and drops it toward the bottom of the screen while it falls
+    Args:
+        state (GameState): GameState instance
+    """
+    if state.falling:
+        state.salamander_y = min(state.salamander_y + (FALL_END_Y - SALAMANDER_START_Y) / FALL_FRAMES, FALL_END_Y)
+        state.salamander_angle = (state.salamander_angle + 360 / FALL_FRAMES) % 360
+
+
+def when_game_over(state: GameState, events: list[str]):
+    """
+    The game is over once the salamander has fallen off the bottom of the screen
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    if state.salamander_y >= GAME_OVER_Y and not state.game_over:
+        state.game_over = True
+        events.append(GAME_OVER)
+        # the step it happened on is the time to death
+        record_telemetry(state, RECORD_GAME_OVER, state.page_count)
+
+
+def update_difficulty_mode(state: GameState):
+    """
+    Adjusts speed and spawn rate of bombs and pages depending on selected difficulty mode
+    Args:
+        state (GameState): GameState instance
+    """
+    if state.settings_mode in DIFFICULTY_SETTINGS:
+        state.page_speed, state.bomb_speed, state.spawn_rate = DIFFICULTY_SETTINGS[state.settings_mode]
+        set_falling_speed(state.objects, PAGE, state.page_speed)
+        set_falling_speed(state.objects, BOMB, state.bomb_speed)
+
+
+def steer_stage(state: GameState, events: list[str]):
+    """
+    Moves the salamander by last frame's speed, then picks its speed from the held keys.
+    This keeps the original handler order, so a key press moves the salamander one frame later.
+    With same_tick_input the speed is picked first, so the salamander moves on the frame the key is held
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    if state.same_tick_input:
+        salamander_direction(state)
+        move_salamander(state)
+    else:
+        move_salamander(state)
+        salamander_direction(state)
+
+
+def input_lag_steps(state: GameState) -> int:
+    """
+    Steps between the first one run with a key held or released and the one that moves the salamander by it
+    Args:
+        state (GameState): GameState instance
+    Returns:
+        int: 0 with same_tick_input, otherwise 1
+    """
+    return 0 if state.same_tick_input else 1
+
+
+def next_steering_speed(state: GameState, left: bool, right: bool) -> int:
+    """
+    Speed the next step picks for the salamander if these keys are held through it
+    Args:
+        state (GameState): GameState instance
+        left (bool): whether the left arrow key is held
+        right (bool): whether the right arrow key is held
+    Returns:
+        int: horizontal speed
+    """
+    # without same_tick_input the step moves the salamander by its current speed before picking
+    salamander_x = state.salamander_x if state.same_tick_input else state.salamander_x + state.salamander_speed
+    return steering_speed(salamander_x, left, right)
+
+
+def spawn_stage(state: GameState, events: list[str]):
+    """
+    Spawns pages, then bombs
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    make_pages(state, events)
+    make_bombs(state, events)
+
+
+def move_stage(state: GameState, events: list[str]):
+    """
+    Moves pages and bombs down
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    move_objects_down(state)
+
+
+def cull_stage(state: GameState, events: list[str]):
+    """
+    Removes pages and bombs on the ground
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    destroy_on_ground(state)
+
+
+def collide_stage(state: GameState, events: list[str]):
+    """
+    Tests everything against the salamander once, then scores pages before bombs
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    hits = colliding_with_salamander(state)
+    if len(hits):
+        destroy_when_page_collide(state, hits, events)
+        salamander_bombs_collide(state, hits, events)
+
+
+def fall_stage(state: GameState, events: list[str]):
+    """
+    Drops the salamander if it has lost its grip and checks for game over
+    Args:
+        state (GameState): GameState instance
+        events (list[str]): events reported this step
+    """
+    move_falling_salamander(state)
+    when_game_over(state, events)
+
+
+# stages of a step, in the order they run
+SIMULATION_STAGES = [
+    ('steer', steer_stage),
+    ('spawn', spawn_stage),
+    ('move', move_stage),
+    ('cull', cull_stage),
+    ('collide', collide_stage),
+    ('fall', fall_stage),
+]
+
+
+def step(state: GameState, inputs: Inputs, timer: Optional[StageTimer] = None) -> list[str]:
+    """
+    Advances the game by one frame by running each of SIMULATION_STAGES in order.
+    Pages and bombs are spawned, moved, culled and tested against the salamander
+    together, with pages scored before bombs as the Designer handlers used to do
+    Args:
+        state (GameState): GameState instance
+        inputs (Inputs): arrow keys held during this frame
+        timer (Optional[StageTimer]): records how long each stage took, if given
+    Returns:
+        list[str]: events that happened this frame
+    """
+    events = []
+    state.moving_left = inputs.left
+    state.moving_right = inputs.right
+    run_stages(SIMULATION_STAGES, timer, state, events)
+    state.frame += 1
+    return events
+
+
+def run(state: GameState, inputs: Inputs, frames: int) -> list[str]:
+    """
+    Steps the game for a number of frames with the same keys held, stopping early at game over
+    Args:
+        state (GameState): GameState instance
+        inputs (Inputs): arrow keys held for every frame
+        frames (int): maximum number of frames to run
+    Returns:
+        list[str]: every event reported during the run
+    """
+    events = []
+    for _ in range(frames):
+        events.extend(step(state, inputs))
+        if state.game_over:
+            break
+    return events
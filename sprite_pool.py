@@ -0,0 +1,80 @@
+"""
+Fixed-capacity pools of hidden sprites that are recycled instead of destroyed.
+
+Creating a page or bomb emoji rasterizes a new glyph and scales it, and destroying
+it leaves garbage behind. A pool builds its sprites up front and afterwards only
+shows and hides them, counting hits (a recycled sprite was available) and misses
+(a new sprite had to be built) so steady-state play can be checked to allocate nothing.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+from designer import DesignerObject
+
+
+@dataclass
+class SpritePool:
+    """ Hidden sprites waiting to be reused, with counts of how acquire() was served """
+    create: Callable[[], DesignerObject]
+    free: list[DesignerObject]
+    capacity: int
+    hits: int = 0
+    misses: int = 0
+
+
+def create_sprite_pool(create: Callable[[], DesignerObject], capacity: int) -> SpritePool:
+    """
+    Builds every sprite of a pool up front and hides them
+    Args:
+        create (Callable[[], DesignerObject]): function that builds one sprite
+        capacity (int): number of sprites to build
+    Returns:
+        SpritePool: SpritePool instance
+    """
+    free = []
+    for _ in range(capacity):
+        sprite = create()
+        sprite.visible = False
+        free.append(sprite)
+    return SpritePool(create, free, capacity)
+
+
+def acquire_sprite(pool: SpritePool) -> DesignerObject:
+    """
+    Shows a hidden sprite from the pool, building a new one only if the pool is empty
+    Args:
+        pool (SpritePool): SpritePool instance
+    Returns:
+        DesignerObject: visible sprite
+    """
+    if pool.free:
+        pool.hits += 1
+        sprite = pool.free.pop()
+        sprite.visible = True
+        return sprite
+    pool.misses += 1
+    return pool.create()
+
+
+def release_sprite(pool: SpritePool, sprite: DesignerObject):
+    """
+    Hides a sprite and returns it to the pool. Sprites beyond the pool's capacity
+    are hidden but kept, so a burst past capacity is only paid for once
+    Args:
+        pool (SpritePool): SpritePool instance
+        sprite (DesignerObject): sprite to recycle
+    """
+    sprite.visible = False
+    pool.free.append(sprite)
+
+
+def pool_hit_rate(pool: SpritePool) -> float:
+    """
+    Fraction of acquires served without building a sprite
+    Args:
+        pool (SpritePool): SpritePool instance
+    Returns:
+        float: hit rate between 0 and 1, 1 when nothing has been acquired yet
+    """
+    total = pool.hits + pool.misses
+    return pool.hits / total if total else 1.0
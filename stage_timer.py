@@ -0,0 +1,219 @@
+"""
+Ordered update stages with optional per-stage timing.
+
+A stage is a named function run once per frame. run_stages() runs a list of them
+in order and, when given a StageTimer, records how long each one took with
+perf_counter_ns into a fixed-size ring buffer, so percentiles of recent frames can
+be reported without the timer growing or allocating while the game runs.
+
+With allocation counting on, each stage also records what it allocated while it
+ran, measured with tracemalloc, and how many memory blocks it left allocated
+afterwards. A stage that reuses its buffers shows zero for both once the game
+is running. Counting slows every stage down, so the times recorded meanwhile
+are not representative.
+"""
+import json
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from time import perf_counter_ns
+from typing import Callable, Optional
+
+import numpy as np
+
+# number of recent frames kept per stage
+DEFAULT_TIMER_CAPACITY = 1024
+# runs of a stage that does nothing, to measure what measuring a stage allocates
+ALLOCATION_CALIBRATION_RUNS = 51
+
+
+@dataclass
+class StageTimer:
+    """ Most recent durations of each stage in nanoseconds, oldest overwritten first """
+    capacity: int = DEFAULT_TIMER_CAPACITY
+    samples: dict[str, np.ndarray] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+    # set by start_counting_allocations(), while tracemalloc is tracing
+    count_allocations: bool = False
+    # bytes and blocks measuring a stage that does nothing reports, taken off every stage's counts
+    allocation_overhead: tuple[int, int] = (0, 0)
+    # bytes allocated at the peak of each recent run, and memory blocks still held after it
+    allocated: dict[str, np.ndarray] = field(default_factory=dict)
+    net_blocks: dict[str, np.ndarray] = field(default_factory=dict)
+    allocation_counts: dict[str, int] = field(default_factory=dict)
+
+
+def record_sample(timer: StageTimer, name: str, duration_ns: int):
+    """
+    Stores one duration of a stage
+    Args:
+        timer (StageTimer): StageTimer instance
+        name (str): name of the stage
+        duration_ns (int): how long the stage took in nanoseconds
+    """
+    samples = timer.samples.get(name)
+    if samples is None:
+        samples = np.zeros(timer.capacity, dtype=np.int64)
+        timer.samples[name] = samples
+        timer.counts[name] = 0
+    count = timer.counts[name]
+    samples[count % timer.capacity] = duration_ns
+    timer.counts[name] = count + 1
+
+
+def record_allocation(timer: StageTimer, name: str, allocated: int, net_blocks: int):
+    """
+    Stores what one run of a stage allocated
+    Args:
+        timer (StageTimer): StageTimer instance
+        name (str): name of the stage
+        allocated (int): bytes allocated at the peak of the run
+        net_blocks (int): memory blocks still allocated after it
+    """
+    if name not in timer.allocated:
+        timer.allocated[name] = np.zeros(timer.capacity, dtype=np.int64)
+        timer.net_blocks[name] = np.zeros(timer.capacity, dtype=np.int64)
+        timer.allocation_counts[name] = 0
+    count = timer.allocation_counts[name]
+    timer.allocated[name][count % timer.capacity] = allocated
+    timer.net_blocks[name][count % timer.capacity] = net_blocks
+    timer.allocation_counts[name] = count + 1
+
+
+def measure_stage(stage: Callable, *args) -> tuple[int, int, int]:
+    """
+    Runs one stage while tracemalloc is tracing, measuring it without correcting for the
+    measurement's own allocations
+    Args:
+        stage (Callable): the stage
+        *args: arguments passed to the stage
+    Returns:
+        tuple[int, int, int]: nanoseconds it took, bytes allocated at its peak, and memory blocks
+            left allocated after it
+    """
+    start = perf_counter_ns()
+    before_blocks = sys.getallocatedblocks()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    stage(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    after_blocks = sys.getallocatedblocks()
+    return perf_counter_ns() - start, peak - before, after_blocks - before_blocks
+
+
+def run_counting_allocations(timer: StageTimer, name: str, stage: Callable, *args):
+    """
+    Runs one stage, recording its time and what it allocated
+    Args:
+        timer (StageTimer): StageTimer instance
+        name (str): name of the stage
+        stage (Callable): the stage
+        *args: arguments passed to the stage
+    """
+    duration_ns, allocated, net_blocks = measure_stage(stage, *args)
+    overhead_bytes, overhead_blocks = timer.allocation_overhead
+    record_allocation(timer, name, allocated - overhead_bytes, net_blocks - overhead_blocks)
+    record_sample(timer, name, duration_ns)
+
+
+def run_stages(stages: list[tuple[str, Callable]], timer: Optional[StageTimer], *args):
+    """
+    Runs each stage in order with the same arguments, timing them if there is a timer,
+    and counting their allocations too if it has allocation counting on
+    Args:
+        stages (list[tuple[str, Callable]]): name and function of each stage
+        timer (Optional[StageTimer]): StageTimer instance, or None to run untimed
+        *args: arguments passed to every stage
+    """
+    if timer is None:
+        for _, stage in stages:
+            stage(*args)
+        return
+    if timer.count_allocations:
+        for name, stage in stages:
+            run_counting_allocations(timer, name, stage, *args)
+        return
+    for name, stage in stages:
+        start = perf_counter_ns()
+        stage(*args)
+        record_sample(timer, name, perf_counter_ns() - start)
+
+
+def stage_percentiles(timer: StageTimer) -> dict[str, dict[str, float]]:
+    """
+    Summarizes the recent durations of each stage
+    Args:
+        timer (StageTimer): StageTimer instance
+    Returns:
+        dict[str, dict[str, float]]: for each stage, its p50, p99 and mean in microseconds
+            and how many frames were sampled
+    """
+    summary = {}
+    for name, samples in timer.samples.items():
+        recent = samples[:min(timer.counts[name], timer.capacity)] / 1000
+        summary[name] = {'p50_us': float(np.percentile(recent, 50)),
+                         'p99_us': float(np.percentile(recent, 99)),
+                         'mean_us': float(recent.mean()),
+                         'frames': len(recent)}
+    return summary
+
+
+def start_counting_allocations(timer: StageTimer):
+    """
+    Starts tracemalloc, if it is not already tracing, and has the timer record what each stage allocates
+    Args:
+        timer (StageTimer): StageTimer instance
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    # what measuring allocates by itself, the ints holding the counts read along the way. The first runs,
+    # and any run that refills or drains one of the interpreter's free lists, are a block or so off, so
+    # bytes and blocks are each taken from the median run
+    measurements = np.array([measure_stage(lambda: None)[1:] for _ in range(ALLOCATION_CALIBRATION_RUNS)])
+    bytes_overhead, blocks_overhead = np.median(measurements, axis=0).astype(int).tolist()
+    timer.allocation_overhead = (bytes_overhead, blocks_overhead)
+    timer.count_allocations = True
+
+
+def stop_counting_allocations(timer: StageTimer):
+    """
+    Stops recording allocations, and stops tracemalloc
+    Args:
+        timer (StageTimer): StageTimer instance
+    """
+    timer.count_allocations = False
+    tracemalloc.stop()
+
+
+def stage_allocations(timer: StageTimer) -> dict[str, dict[str, float]]:
+    """
+    Summarizes what each stage allocated over its recent runs
+    Args:
+        timer (StageTimer): StageTimer instance
+    Returns:
+        dict[str, dict[str, float]]: for each stage, the median and largest bytes allocated
+            in one run, the median blocks left allocated, and how many runs were counted
+    """
+    summary = {}
+    for name, allocated in timer.allocated.items():
+        runs = min(timer.allocation_counts[name], timer.capacity)
+        recent = allocated[:runs]
+        summary[name] = {'median_bytes': float(np.median(recent)),
+                         'max_bytes': int(recent.max()),
+                         'median_net_blocks': float(np.median(timer.net_blocks[name][:runs])),
+                         'runs': runs}
+    return summary
+
+
+def write_stage_timings(timer: StageTimer, path: str):
+    """
+    Writes the per-stage summary to a JSON file, with what each stage allocated if that was counted
+    Args:
+        timer (StageTimer): StageTimer instance
+        path (str): file to write
+    """
+    summary = stage_percentiles(timer)
+    for name, allocations in stage_allocations(timer).items():
+        summary[name].update(allocations)
+    with open(path, 'w') as timings_file:
+        json.dump(summary, timings_file, indent=2)
@@ -0,0 +1,250 @@
+"""
+Gameplay events recorded without slowing the game down, stored as compressed segments.
+
+Recording an event only writes one fixed-size record into a ring buffer
+allocated up front: no file is touched and nothing is allocated per event. A
+flush thread drains the ring every FLUSH_SECONDS, or sooner once it is half
+full, and appends what it took to the current segment file as one gzip member,
+starting a new file every SEGMENT_RECORDS records. The game thread only ever
+moves the head of the ring and the flush thread only the tail, so neither
+waits on the other. When the flush thread falls so far behind that the ring is
+full, new events are dropped and counted rather than blocking the game.
+
+Each segment is a gzip stream of RECORD_DTYPE records, so a run can be read
+back with read_telemetry(). Runs are numbered from 1 again in each session,
+and each session starts writing a new segment.
+
+Usage: python telemetry.py telemetry_directory
+"""
+import atexit
+import gzip
+import os
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+# what happened, stored in each record's event field; EVENT_NAMES has the same order
+RECORD_RUN_STARTED = 0
+RECORD_PAGE_SPAWNED = 1
+RECORD_BOMB_SPAWNED = 2
+RECORD_PAGE_COLLECTED = 3
+RECORD_BOMB_HIT = 4
+RECORD_DIFFICULTY_CHANGED = 5
+RECORD_SALAMANDER_FELL = 6
+RECORD_GAME_OVER = 7
+EVENT_NAMES = ['run started', 'page spawned', 'bomb spawned', 'page collected', 'bomb hit',
+               'difficulty changed', 'salamander fell', 'game over']
+
+# the run it belongs to, the step it happened on, what happened, and an x position and value that depend
+# on the event: where an object spawned or was hit and its speed, the score or hearts after a pickup or hit,
+# or the difficulty chosen
+RECORD_DTYPE = np.dtype([('run', '<u4'), ('frame', '<u4'), ('event', '<u4'), ('value', '<i4'), ('x', '<f4')])
+
+# records the ring holds before events are dropped
+RING_CAPACITY = 1 << 16
+FLUSH_SECONDS = 1.0
+SEGMENT_RECORDS = 1 << 20
+
+
+@dataclass
+class Telemetry:
+    """ Ring of event records, how far the game and the flush thread have got through it, and the segments written """
+    directory: str
+    records: np.ndarray
+    # records ever written by the game, and ever taken by the flush thread; their difference is the ring's fill
+    head: int = 0
+    tail: int = 0
+    run: int = 0
+    dropped: int = 0
+    segment: int = 0
+    segment_records: int = 0
+    segment_limit: int = SEGMENT_RECORDS
+    flush_seconds: float = FLUSH_SECONDS
+    wake: threading.Event = field(default_factory=threading.Event)
+    closing: bool = False
+    # set by the flush thread once it has written everything; the thread itself is not kept, since
+    # Designer searches a scene's world through every attribute and the thread refers back to this
+    finished: threading.Event = field(default_factory=threading.Event)
+    write_errors: list[str] = field(default_factory=list)
+
+
+def segment_path(telemetry: Telemetry) -> str:
+    """
+    File the records being flushed go to
+    Args:
+        telemetry (Telemetry): Telemetry instance
+    Returns:
+        str: path of the current segment
+    """
+    return os.path.join(telemetry.directory, f"segment-{telemetry.segment:06d}.bin.gz")
+
+
+def take_records(telemetry: Telemetry) -> np.ndarray:
+    """
+    Copies every record the game has written since the last call, oldest first, and frees their
+    place in the ring. Runs on the flush thread
+    Args:
+        telemetry (Telemetry): Telemetry instance
+    Returns:
+        np.ndarray: the records
+    """
+    head = telemetry.head
+    capacity = len(telemetry.records)
+    start, end = telemetry.tail % capacity, head % capacity
+    if head - telemetry.tail == 0:
+        taken = telemetry.records[:0].copy()
+    elif start < end:
+        taken = telemetry.records[start:end].copy()
+    else:
+        taken = np.concatenate((telemetry.records[start:], telemetry.records[:end]))
+    # only once copied, so the game cannot overwrite them first
+    telemetry.tail = head
+    return taken
+
+
+def write_segment(telemetry: Telemetry, taken: np.ndarray):
+    """
+    Appends records to the current segment as one gzip member, moving on to a new segment once it is full
+    Args:
+        telemetry (Telemetry): Telemetry instance
+        taken (np.ndarray): records to write
+    """
+    with open(segment_path(telemetry), 'ab') as segment:
+        segment.write(gzip.compress(taken.tobytes()))
+    telemetry.segment_records += len(taken)
+    if telemetry.segment_records >= telemetry.segment_limit:
+        telemetry.segment += 1
+        telemetry.segment_records = 0
+
+
+def flush_records(telemetry: Telemetry):
+    """
+    Drains the ring to segment files until closed. Runs on the flush thread
+    Args:
+        telemetry (Telemetry): Telemetry instance
+    """
+    while True:
+        telemetry.wake.wait(telemetry.flush_seconds)
+        telemetry.wake.clear()
+        closing = telemetry.closing
+        taken = take_records(telemetry)
+        if len(taken):
+            try:
+                write_segment(telemetry, taken)
+            except OSError as error:
+                # the records are lost, the game goes on
+                telemetry.write_errors.append(str(error))
+        if closing:
+            telemetry.finished.set()
+            return
+
+
+def open_telemetry(directory: str, capacity: int = RING_CAPACITY, segment_limit: int = SEGMENT_RECORDS,
+                   flush_seconds: float = FLUSH_SECONDS) -> Telemetry:
+    """
+    Allocates the ring and starts the flush thread, writing segments after any already in the directory.
+    Records still in the ring when the program exits are written before it does
+    Args:
+        directory (str): directory for the segment files, created if it does not exist
+        capacity (int): records the ring holds
+        segment_limit (int): records in a segment before the next one is started
+        flush_seconds (float): most seconds between flushes
+    Returns:
+        Telemetry: Telemetry instance
+    """
+    os.makedirs(directory, exist_ok=True)
+    telemetry = Telemetry(directory, np.zeros(capacity, dtype=RECORD_DTYPE), segment_limit=segment_limit,
+                          flush_seconds=flush_seconds)
+    telemetry.segment = len(segment_files(directory))
+    threading.Thread(target=flush_records, args=(telemetry,), name='telemetry', daemon=True).start()
+    atexit.register(close_telemetry, telemetry)
+    return telemetry
+
+
+def record_event(telemetry: Telemetry, frame: int, event: int, value: int = 0, x: float = 0.0):
+    """
+    Writes one record into the ring, or counts it as dropped if the ring is full
+    Args:
+        telemetry (Telemetry): Telemetry instance
+        frame (int): step it happened on
+        event (int): what happened, one of RECORD_RUN_STARTED to RECORD_GAME_OVER
+        value (int): value stored with the event
+        x (float): x position stored with the event
+    """
+    head = telemetry.head
+    used = head - telemetry.tail
+    capacity = len(telemetry.records)
+    if used >= capacity:
+        telemetry.dropped += 1
+        return
+    telemetry.records[head % capacity] = (telemetry.run, frame, event, value, x)
+    telemetry.head = head + 1
+    if used + 1 == capacity // 2:
+        telemetry.wake.set()
+
+
+def start_run(telemetry: Telemetry, mode: int):
+    """
+    Marks the start of a new run; the records after it belong to it
+    Args:
+        telemetry (Telemetry): Telemetry instance
+        mode (int): starting difficulty, as its position in the difficulty settings
+    """
+    telemetry.run += 1
+    record_event(telemetry, 0, RECORD_RUN_STARTED, mode)
+
+
+def close_telemetry(telemetry: Telemetry, timeout: Optional[float] = None):
+    """
+    Writes every record still in the ring and stops the flush thread. Does nothing once closed
+    Args:
+        telemetry (Telemetry): Telemetry instance
+        timeout (Optional[float]): most seconds to wait for the flush thread, None to wait until it is done
+    """
+    if telemetry.closing:
+        return
+    telemetry.closing = True
+    telemetry.wake.set()
+    telemetry.finished.wait(timeout)
+
+
+def segment_files(directory: str) -> list[str]:
+    """
+    Segment files in a directory, in the order they were written
+    Args:
+        directory (str): telemetry directory
+    Returns:
+        list[str]: paths
+    """
+    names = sorted(name for name in os.listdir(directory) if name.startswith('segment-') and name.endswith('.bin.gz'))
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_telemetry(directory: str) -> np.ndarray:
+    """
+    Reads every record in a telemetry directory
+    Args:
+        directory (str): telemetry directory
+    Returns:
+        np.ndarray: RECORD_DTYPE records, in the order they were written
+    """
+    chunks = []
+    for path in segment_files(directory):
+        with gzip.open(path, 'rb') as segment:
+            chunks.append(np.frombuffer(segment.read(), dtype=RECORD_DTYPE))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=RECORD_DTYPE)
+
+
+if __name__ == '__main__':
+    from simulation import FRAMES_PER_SECOND
+    loaded = read_telemetry(sys.argv[1])
+    counts = np.bincount(loaded['event'], minlength=len(EVENT_NAMES))
+    print(f"{len(loaded)} records, {counts[RECORD_RUN_STARTED]} runs")
+    for name, count in zip(EVENT_NAMES, counts):
+        print(f"  {name}: {count}")
+    deaths = loaded['frame'][loaded['event'] == RECORD_GAME_OVER] / FRAMES_PER_SECOND
+    if len(deaths):
+        print(f"time to death: median {np.median(deaths):.1f}s, p90 {np.percentile(deaths, 90):.1f}s")
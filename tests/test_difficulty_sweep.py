@@ -0,0 +1,112 @@
+"""
+Every game of a sweep batch ends the way step() plays it, given the same keys and spawns.
+"""
+from collections import deque
+from random import Random
+
+import numpy as np
+import pytest
+
+import difficulty_sweep
+from difficulty_sweep import SweepPoint, create_batch, step_batch, RANDOM, CHASE, DODGE
+from falling_store import PAGE, BOMB
+from simulation import new_game, step, Inputs, Hitbox, GameState, SALAMANDER_FELL
+
+GAMES = 12
+HORIZON = 900
+
+
+class ScriptedRandom(Random):
+    """ Hands step() the spawn rolls and positions a batch game drew, in the order step() asks for them """
+
+    def __init__(self):
+        super().__init__(0)
+        self.draws = deque()
+
+    def randint(self, a, b):
+        return self.draws.popleft()
+
+
+def play_batch(point: SweepPoint, seed: int, monkeypatch: pytest.MonkeyPatch) -> tuple[difficulty_sweep.Batch, list,
+                                                                                     list]:
+    """
+    Plays a batch, keeping the keys each game held and what it spawned on every frame
+    Args:
+        point (SweepPoint): settings and policy of the batch
+        seed (int): seed of the batch's random stream
+        monkeypatch (pytest.MonkeyPatch): swaps in the recording key and spawn functions
+    Returns:
+        tuple[Batch, list, list]: the batch at the end, the keys of each frame, and the spawns of each frame
+            as the x of each kind's new object in each game, NaN where none spawned
+    """
+    keys, spawns = [], []
+    choose_keys, spawn = difficulty_sweep.choose_keys, difficulty_sweep.spawn
+
+    def recording_choose_keys(batch, point, rng):
+        left, right = choose_keys(batch, point, rng)
+        keys.append((left.copy(), right.copy()))
+        return left, right
+
+    def recording_spawn(batch, kind, spawn_rate, max_objects, rng):
+        before = batch.alive[:, kind].copy()
+        spawn(batch, kind, spawn_rate, max_objects, rng)
+        spawned = batch.alive[:, kind] & ~before
+        if kind == PAGE:
+            spawns.append(np.full((len(before), 2), np.nan))
+        # at most one object of a kind spawns in a game on a frame
+        slots = np.argmax(spawned, axis=1)
+        x = batch.x[np.arange(len(slots)), kind, slots]
+        spawns[-1][:, kind] = np.where(spawned.any(axis=1), x, np.nan)
+
+    rng = np.random.default_rng(seed)
+    batch = create_batch(GAMES, point.max_objects)
+    monkeypatch.setattr(difficulty_sweep, 'choose_keys', recording_choose_keys)
+    monkeypatch.setattr(difficulty_sweep, 'spawn', recording_spawn)
+    for frame in range(HORIZON):
+        step_batch(batch, point, frame, rng)
+    return batch, keys, spawns
+
+
+def play_game(point: SweepPoint, game: int, keys: list, spawns: list) -> tuple[GameState, int]:
+    """
+    Plays one game of a batch with step(), holding its keys and spawning what it spawned
+    Args:
+        point (SweepPoint): settings of the batch
+        game (int): row of the game in the batch
+        keys (list): keys of each frame, from play_batch()
+        spawns (list): spawns of each frame, from play_batch()
+    Returns:
+        tuple[GameState, int]: the game when the salamander fell or the horizon was reached, and the
+            number of frames it lasted, 0 if it never fell
+    """
+    rng = ScriptedRandom()
+    state = new_game(0, max_objects=point.max_objects, rng=rng)
+    state.page_speed, state.bomb_speed, state.spawn_rate = point.page_speed, point.bomb_speed, point.spawn_rate
+    state.page_hitbox, state.bomb_hitbox = point.page_hitbox, point.bomb_hitbox
+    state.salamander_hitbox = point.salamander_hitbox
+    inputs = Inputs()
+    for frame in range(HORIZON):
+        inputs.left, inputs.right = bool(keys[frame][0][game]), bool(keys[frame][1][game])
+        for kind in (PAGE, BOMB):
+            x = spawns[frame][game, kind]
+            rng.draws.extend([2] if np.isnan(x) else [1, int(x)])
+        if SALAMANDER_FELL in step(state, inputs):
+            return state, frame + 1
+    return state, 0
+
+
+@pytest.mark.parametrize('point', [
+    SweepPoint(6, 8, 30, 7, DODGE),
+    SweepPoint(8, 10, 6, 3, CHASE),
+    SweepPoint(4, 6, 8, 12, RANDOM, Hitbox(20, 24), Hitbox(44, 30), Hitbox(61, 47)),
+    SweepPoint(8, 10, 10, 5, DODGE, Hitbox(30, 30), Hitbox(50, 50), Hitbox(120, 80)),
+])
+def test_batch_games_end_like_step(monkeypatch, point):
+    batch, keys, spawns = play_batch(point, 7, monkeypatch)
+    # some games fall within the horizon and some score before they do
+    assert (~batch.playing).any() and batch.page_count.any()
+    for game in range(GAMES):
+        state, survived = play_game(point, game, keys, spawns)
+        assert survived == batch.survived_frames[game], f"game {game}"
+        assert state.page_count == batch.page_count[game], f"game {game}"
+        assert state.hearts_remaining == batch.hearts[game], f"game {game}"
@@ -0,0 +1,76 @@
+"""
+The fall schedule removes and collides exactly what checking every object on every step would.
+"""
+import numpy as np
+import pytest
+
+import simulation
+from collision import band_candidates, precise_hits
+from falling_store import cull_falling
+from simulation import (new_game, step, update_difficulty_mode, Inputs, Hitbox, SALAMANDER_FELL, GAME_OVER,
+                        SCREEN_HEIGHT)
+
+MAX_STEPS = 6000
+# difficulty picked at each of these steps, so objects already falling change speed under the schedule
+DIFFICULTY_CHANGES = {60: 'hard', 180: 'easy', 300: 'medium', 420: 'hard'}
+# enough hearts to last past the last change before the salamander falls
+HEARTS = 20
+
+
+def scan_ground(state: simulation.GameState):
+    """ Removes every object on the ground, checking all of them """
+    cull_falling(state.objects, SCREEN_HEIGHT)
+
+
+def scan_band(state: simulation.GameState) -> np.ndarray:
+    """ Finds the objects touching the salamander, checking all of them against its band """
+    left, top, right, bottom = simulation.salamander_box(state)
+    widths, heights = simulation.kind_sizes(state.page_hitbox, state.bomb_hitbox)
+    candidates = band_candidates(state.objects, widths, heights, left, top, right, bottom)
+    return precise_hits(state.objects, candidates, widths, [state.page_mask, state.bomb_mask],
+                        state.salamander_mask, left, top)
+
+
+def play(seed: int, max_objects: int, salamander_hitbox: Hitbox) -> list[tuple]:
+    """
+    Plays a seeded game to its end, walking back and forth and changing difficulty along the way
+    Args:
+        seed (int): seed of the game
+        max_objects (int): most pages, and separately bombs, that can fall at once
+        salamander_hitbox (Hitbox): size of the salamander
+    Returns:
+        list[tuple]: events, live slots, score and hearts after each step
+    """
+    state = new_game(seed, 'medium', max_objects)
+    state.salamander_hitbox = salamander_hitbox
+    state.hearts_remaining = HEARTS
+    inputs = Inputs()
+    steps = []
+    for index in range(MAX_STEPS):
+        if index in DIFFICULTY_CHANGES:
+            state.settings_mode = DIFFICULTY_CHANGES[index]
+            update_difficulty_mode(state)
+        inputs.left, inputs.right = (index // 45) % 2 == 0, (index // 45) % 2 == 1
+        events = step(state, inputs)
+        steps.append((events, np.flatnonzero(state.objects.alive).tolist(), state.page_count,
+                      state.hearts_remaining))
+        if state.game_over:
+            break
+    return steps
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3, 4])
+@pytest.mark.parametrize('max_objects, salamander_hitbox', [(7, Hitbox(90, 110)), (20, Hitbox(61, 47))])
+def test_schedule_matches_scanning_every_object(monkeypatch, seed, max_objects, salamander_hitbox):
+    scheduled = play(seed, max_objects, salamander_hitbox)
+    monkeypatch.setattr(simulation, 'destroy_on_ground', scan_ground)
+    monkeypatch.setattr(simulation, 'colliding_with_salamander', scan_band)
+    scanned = play(seed, max_objects, salamander_hitbox)
+
+    events = [event for step_events, *_ in scheduled for event in step_events]
+    # the run covers every difficulty change, then the fall and the end of the game
+    assert len(scheduled) > max(DIFFICULTY_CHANGES)
+    assert SALAMANDER_FELL in events and events[-1] == GAME_OVER
+    for frame, (expected, actual) in enumerate(zip(scanned, scheduled)):
+        assert actual == expected, f"step {frame}"
+    assert len(scheduled) == len(scanned)
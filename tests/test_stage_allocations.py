@@ -0,0 +1,91 @@
+"""
+A steady-state simulation step allocates close to nothing, in every stage, and holds on to nothing.
+"""
+import gc
+import tracemalloc
+
+import pytest
+
+from simulation import new_game, step, Inputs, GameState, SIMULATION_STAGES
+from stage_timer import StageTimer, start_counting_allocations, stop_counting_allocations, stage_allocations
+
+WARM_UP_STEPS = 200
+COUNTED_STEPS = 300
+# the scalars and small numpy temporaries a stage may still create while it runs, all freed by its end
+MAX_STAGE_BYTES = 4096
+# spawning files an object's events in the fall schedule until they are due, and culling hands them
+# back, so those two stages may keep or free a few blocks on a step
+MAX_STAGE_NET_BLOCKS = 4
+# any other stage at most the block of an object its result takes from, or hands back to, one of the
+# interpreter's free lists rather than the allocator, which depends on what ran before it
+MAX_FREE_LIST_BLOCKS = 1
+LONG_RUN_STEPS = 10000
+# what the events waiting in the schedule can add up to at any moment, whatever the length of the run
+MAX_LONG_RUN_GROWTH_BYTES = 64 * 1024
+
+
+def steady_game(max_objects: int, spawn_rate: int) -> GameState:
+    """
+    A seeded game run until its buffers have grown and its caches filled, with a salamander
+    that never falls, so every step after is an ordinary one
+    Args:
+        max_objects (int): most pages, and separately bombs, that can fall at once
+        spawn_rate (int): steps between spawns
+    Returns:
+        GameState: GameState instance
+    """
+    state = new_game(1, max_objects=max_objects)
+    state.spawn_rate = spawn_rate
+    state.hearts_remaining = 10 ** 9
+    inputs = Inputs(right=True)
+    for _ in range(WARM_UP_STEPS):
+        step(state, inputs)
+    return state
+
+
+def walk(state: GameState, steps: int, timer: StageTimer = None):
+    """
+    Steps the game with the salamander walking back and forth
+    Args:
+        state (GameState): GameState instance
+        steps (int): steps to run
+        timer (StageTimer): StageTimer instance recording the stages, if given
+    """
+    inputs = Inputs()
+    for index in range(steps):
+        inputs.left, inputs.right = (index // 40) % 2 == 0, (index // 40) % 2 == 1
+        step(state, inputs, timer)
+
+
+@pytest.mark.parametrize('max_objects, spawn_rate', [(20, 20), (20, 3), (1000, 1)])
+def test_steady_state_stages_allocate_close_to_nothing(max_objects, spawn_rate):
+    state = steady_game(max_objects, spawn_rate)
+    timer = StageTimer()
+    start_counting_allocations(timer)
+    try:
+        walk(state, COUNTED_STEPS, timer)
+    finally:
+        stop_counting_allocations(timer)
+    assert not state.falling
+    allocations = stage_allocations(timer)
+    assert set(allocations) == {name for name, _ in SIMULATION_STAGES}
+    for name, counted in allocations.items():
+        assert counted['runs'] == COUNTED_STEPS
+        assert counted['median_bytes'] <= MAX_STAGE_BYTES, name
+        assert abs(counted['median_net_blocks']) <= MAX_STAGE_NET_BLOCKS, name
+        if name not in ('spawn', 'cull'):
+            assert abs(counted['median_net_blocks']) <= MAX_FREE_LIST_BLOCKS, name
+
+
+def test_steady_state_steps_do_not_grow_memory():
+    state = steady_game(20, 3)
+    tracemalloc.start()
+    try:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        walk(state, LONG_RUN_STEPS)
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert growth <= MAX_LONG_RUN_GROWTH_BYTES
@@ -0,0 +1,92 @@
+"""
+Fixed-rate simulation ticks decoupled from how often the screen is drawn.
+
+Designer calls the update handler on its own schedule and starts counting the next
+update from when the last one finished, so a slow frame slows the whole game
+down. A TickLoop instead adds up the real time each update reports and runs as
+many fixed ticks as that time covers. Updates that come more often than ticks run
+none and only move sprites part of the way to the next tick, while an update
+that comes late runs several ticks in a row, skipping the draws in between
+rather than falling behind. The number of ticks run for one update is capped, so
+a long stall drops time instead of freezing while it catches up.
+"""
+from dataclasses import dataclass
+
+from simulation import TIMESTEP_SECONDS
+
+# most ticks run for one update before the rest of the time is dropped
+MAX_TICKS_PER_UPDATE = 5
+
+
+@dataclass
+class TickLoop:
+    """ Real time not yet simulated, and counts of the ticks and draws it led to """
+    tick_seconds: float = TIMESTEP_SECONDS
+    max_ticks_per_update: int = MAX_TICKS_PER_UPDATE
+    accumulator: float = 0.0
+    # set while the scene is not running, so the time spent away is not simulated
+    paused: bool = False
+    updates: int = 0
+    ticks: int = 0
+    skipped_frames: int = 0
+    dropped_ticks: int = 0
+
+
+def advance_loop(loop: TickLoop, delta: float) -> int:
+    """
+    Adds the real time since the last update and takes out the ticks it covers
+    Args:
+        loop (TickLoop): TickLoop instance
+        delta (float): seconds since the last update
+    Returns:
+        int: number of ticks to run now
+    """
+    loop.updates += 1
+    if loop.paused:
+        loop.paused = False
+        return 0
+    loop.accumulator += delta
+    ticks = int(loop.accumulator // loop.tick_seconds)
+    loop.accumulator -= ticks * loop.tick_seconds
+    if ticks > loop.max_ticks_per_update:
+        loop.dropped_ticks += ticks - loop.max_ticks_per_update
+        ticks = loop.max_ticks_per_update
+    loop.ticks += ticks
+    # every tick past the first reaches the screen without its own draw
+    loop.skipped_frames += max(ticks - 1, 0)
+    return ticks
+
+
+def pause_loop(loop: TickLoop):
+    """
+    Forgets the time not yet simulated and ignores the next update's time, for when the scene
+    comes back after time spent in another one
+    Args:
+        loop (TickLoop): TickLoop instance
+    """
+    loop.accumulator = 0.0
+    loop.paused = True
+
+
+def interpolation_alpha(loop: TickLoop) -> float:
+    """
+    How far the time not yet simulated reaches toward the next tick
+    Args:
+        loop (TickLoop): TickLoop instance
+    Returns:
+        float: between 0 and 1
+    """
+    return min(loop.accumulator / loop.tick_seconds, 1.0)
+
+
+def interpolate(previous: float, current: float, alpha: float) -> float:
+    """
+    Position part of the way from the previous tick to the current one
+    Args:
+        previous (float): position at the previous tick
+        current (float): position at the current tick
+        alpha (float): fraction of the way, between 0 and 1
+    Returns:
+        float: the position drawn
+    """
+    return previous + (current - previous) * alpha